@@ -0,0 +1,342 @@
+"""asyncio interface to a Connection and its Vehicles.
+
+The Connection reader thread still receives and stores every message. Each (system, message) that
+has someone waiting on it gets one subscriber in the Connection registry, which hands the message
+to the event loop with call_soon_threadsafe. Everything else happens on the loop: any number of
+coroutines can wait on the same message without a thread each.
+
+    async def main():
+        veh = await AsyncVehicle.connect('tcp:127.0.0.1:5760', 1)
+        att = await veh.get_attitude()
+        async with veh.subscribe([33], 10) as stream:
+            async for pos in stream:
+                ...
+"""
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+from time import time
+from typing import Union
+import numpy as np
+from flightdata import Origin
+from loguru import logger
+from .connection import Connection
+from .vehicle import Vehicle
+from .messages import wrappermap, wrap
+from .scheduling import Timeout
+from . import mavlink
+
+
+class _Forwarder:
+    """Registry subscriber that moves arrivals from the reader thread onto the event loop"""
+    def __init__(self, aconn: AsyncConnection, key: tuple) -> None:
+        self.aconn = aconn
+        self.key = key
+
+    def notify(self, lm):
+        # take the message now, history will have moved on by the time the loop runs
+        try:
+            self.aconn.loop.call_soon_threadsafe(self.aconn._dispatch, self.key, lm.last_message)
+        except RuntimeError:
+            # the loop is closed, nothing will wait on it again
+            self.aconn.conn.unsubscribe(*self.key, self)
+
+
+_closed = object()
+
+
+class AsyncMessageStream:
+    """Async iterator over the raw messages of one or more types, the asyncio counterpart of
+    scheduling.MessageStream with its drop_oldest policy: if the consumer falls more than maxlen
+    messages behind the oldest are dropped and counted"""
+    def __init__(self, aconn: AsyncConnection, keys: list[tuple], maxlen: int=100) -> None:
+        self.aconn = aconn
+        self.keys = keys
+        self.maxlen = maxlen
+        self.queue = asyncio.Queue()   # bounded in _put, so there is always room for _closed
+        self.received = 0
+        self.dropped = 0
+        self.closed = False
+
+    def _put(self, msg):
+        self.received += 1
+        if self.queue.qsize() >= self.maxlen:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(msg)
+
+    @property
+    def stats(self) -> dict:
+        return dict(received=self.received, dropped=self.dropped, queued=self.queue.qsize())
+
+    async def get(self, timeout: float=None):
+        """the next message, raises StopAsyncIteration once the stream is closed and emptied"""
+        try:
+            msg = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            raise Timeout(f"timeout after {timeout} seconds waiting for {self.keys}")
+        if msg is _closed:
+            self.queue.put_nowait(_closed)   # for the next caller
+            raise StopAsyncIteration
+        return msg
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            for key in self.keys:
+                self.aconn._remove_stream(key, self)
+            self.queue.put_nowait(_closed)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, xc_type, exc_value, exc_tb):
+        self.close()
+
+
+class AsyncConnection:
+    def __init__(self, conn: Connection, loop: asyncio.AbstractEventLoop=None) -> None:
+        """Must be created on the loop it will be used from, or be given that loop"""
+        self.conn = conn
+        self.loop = asyncio.get_running_loop() if loop is None else loop
+        self._futures: dict[tuple, list[asyncio.Future]] = {}
+        self._streams: dict[tuple, list[AsyncMessageStream]] = {}
+        self._forwarders: dict[tuple, _Forwarder] = {}
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def _listen(self, key: tuple):
+        if key not in self._forwarders:
+            self._forwarders[key] = self.conn.subscribe(*key, _Forwarder(self, key))
+
+    def _release(self, key: tuple):
+        """stop forwarding a message type once nothing on the loop is waiting for it"""
+        if key not in self._futures and key not in self._streams and key in self._forwarders:
+            self.conn.unsubscribe(*key, self._forwarders.pop(key))
+
+    def _dispatch(self, key: tuple, msg):
+        for fut in self._futures.pop(key, []):
+            if not fut.done():
+                fut.set_result(msg)
+        for stream in self._streams.get(key, []):
+            stream._put(msg)
+        self._release(key)
+
+    def _remove_stream(self, key: tuple, stream: AsyncMessageStream):
+        streams = [s for s in self._streams.get(key, []) if s is not stream]
+        if len(streams) > 0:
+            self._streams[key] = streams
+        else:
+            self._streams.pop(key, None)
+        self._release(key)
+
+    async def next_message(self, systemid: int, msgid, timeout: float=None):
+        """the next raw message of a type, msgid=None for the next message of any type"""
+        key = (systemid, msgid)
+        fut = self.loop.create_future()
+        self._futures.setdefault(key, []).append(fut)
+        self._listen(key)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            raise Timeout(f'timeout after {timeout} seconds waiting for message {msgid}')
+        finally:
+            if key in self._futures:
+                futs = [f for f in self._futures[key] if f is not fut]
+                if len(futs) > 0:
+                    self._futures[key] = futs
+                else:
+                    del self._futures[key]
+                self._release(key)
+
+    async def wait_for_message(self, systemid: int, timeout: float=None) -> bool:
+        """wait for any message from systemid, return False on timeout"""
+        try:
+            await self.next_message(systemid, None, timeout)
+            return True
+        except Timeout:
+            return False
+
+    def stream(self, systemid: int, ids: Union[list, int], maxlen: int=100) -> AsyncMessageStream:
+        ids = ids if isinstance(ids, list) else [ids]
+        stream = AsyncMessageStream(self, [(systemid, id) for id in ids], maxlen)
+        for key in stream.keys:
+            self._streams.setdefault(key, []).append(stream)
+            self._listen(key)
+        return stream
+
+
+class AsyncVehicle:
+    def __init__(self, veh: Vehicle, aconn: AsyncConnection=None) -> None:
+        """veh does the sending and holds the received messages, the awaiting happens here"""
+        self.veh = veh
+        self.aconn = AsyncConnection(veh.conn) if aconn is None else aconn
+        self.sysid = veh.sysid
+
+    def __str__(self):
+        return f"Async{self.veh}"
+
+    @staticmethod
+    async def connect(constr: str, sysid: int=1, compid: int=1, wfb=True, origin: Origin=None, **kwargs) -> AsyncVehicle:
+        logger.info(f"Connecting to {constr}, sys {sysid}, comp {compid} ")
+        conn = Connection.connect(constr, **kwargs)
+        conn.start()
+        aveh = AsyncVehicle(Vehicle(conn, sysid, compid))
+        if wfb:
+            await aveh.wait_for_boot()
+            if origin is None:
+                origin = Origin("origin", (await aveh.get_GlobalOrigin(None, None)).position, 0.0)
+            aveh = aveh.update(origin=origin)
+        return aveh
+
+    def update(self, **kwargs) -> AsyncVehicle:
+        return AsyncVehicle(self.veh.update(**kwargs), self.aconn)
+
+    def __getattr__(self, name):
+        lname = name.lower()
+        if "_" in lname:
+            _spl = lname.split("_")
+            if _spl[0] in ["next", "get"] and _spl[1] in wrappermap:
+                return lambda *args, **kwargs: getattr(self, f"{_spl[0]}_message")(wrappermap[_spl[1]].id, *args, **kwargs)
+        return getattr(self.veh, name)
+
+    async def next_message(self, id, timeout: float=0.2):
+        """Wait timeout seconds for the next message"""
+        return wrap(await self.aconn.next_message(self.sysid, id, timeout))
+
+    async def get_message(self, id, timeout: float=0.2, max_age: float=0.1):
+        """get a message.
+        first try younger than max_age,
+        then wait for the next one,
+        request periodically while waiting"""
+        timeout = 9999 if timeout is None else timeout
+        try:
+            return self.veh.last_message(id, max_age)
+        except Exception:
+            if max_age is not None and id in self.veh.msgs:
+                return self.veh.last_message(id, None)
+
+        stop = time() + timeout
+        interval = min(timeout, 1)
+        while time() < stop:
+            self.veh.request_message(id, retries=0)   # requested again each interval
+            try:
+                return await self.next_message(id, min(interval, stop - time()))
+            except Timeout:
+                pass
+        logger.debug(f"Failed to receive msg {str(id)} after {timeout} seconds")
+
+    def stream(self, ids: Union[list, int], maxlen: int=100) -> AsyncMessageStream:
+        """raw messages of the requested types as they arrive, use as an async iterator"""
+        return self.aconn.stream(self.sysid, ids, maxlen)
+
+    def expect(self, id, test, timeout: float=None) -> asyncio.Future:
+        """start listening now for the first message of type id for which test(msg) is True,
+        so a reply to something sent afterwards cannot be missed"""
+        stream = self.stream(id)
+        stop = None if timeout is None else time() + timeout
+
+        async def match():
+            async with stream:
+                while True:
+                    msg = await stream.get(None if stop is None else max(stop - time(), 0))
+                    if test(msg):
+                        return msg
+        return asyncio.ensure_future(match())
+
+    async def wait_for(self, id, test, timeout: float=None):
+        """the first message of type id for which test(msg) is True"""
+        return await self.expect(id, test, timeout)
+
+    async def wait_for_test(self, test, timeout: float=None):
+        """re-evaluate test each time a message arrives from this vehicle, until it returns True"""
+        stop = None if timeout is None else time() + timeout
+        while not test():
+            if stop is not None and time() >= stop:
+                raise Timeout(f"Timeout after {timeout} seconds waiting for test {test}")
+            await self.aconn.wait_for_message(self.sysid, None if stop is None else stop - time())
+
+    async def wait_for_boot(self) -> AsyncVehicle:
+        logger.info("Waiting for boot")
+        tests = {
+            "IMU initialised": lambda : self.veh.last_heartbeat().initialised,
+            "GPS fix": lambda : self.veh.last_GPSRawInt().fix_type > 2,
+            "EKF happy": lambda : self.veh.last_EKFStatus().is_good
+        }
+        for name, test in tests.items():
+            logger.debug(f"Waiting for {name}")
+            await self.wait_for_test(lambda : _safe(test))
+        logger.info("Booted")
+        return self
+
+    @asynccontextmanager
+    async def subscribe(self, ids: Union[list[int], int], rate: float, check_rate: float=1.0, maxlen: int=100):
+        """Keep the rate of messages ids at or above rate and stream them while active"""
+        ids = ids if isinstance(ids, list) else [ids]
+        initial_rates = {id: max(self.veh.msgs[id].rate if id in self.veh.msgs else 0, 1.0) for id in ids}
+
+        async def keep_rates():
+            while True:
+                for id in ids:
+                    current = self.veh.msgs[id].rate if id in self.veh.msgs else 0
+                    if current < rate:
+                        logger.debug(f"increasing rate for msg {id} from {current} to {rate}")
+                        self.veh.set_message_rate(id, rate * 1.5, retries=0)   # checked again next time
+                await asyncio.sleep(1 / check_rate)
+
+        task = asyncio.ensure_future(keep_rates())
+        stream = self.stream(ids, maxlen)
+        try:
+            yield stream
+        finally:
+            stream.close()
+            task.cancel()
+            for id, initial in initial_rates.items():
+                self.veh.set_message_rate(id, initial)
+
+    async def get_parameter(self, name: str, use_cache=True, retry_interval: float=2, retries: int=5, raise_on_fail=True):
+        if use_cache and name in self.veh.parameters:
+            return self.veh.parameters[name]
+        for _ in range(retries):
+            try:
+                task = self.expect(mavlink.MAVLINK_MSG_ID_PARAM_VALUE, lambda m: m.param_id==name, retry_interval)
+                self.veh.send_paramrequestread(name.encode('utf8'), -1)
+                return (await task).param_value
+            except Timeout:
+                logger.debug(f'failed to receive parameter {name}, value may be out of date')
+        if raise_on_fail:
+            raise Timeout(f"Failed to get parameter {name} after {retries} retries")
+        return self.veh.parameters[name] if name in self.veh.parameters else None
+
+    async def set_parameter(self, name: str, value: float, retry_interval: float=2, retries: int=5):
+        for _ in range(retries):
+            try:
+                task = self.expect(
+                    mavlink.MAVLINK_MSG_ID_PARAM_VALUE,
+                    lambda m: m.param_id==name and np.float32(m.param_value)==np.float32(value),   # PARAM_VALUE carries a float32
+                    retry_interval
+                )
+                self.veh.send_paramset(name.encode('utf8'), value, mavlink.MAVLINK_TYPE_FLOAT)
+                return (await task).param_value
+            except Timeout:
+                logger.debug(f'failed to set parameter {name} to {value}')
+        raise Timeout(f"Failed to set parameter {name} to {value} after {retries} retries")
+
+    async def command(self, name: str, *args, timeout: float=1.0, retries: int=3, **kwargs):
+        """send a command and wait for its COMMAND_ACK, which is returned. The retries are sent by the
+        vehicle's CommandSender, so any number of commands can be awaited together"""
+        return await asyncio.wrap_future(self.veh.commands.send(name.lower(), *args, timeout=timeout, retries=retries, **kwargs))
+
+
+def _safe(test) -> bool:
+    try:
+        return test()
+    except Exception:
+        return False
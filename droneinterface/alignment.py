@@ -0,0 +1,194 @@
+"""Align several message streams onto one time base.
+
+Each stream is located on the time base with a single searchsorted, so any number of streams are
+aligned in one vectorised pass rather than a chain of pairwise merges. Streams can be DataFrames
+indexed by timestamp (stored sessions, DataFlash frames), structured arrays with a timestamp field
+(ring buffer windows) or dicts of arrays (columnar stores).
+
+methods:
+    asof: the latest sample at or before each time
+    nearest: the closest sample either side
+    linear: interpolate between the samples either side, columns that are not numeric use asof
+tolerance is the furthest (in seconds) a sample can be from the time it is used for, beyond which
+the value is missing.
+
+interpolate is the linear method for the columns of one stream as the combinators use them, keeping
+array fields whole and using slerp for quaternions.
+"""
+from __future__ import annotations
+from typing import Union
+import numpy as np
+import pandas as pd
+
+
+methods = ["asof", "nearest", "linear"]
+
+
+def columns(data) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """timestamps and 1d columns of a stream, sorted by time"""
+    if isinstance(data, pd.DataFrame):
+        if "timestamp" in data.columns:
+            data = data.set_index("timestamp")
+        t, cols = data.index.to_numpy(), {c: data[c].to_numpy() for c in data.columns}
+    else:
+        names = data.dtype.names if isinstance(data, np.ndarray) else list(data.keys())
+        t = np.asarray(data["timestamp"])
+        cols = {}
+        for name in names:
+            if name == "timestamp":
+                continue
+            arr = np.asarray(data[name])
+            if arr.ndim == 1:
+                cols[name] = arr
+            else:
+                for i in range(arr.shape[1]):
+                    cols[f"{name}_{i}"] = arr[:, i]
+    t = t.astype(float)
+    if len(t) > 1 and np.any(np.diff(t) < 0):
+        order = np.argsort(t, kind="stable")
+        t, cols = t[order], {k: v[order] for k, v in cols.items()}
+    return t, cols
+
+
+def time_base(streams: dict[str, tuple], base="union", rate: float=None) -> np.ndarray:
+    """base: "union" of all timestamps, the label of a stream to use its timestamps or an array of times
+    rate: instead of base, times at rate Hz over the span of all the streams"""
+    if rate is not None:
+        times = [t for t, _ in streams.values() if len(t) > 0]
+        start, end = min(t[0] for t in times), max(t[-1] for t in times)
+        return start + np.arange(int(np.floor((end - start) * rate)) + 1) / rate
+    if isinstance(base, np.ndarray):
+        return base.astype(float)
+    if isinstance(base, str) and base == "union":
+        return np.unique(np.concatenate([t for t, _ in streams.values()]))
+    if base in streams:
+        return streams[base][0]
+    raise ValueError(f"Unknown time base {base}, expected a stream label, \"union\" or an array (use rate= for a rate)")
+
+
+def _missing(arr: np.ndarray, invalid: np.ndarray) -> np.ndarray:
+    if not np.any(invalid):
+        return arr
+    if arr.dtype.kind in "fc":
+        arr = arr.copy()
+        arr[invalid] = np.nan
+    elif arr.dtype.kind in "iub":
+        arr = arr.astype(float)
+        arr[invalid] = np.nan
+    else:
+        arr = arr.astype(object)
+        arr[invalid] = None
+    return arr
+
+
+def resample(t: np.ndarray, cols: dict[str, np.ndarray], tb: np.ndarray, method: str="asof", tolerance: float=None) -> dict[str, np.ndarray]:
+    """the columns of one stream at the times tb"""
+    if method not in methods:
+        raise ValueError(f"Unknown method {method}, expected one of {methods}")
+    if len(t) == 0:
+        return {k: np.full(len(tb), np.nan) for k in cols}
+
+    after = np.searchsorted(t, tb, side="right")
+    before = np.clip(after - 1, 0, len(t) - 1)
+    after = np.clip(after, 0, len(t) - 1)
+    gap_before, gap_after = tb - t[before], t[after] - tb
+
+    if method == "nearest":
+        use = np.where((gap_after >= 0) & ((gap_after < gap_before) | (gap_before < 0)), after, before)
+        distance = np.abs(tb - t[use])
+        invalid = np.zeros(len(tb), dtype=bool)
+    else:
+        use = before
+        invalid = gap_before < 0   # nothing at or before
+        distance = gap_before
+        if method == "linear":
+            invalid = invalid | (tb > t[-1])
+            distance = np.minimum(np.abs(gap_before), np.abs(gap_after))
+            span = t[after] - t[before]
+            weight = np.divide(gap_before, span, out=np.zeros(len(tb)), where=span > 0)
+
+    if tolerance is not None:
+        invalid = invalid | (distance > tolerance)
+
+    out = {}
+    for name, arr in cols.items():
+        if method == "linear" and arr.dtype.kind in "iufb":
+            values = arr[before] + (arr[after].astype(float) - arr[before]) * weight
+        else:
+            values = arr[use]
+        out[name] = _missing(values, invalid)
+    return out
+
+
+def align(streams: dict, base: Union[str, int, np.ndarray]="union", method: Union[str, dict]="asof", tolerance: Union[float, dict]=None, rate: float=None) -> pd.DataFrame:
+    """one frame indexed by the time base with a {label}_{column} column for every column of every stream.
+    method and tolerance can be given per stream label in a dict. See time_base for base and rate"""
+    data = {label: columns(stream) for label, stream in streams.items()}
+    tb = time_base(data, base, rate)
+    out = {}
+    for label, (t, cols) in data.items():
+        out.update({
+            f"{label}_{k}": v for k, v in resample(
+                t, cols, tb,
+                method.get(label, "asof") if isinstance(method, dict) else method,
+                tolerance.get(label) if isinstance(tolerance, dict) else tolerance
+            ).items()
+        })
+    return pd.DataFrame(out, index=pd.Index(tb, name="timestamp"))
+
+
+def slerp(q0: np.ndarray, q1: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """spherical linear interpolation from rows of quaternions q0 to q1 by the fractions w, the short way round"""
+    dot = np.sum(q0 * q1, axis=1)
+    q1 = np.where(dot[:, None] < 0, -q1, q1)
+    theta = np.arccos(np.clip(np.abs(dot), 0, 1))
+    sin = np.sin(theta)
+    close = sin < 1e-6   # nearly the same rotation, lerp
+    sin = np.where(close, 1, sin)
+    a = np.where(close, 1 - w, np.sin((1 - w) * theta) / sin)
+    b = np.where(close, w, np.sin(w * theta) / sin)
+    q = a[:, None] * q0 + b[:, None] * q1
+    norm = np.linalg.norm(q, axis=1)
+    return np.divide(q, norm[:, None], out=q, where=norm[:, None] > 0)
+
+
+def interpolate(t: np.ndarray, cols: dict[str, np.ndarray], tb: np.ndarray, quaternions: list=(), tolerance: float=None) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """every column at the times tb, interpolated between the samples either side. Columns can have more than
+    one dimension (array fields), columns that are not numeric take the sample before.
+    quaternions are slerped, each is the name of an (n, 4) column or a tuple of the names of its 4 columns.
+    valid is False where tb is outside the samples or further than tolerance from a sample it uses."""
+    t, tb = np.asarray(t, dtype=float), np.asarray(tb, dtype=float)
+    if len(t) > 1 and np.any(np.diff(t) < 0):
+        order = np.argsort(t, kind="stable")
+        t, cols = t[order], {k: v[order] for k, v in cols.items()}
+    if len(t) == 0:
+        return {k: np.zeros((len(tb),) + v.shape[1:]) for k, v in cols.items()}, np.zeros(len(tb), dtype=bool)
+
+    before = np.clip(np.searchsorted(t, tb, side="right") - 1, 0, len(t) - 1)
+    after = np.clip(before + 1, 0, len(t) - 1)
+    gap_before, gap_after = tb - t[before], t[after] - tb
+    span = t[after] - t[before]
+    w = np.clip(np.divide(gap_before, span, out=np.zeros(len(tb)), where=span > 0), 0, 1)
+
+    valid = (tb >= t[0]) & (tb <= t[-1])
+    if tolerance is not None:
+        valid &= (gap_before <= tolerance) & ((w == 0) | (gap_after <= tolerance))
+
+    out = {}
+    for q in quaternions:
+        names = [q] if isinstance(q, str) else list(q)
+        arr = cols[q] if isinstance(q, str) else np.stack([cols[n] for n in names], axis=1)
+        res = slerp(arr[before].astype(float), arr[after].astype(float), w)
+        if isinstance(q, str):
+            out[q] = res
+        else:
+            out.update({n: res[:, i] for i, n in enumerate(names)})
+    for name, arr in cols.items():
+        if name in out:
+            continue
+        if arr.dtype.kind in "iuf":
+            wn = w.reshape((-1,) + (1,) * (arr.ndim - 1))
+            out[name] = arr[before] + (arr[after].astype(float) - arr[before]) * wn
+        else:
+            out[name] = arr[before]
+    return out, valid
@@ -0,0 +1,130 @@
+"""Fixed memory statistics of when the messages of one type arrive, updated as each one is received.
+
+Intervals between messages go into a histogram with logarithmic buckets, so p50 / p99 are available
+without keeping the intervals. The counts per second for the last horizon seconds give a rate timeline.
+Intervals are measured on the receive clock and, for messages that carry it, on the vehicle clock
+(time_boot_ms, or TimeUS in DataFlash logs), which separates vehicle scheduling jitter from link jitter.
+
+The reader thread only appends to python lists, stats() copies them without taking a lock.
+"""
+from __future__ import annotations
+from math import log10
+import numpy as np
+
+
+vehicle_clocks = {"time_boot_ms": 1e-3, "TimeUS": 1e-6}
+
+
+class IntervalHistogram:
+    def __init__(self, lo: float=1e-4, hi: float=1e2, per_decade: int=10) -> None:
+        """buckets from lo to hi seconds, plus one below lo (including zero or negative intervals) and one above hi"""
+        self.lo = lo
+        self.per_decade = per_decade
+        self._log_lo = log10(lo)
+        self.nbins = int(round(log10(hi / lo) * per_decade)) + 2
+        self.counts = [0] * self.nbins
+        self.last = None
+
+    def add(self, t: float):
+        if self.last is not None:
+            self.add_interval(t - self.last)
+        self.last = t
+
+    def add_interval(self, dt: float):
+        """count an interval measured elsewhere, such as a round trip time"""
+        i = int((log10(dt) - self._log_lo) * self.per_decade) + 1 if dt > 0 else 0
+        self.counts[min(max(i, 0), self.nbins - 1)] += 1
+
+    @property
+    def edges(self) -> np.ndarray:
+        """the lower edge of each bucket, the first is 0"""
+        return np.concatenate([[0], self.lo * 10 ** (np.arange(self.nbins - 1) / self.per_decade)])
+
+    def percentile(self, q: float, counts: np.ndarray=None) -> float:
+        """the interval below which q% of intervals fall, the geometric centre of the bucket it lands in"""
+        counts = np.array(self.counts) if counts is None else counts
+        cum = np.cumsum(counts)
+        if cum[-1] == 0:
+            return np.nan
+        i = int(np.searchsorted(cum, q / 100 * cum[-1]))
+        if i == 0:
+            return 0.0
+        return self.lo * 10 ** ((i - 0.5) / self.per_decade)
+
+
+class RateTimeline:
+    def __init__(self, horizon: int=60) -> None:
+        """message counts for each whole second of the last horizon seconds"""
+        self.horizon = horizon
+        self.seconds = [-1] * horizon
+        self.counts = [0] * horizon
+
+    def add(self, t: float):
+        s = int(t)
+        i = s % self.horizon
+        if self.seconds[i] != s:
+            self.seconds[i] = s
+            self.counts[i] = 0
+        self.counts[i] += 1
+
+    def timeline(self, now: float) -> tuple[np.ndarray, np.ndarray]:
+        """the complete seconds within the horizon before now and the number of messages in each"""
+        seconds, counts = np.array(self.seconds), np.array(self.counts)
+        current = int(now)
+        keep = (seconds >= current - self.horizon) & (seconds < current)
+        order = np.argsort(seconds[keep])
+        return seconds[keep][order], counts[keep][order]
+
+
+class ArrivalStats:
+    def __init__(self, vehicle_clock: str=None, horizon: int=60) -> None:
+        self.count = 0
+        self.first = None
+        self.receive = IntervalHistogram()
+        self.rates = RateTimeline(horizon)
+        self.vehicle_clock = vehicle_clock
+        self.vehicle = None
+        if vehicle_clock is not None:
+            self.vehicle = IntervalHistogram()
+            self._scale = vehicle_clocks[vehicle_clock]
+
+    @staticmethod
+    def for_dtype(dtype: np.dtype, horizon: int=60) -> ArrivalStats:
+        names = [] if dtype is None else dtype.names
+        return ArrivalStats(next((c for c in vehicle_clocks if c in names), None), horizon)
+
+    def record(self, msg):
+        t = msg._timestamp
+        if self.first is None:
+            self.first = t
+        self.count += 1
+        self.receive.add(t)
+        self.rates.add(t)
+        if self.vehicle is not None:
+            self.vehicle.add(getattr(msg, self.vehicle_clock) * self._scale)
+
+    def timeline(self, now: float=None) -> tuple[np.ndarray, np.ndarray]:
+        """whole seconds up to now (default the last message) and the number of messages received in each"""
+        now = now if now is not None else (self.receive.last or 0)
+        return self.rates.timeline(now)
+
+    def stats(self) -> dict:
+        last = self.receive.last
+        seconds, counts = self.timeline()
+        rec = np.array(self.receive.counts)
+        res = dict(
+            count=self.count,
+            rate=(self.count - 1) / (last - self.first) if self.count > 1 and last > self.first else 0.0,
+            last_second_rate=int(counts[-1]) if len(counts) > 0 and seconds[-1] == int(last) - 1 else 0,
+            p50=self.receive.percentile(50, rec),
+            p99=self.receive.percentile(99, rec),
+        )
+        if self.vehicle is not None:
+            veh = np.array(self.vehicle.counts)
+            res.update(vehicle_p50=self.vehicle.percentile(50, veh), vehicle_p99=self.vehicle.percentile(99, veh))
+        return res
+
+    def histogram(self, clock: str="receive") -> tuple[np.ndarray, np.ndarray]:
+        """bucket lower edges and counts, clock is "receive" or "vehicle\""""
+        hist = self.receive if clock == "receive" else self.vehicle
+        return hist.edges, np.array(hist.counts)
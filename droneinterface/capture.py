@@ -0,0 +1,228 @@
+"""Record the raw MAVLink byte stream as a tlog and decode it later, one message type at a time.
+
+A tlog is a sequence of records, each an 8 byte big-endian microsecond timestamp followed by one
+MAVLink frame, the format mavutil and MAVProxy read and write. Frames are cut from the stream using
+their headers and checked with their CRC (table driven, with the crc_extra of the message id) instead
+of a full decode. A start byte whose frame fails the check is noise: the splitter moves on one byte and
+looks for the next start, so the real frames in the bytes it claimed are not lost. Frames of message
+ids outside the dialect have no crc_extra to check, they are kept when the next frame starts straight
+after them.
+
+Alongside the log, capture.tlog.idx holds the offset, timestamp, message id, system, component and length
+of every record, and whether its CRC was checked, so any message type can be decoded without reading the
+others.
+"""
+from __future__ import annotations
+from pathlib import Path
+import struct
+import numpy as np
+import pandas as pd
+from loguru import logger
+from .messages import mavlink
+from .last_message import LastMessage
+from .storage import ColumnarStore
+
+
+index_dtype = np.dtype([
+    ("offset", "<u8"), ("timestamp", "<f8"), ("msgid", "<u4"), ("sysid", "u1"), ("compid", "u1"), ("length", "<u2"),
+    ("checked", "u1")
+])
+
+STX_V1, STX_V2 = 0xFE, 0xFD
+
+
+def frame_header(buf, i: int):
+    """length, seq, sysid, compid and msgid of the frame starting at buf[i], or None if the header is incomplete"""
+    n = len(buf) - i
+    if buf[i] == STX_V2:
+        if n < 10:
+            return None
+        return (
+            12 + buf[i + 1] + (13 if buf[i + 2] & 0x01 else 0),
+            buf[i + 4], buf[i + 5], buf[i + 6],
+            buf[i + 7] | buf[i + 8] << 8 | buf[i + 9] << 16
+        )
+    if n < 6:
+        return None
+    return 8 + buf[i + 1], buf[i + 2], buf[i + 3], buf[i + 4], buf[i + 5]
+
+
+def _crc_table() -> list[int]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def x25crc(buf, start: int, end: int, extra: int) -> int:
+    """the MAVLink CRC-16/MCRF4XX of buf[start:end] followed by the crc_extra byte"""
+    crc, table = 0xFFFF, _CRC_TABLE
+    for b in buf[start:end]:
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    return (crc >> 8) ^ table[(crc ^ extra) & 0xFF]
+
+
+def frame_valid(buf, i: int, length: int, msgid: int) -> bool:
+    """whether the frame of length starting at buf[i] has the CRC of its message id"""
+    msgcls = mavlink.mavlink_map.get(msgid)
+    if msgcls is None:
+        return False
+    end = i + length - 2 - (13 if buf[i] == STX_V2 and buf[i + 2] & 0x01 else 0)   # the CRC, before any signature
+    return x25crc(buf, i + 1, end, msgcls.crc_extra) == buf[end] | buf[end + 1] << 8
+
+
+class FrameSplitter:
+    """Cut a stream of bytes into whole MAVLink v1 and v2 frames that pass their CRC check.
+    skipped counts the bytes that were not part of a frame, rejected the start bytes that failed the check
+    and unchecked the frames of message ids outside the dialect, which are only checked by the start of the
+    next frame (so the last one waits for more data)"""
+    def __init__(self) -> None:
+        self.buf = bytearray()
+        self.skipped = 0
+        self.rejected = 0
+        self.unchecked = 0
+
+    def _next_start(self, i: int) -> int:
+        starts = [j for j in (self.buf.find(STX_V2, i), self.buf.find(STX_V1, i)) if j >= 0]
+        return min(starts) if starts else -1
+
+    def feed(self, data: bytes) -> list[tuple]:
+        """add data and return (frame, msgid, sysid, compid, seq) for each frame it completes"""
+        buf = self.buf
+        buf += data
+        frames = []
+        i = 0
+        while True:
+            j = self._next_start(i)
+            if j < 0:
+                self.skipped += len(buf) - i
+                i = len(buf)
+                break
+            self.skipped += j - i
+            header = frame_header(buf, j)
+            if header is None or len(buf) - j < header[0]:
+                i = j
+                break
+            length, seq, sysid, compid, msgid = header
+            if msgid in mavlink.mavlink_map:
+                valid = frame_valid(buf, j, length, msgid)
+            elif len(buf) - j == length:
+                i = j
+                break
+            else:
+                valid = buf[j + length] in (STX_V1, STX_V2)
+                self.unchecked += valid
+            if not valid:
+                self.rejected += 1
+                self.skipped += 1
+                i = j + 1
+                continue
+            frames.append((bytes(buf[j:j + length]), msgid, sysid, compid, seq))
+            i = j + length
+        del buf[:i]
+        return frames
+
+
+class TlogWriter:
+    def __init__(self, path: Path, index_rows: int=4096) -> None:
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self.io = open(self.path, "ab", buffering=2**20)
+        self.index_io = open(self.index_path, "ab")
+        self.offset = self.io.tell()
+        self.index_rows = index_rows
+        self.rows = []
+        self.frames = 0
+
+    def write(self, t: float, frame: bytes, msgid: int, sysid: int, compid: int):
+        self.io.write(struct.pack(">Q", int(t * 1e6)))
+        self.io.write(frame)
+        self.rows.append((self.offset, t, msgid, sysid, compid, len(frame), msgid in mavlink.mavlink_map))
+        self.offset += 8 + len(frame)
+        self.frames += 1
+        if len(self.rows) >= self.index_rows:
+            self.flush()
+
+    def flush(self):
+        self.io.flush()
+        if len(self.rows) > 0:
+            np.array(self.rows, dtype=index_dtype).tofile(self.index_io)
+            self.index_io.flush()
+            self.rows = []
+
+    @property
+    def closed(self) -> bool:
+        return self.io.closed
+
+    def close(self):
+        self.flush()
+        self.io.close()
+        self.index_io.close()
+
+
+class Tlog:
+    """Lazily decode the messages in a tlog, using its index if there is one that covers the whole file"""
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.buf = np.fromfile(self.path, dtype=np.uint8)
+        self.index = self._load_index()
+        self._decoder = mavlink.MAVLink(None)
+
+    def _load_index(self) -> np.ndarray:
+        index_path = self.path.with_name(self.path.name + ".idx")
+        if index_path.exists():
+            index = np.fromfile(index_path, dtype=index_dtype)
+            if len(index) > 0 and int(index["offset"][-1]) + 8 + int(index["length"][-1]) == len(self.buf):
+                return index
+        return self.build_index()
+
+    def build_index(self) -> np.ndarray:
+        """walk the record headers of the whole file"""
+        buf = self.buf.tobytes()
+        rows = []
+        i = 0
+        while i + 8 < len(buf):
+            header = frame_header(buf, i + 8) if buf[i + 8] in (STX_V1, STX_V2) else None
+            if header is None or i + 8 + header[0] > len(buf):
+                logger.debug(f"tlog {self.path} is corrupt at byte {i}, indexed {len(rows)} records")
+                break
+            length, seq, sysid, compid, msgid = header
+            rows.append((i, struct.unpack_from(">Q", buf, i)[0] * 1e-6, msgid, sysid, compid, length, msgid in mavlink.mavlink_map))
+            i += 8 + length
+        return np.array(rows, dtype=index_dtype)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return np.unique(self.index["msgid"])
+
+    def counts(self) -> dict[int, int]:
+        ids, counts = np.unique(self.index["msgid"], return_counts=True)
+        return dict(zip(ids.tolist(), counts.tolist()))
+
+    def messages(self, msgid: int, sysid: int=None) -> list:
+        """decode every message of a type, frames that fail their CRC are skipped"""
+        mask = self.index["msgid"] == msgid
+        if sysid is not None:
+            mask &= self.index["sysid"] == sysid
+        msgs = []
+        for offset, t, length in zip(*[self.index[k][mask].tolist() for k in ["offset", "timestamp", "length"]]):
+            try:
+                msg = self._decoder.decode(bytearray(self.buf[offset + 8:offset + 8 + length]))
+            except mavlink.MAVError as ex:
+                logger.debug(f"Failed to decode frame at {offset}: {ex}")
+                continue
+            msg._timestamp = t
+            msgs.append(msg)
+        return msgs
+
+    def dataframe(self, msgid: int, sysid: int=None) -> pd.DataFrame:
+        """every message of a type in the same layout as the csv and columnar stores"""
+        lm = LastMessage._build_mavlink(mavlink.mavlink_map[msgid])
+        arr = np.array([lm.row(msg) for msg in self.messages(msgid, sysid)], dtype=lm.dtype)
+        return ColumnarStore.to_frame({name: arr[name] for name in arr.dtype.names})
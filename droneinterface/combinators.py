@@ -1,13 +1,37 @@
-from .messages import AttitudeQuaternion, GlobalPositionInt, ScaledIMU
+from .messages import AttitudeQuaternion, GlobalPositionInt, ScaledIMU, mavlink
+from .messages.wrapper_factory import message_columns
+from .scheduling import MessageStream
+from .alignment import interpolate, time_base
+from .arrival_stats import vehicle_clocks
+from .dataflash import DataFlash
 from flightdata import State
-from typing import List
-from geometry import Transformation, Time
+from typing import List, Callable, Union
+from functools import cached_property
+from collections import deque
+from geometry import Transformation, Time, Quaternion, GPS, Point
 import numpy as np
 
 combinators = {}
 
+
+def clock_seconds(cols: dict, clock: str) -> np.ndarray:
+    """the clock column of a message's columns in seconds, clock is timestamp (received) or a vehicle clock"""
+    return cols[clock] * vehicle_clocks.get(clock, 1.0)
+
+
+def mavlink_columns(msgid: int, timestamp: np.ndarray, **values) -> dict[str, np.ndarray]:
+    """columns in the layout of a stored MAVLink message type, fields not in values are zero"""
+    MsgCls = mavlink.mavlink_map[msgid]
+    n = len(timestamp)
+    cols = dict(timestamp=np.asarray(timestamp, dtype=float))
+    for fname, l in zip(MsgCls.ordered_fieldnames, MsgCls.lengths):
+        cols[fname] = np.asarray(values[fname]) if fname in values else np.zeros(n if l == 1 else (n, l))
+    return cols
+
+
 class Combinator:
     wrappers = dict()
+    quaternions = dict()   # the quaternion columns of each wrapper key, to slerp. see alignment.interpolate
     def __init__(self, vehicle) -> None:
         self.vehicle = vehicle
         self.ids:List[int] = [wr.id for wr in self.__class__.wrappers.values()]
@@ -17,7 +41,10 @@ class Combinator:
 
     def _prepare(self, request: str, *args, **kwargs):
         try:
-            res = tuple(self.vehicle.parallel_messages(request, self.ids, *args, **kwargs))
+            if request == "last":   # nothing to wait for
+                res = tuple(self.vehicle.last_message(id, *args, **kwargs) for id in self.ids)
+            else:
+                res = tuple(self.vehicle.parallel_messages(request, self.ids, *args, **kwargs))
         except Exception as e:
             raise Exception(f"got {e} for {request} {self.ids}") from e
         if np.any(np.array(res) is None):
@@ -26,6 +53,18 @@ class Combinator:
             return res
 #        return tuple(getattr(self.vehicle, f"{request}_{v.__name__}")() for v in self.wrappers.values())    
 
+    @classmethod
+    def resample(cls, inputs: dict, times: np.ndarray, tolerance: float=None, clock: str="timestamp") -> tuple[dict, np.ndarray]:
+        """every input interpolated to times on its clock column, and a mask of the times where all of them had 
+        samples within tolerance. Returns parse_many wrappers of the valid times by wrapper key, and the mask.
+        inputs maps the message id of each wrapper to its rows, anything parse_many takes"""
+        interpolated, valid = {}, np.ones(len(times), dtype=bool)
+        for key, wr in cls.wrappers.items():
+            cols = message_columns(mavlink.mavlink_map[wr.id], inputs[wr.id])
+            interpolated[key], ok = interpolate(clock_seconds(cols, clock), cols, times, cls.quaternions.get(key, ()), tolerance)
+            valid &= ok
+        return {key: cls.wrappers[key].parse_many({k: v[valid] for k, v in cols.items()}) for key, cols in interpolated.items()}, valid
+
 
 class StateMaker(Combinator):
     output = State
@@ -34,30 +73,205 @@ class StateMaker(Combinator):
         mpos=GlobalPositionInt,
         macc=ScaledIMU
     )
+    quaternions = dict(matt=[("q1", "q2", "q3", "q4"), "repr_offset_q"])
 
-    def generate(self, request: str, *args, **kwargs) -> State:
-        matt, mpos, macc=self._prepare(request, *args, **kwargs)
-        
-        
-        to_body = Transformation(
-            self.vehicle.origin.rotation.transform_point(mpos.position - self.vehicle.origin.pos),
-            self.vehicle.origin.rotation * matt.att
+    @staticmethod
+    def build(rotation: Quaternion, pos: GPS, matt, mpos, macc, time: Time) -> State:
+        """the State from single wrappers or from parse_many wrappers, which gives a State with a row per message.
+        rotation and pos are those of the origin"""
+        to_body = Transformation.build(
+            rotation.transform_point(mpos.position - pos),
+            rotation * matt.att
         )
         
         return State.from_transform(
             to_body,
-            time = Time.now(),
+            time = time,
             vel = to_body.apply(mpos.velocity),
             rvel = to_body.apply(matt.rvel),
             acc = to_body.apply(macc.acc),
             #racc = to_body()  # TODO no idea where to get this from
         )
-    
-def append_combinators(obj, reduced_ids: List[int] = None) -> None:    
+
+    def generate(self, request: str, *args, **kwargs) -> State:
+        matt, mpos, macc=self._prepare(request, *args, **kwargs)
+        return StateMaker.build(self.vehicle.origin.rotation, self.vehicle.origin.pos, matt, mpos, macc, Time.now())
+
+    @staticmethod
+    def reconstruct(inputs: dict, rotation: Quaternion, pos: GPS, base: Union[int, float, np.ndarray]=AttitudeQuaternion.id, 
+                    tolerance: float=0.2, clock: str="time_boot_ms") -> tuple[State, np.ndarray]:
+        """States with the attitude, position and imu interpolated to common times (slerp for the attitude), from
+        stored messages or ring buffer windows given by message id. The interpolation is on the clock column,
+        by default the vehicle clock so link jitter does not matter, and the State time is the interpolated receive time.
+        base drives the clock: an int is the message id whose times are used, a float a rate in Hz and an array the
+        times themselves (on the clock). Returns the State of the times where every input had samples within
+        tolerance seconds (None if there are none) and the mask of valid times."""
+        if isinstance(base, (int, np.integer)):
+            times = np.unique(clock_seconds(message_columns(mavlink.mavlink_map[base], inputs[base]), clock))
+        elif isinstance(base, np.ndarray):
+            times = base.astype(float)
+        else:
+            times = time_base(
+                {id: (np.sort(clock_seconds(message_columns(mavlink.mavlink_map[id], data), clock)), None) for id, data in inputs.items()}, 
+                rate=base
+            )
+        wrs, valid = StateMaker.resample(inputs, times, tolerance, clock)
+        if not np.any(valid):
+            return None, valid
+        return StateMaker.build(rotation, pos, wrs["matt"], wrs["mpos"], wrs["macc"], Time.from_t(wrs["matt"].timestamp)), valid
+
+    @staticmethod
+    def between(inputs: dict, rotation: Quaternion, pos: GPS, t0: float=None, t1: float=None, rate: float=None, 
+                tolerance: float=0.5, clock: str="time_boot_ms") -> State:
+        """one State for a stored session, log or window: a row for each attitude message received from t0 to t1
+        (default all of them) or, given a rate in Hz, rows evenly spaced on the clock over the same span.
+        Only the rows within tolerance of the span are interpolated, times without every input are dropped.
+        None if there are no States. See reconstruct for inputs and clock"""
+        cols = {id: message_columns(mavlink.mavlink_map[id], data) for id, data in inputs.items()}
+        att = cols[AttitudeQuaternion.id]
+        if len(att["timestamp"]) == 0:
+            return None
+        t0 = att["timestamp"][0] if t0 is None else t0
+        t1 = att["timestamp"][-1] if t1 is None else t1
+        for id, c in cols.items():
+            keep = (c["timestamp"] >= t0 - tolerance) & (c["timestamp"] <= t1 + tolerance)
+            cols[id] = {k: v[keep] for k, v in c.items()}
+        att_t, att_clock = cols[AttitudeQuaternion.id]["timestamp"], clock_seconds(cols[AttitudeQuaternion.id], clock)
+        if len(att_t) == 0:
+            return None
+        if rate is None:
+            times = np.unique(att_clock[(att_t >= t0) & (att_t <= t1)])
+        else:
+            start, end = np.interp([t0, t1], att_t, att_clock)
+            times = start + np.arange(int(np.floor((end - start) * rate)) + 1) / rate
+        return StateMaker.reconstruct(cols, rotation, pos, times, tolerance, clock)[0]
+
+    @staticmethod
+    def dataflash_inputs(log: Union[DataFlash, str]) -> dict:
+        """the attitude, position and imu of a DataFlash log as ATTITUDE_QUATERNION, GLOBAL_POSITION_INT and 
+        SCALED_IMU columns (in their units, TimeUS as time_boot_ms) so they are reconstructed like stored messages.
+        The attitude is the quaternion of the first EKF core (XKQ, XKQ1 or NKQ1, ATT if there are none) with the
+        rates of the first IMU, the position is POS with the velocity and heading of the first EKF core (XKF1 or NKF1)"""
+        log = log if isinstance(log, DataFlash) else DataFlash(log)
+
+        def frame(names: list, instance: str=None):
+            name = next((n for n in names if n in log.names), None)
+            if name is None:
+                return None
+            df = log.dataframe(name)
+            return df[df[instance] == 0] if instance in df.columns else df
+
+        def at(df, names: list, t: np.ndarray) -> dict:
+            return interpolate(df.TimeUS.to_numpy() * 1e-6, {n: df[n].to_numpy() for n in names}, t)[0]
+
+        att, pos, ekf, imu = frame(["XKQ", "XKQ1", "NKQ1"], "C"), frame(["POS"]), frame(["XKF1", "NKF1"], "C"), frame(["IMU"], "I")
+        if any(df is None for df in [pos, ekf, imu]):
+            raise ValueError(f"{log.path} needs POS, XKF1 (or NKF1) and IMU messages to reconstruct States")
+        if att is not None:
+            q = att.loc[:, ["Q1", "Q2", "Q3", "Q4"]].to_numpy()
+        else:
+            att = frame(["ATT"])
+            q = Quaternion.from_euler(Point(np.radians(att.loc[:, ["Roll", "Pitch", "Yaw"]].to_numpy()))).data
+
+        gyro = at(imu, ["GyrX", "GyrY", "GyrZ"], att.TimeUS.to_numpy() * 1e-6)
+        vel = at(ekf, ["VN", "VE", "VD", "Yaw"], pos.TimeUS.to_numpy() * 1e-6)
+        return {
+            AttitudeQuaternion.id: mavlink_columns(
+                AttitudeQuaternion.id, att.index, time_boot_ms=att.TimeUS.to_numpy() * 1e-3,
+                q1=q[:, 0], q2=q[:, 1], q3=q[:, 2], q4=q[:, 3], 
+                rollspeed=gyro["GyrX"], pitchspeed=gyro["GyrY"], yawspeed=gyro["GyrZ"]
+            ),
+            GlobalPositionInt.id: mavlink_columns(
+                GlobalPositionInt.id, pos.index, time_boot_ms=pos.TimeUS.to_numpy() * 1e-3,
+                lat=pos.Lat.to_numpy() * 1e7, lon=pos.Lng.to_numpy() * 1e7, alt=pos.Alt.to_numpy() * 1e3, 
+                relative_alt=pos.RelHomeAlt.to_numpy() * 1e3,
+                vx=vel["VN"] * 100, vy=vel["VE"] * 100, vz=vel["VD"] * 100, hdg=(vel["Yaw"] % 360) * 100
+            ),
+            ScaledIMU.id: mavlink_columns(
+                ScaledIMU.id, imu.index, time_boot_ms=imu.TimeUS.to_numpy() * 1e-3,
+                xacc=imu.AccX.to_numpy() / 9.80665e-3, yacc=imu.AccY.to_numpy() / 9.80665e-3, zacc=imu.AccZ.to_numpy() / 9.80665e-3,
+                xgyro=imu.GyrX.to_numpy() * 1e3, ygyro=imu.GyrY.to_numpy() * 1e3, zgyro=imu.GyrZ.to_numpy() * 1e3
+            )
+        }
+
+
+class StateStream(MessageStream):
+    """A State for every trigger message, from the latest attitude, position and imu messages received with it.
+    The reader thread only keeps the latest message of each type and queues them together when the trigger
+    arrives, the States are built by whoever takes them from the stream, so batch builds many in one pass.
+    Nothing is queued until one of each has been received.
+
+    coherent: instead of the latest messages, interpolate every input to the clock time of the trigger
+        (StateMaker.reconstruct) from the ring buffers. A trigger is queued once every input has a sample after
+        it, so States lag by up to the period of the slowest input. Times without samples within tolerance are
+        rejected and counted, get returns None for them."""
+    def __init__(self, vehicle, trigger: int=AttitudeQuaternion.id, maxlen: int=1000, policy: str="drop_oldest", 
+                 callback: Callable=None, block_timeout: float=None, coherent: bool=False, tolerance: float=0.2, clock: str="time_boot_ms") -> None:
+        self.vehicle = vehicle
+        self.coherent = coherent
+        if coherent and any(vehicle.conn.message_depth(wr.id) is None for wr in StateMaker.wrappers.values()):
+            raise ValueError("A coherent StateStream needs ring buffers of its inputs, set the depth of the Connection")
+        self.tolerance = tolerance
+        self.clock = clock
+        self.pending = deque()
+        self.rejected = 0
+        self.rotation = vehicle.origin.rotation
+        self.pos = vehicle.origin.pos
+        self.latest = {wr.id: None for wr in StateMaker.wrappers.values()}
+        self.trigger = trigger
+        self._trigger_index = list(self.latest.keys()).index(trigger)
+        self.newest = {id: -np.inf for id in self.latest.keys()}
+        super().__init__(
+            vehicle.conn, vehicle.sysid, list(self.latest.keys()), maxlen, policy, 
+            callback, lambda msgs: self.build([msgs]), block_timeout
+        )
+
+    def notify(self, lm):
+        if self.coherent:
+            msg = lm.last_message
+            t = msg._timestamp if self.clock == "timestamp" else getattr(msg, self.clock) * vehicle_clocks[self.clock]
+            self.newest[lm.id] = t
+            if lm.id == self.trigger:
+                self.pending.append(t)
+            ready = min(self.newest.values())
+            while len(self.pending) > 0 and self.pending[0] <= ready:
+                self.put(self.pending.popleft())
+            return
+        self.latest[lm.id] = lm.last_message
+        if lm.id == self.trigger and None not in self.latest.values():
+            self.put(tuple(self.latest.values()))
+
+    def build(self, entries: list) -> State:
+        """one State with a row for each queued set of messages, timed by the trigger messages.
+        In coherent mode the entries are clock times"""
+        if self.coherent:
+            inputs = {id: self.vehicle.msgs[id].recent() for id in self.ids}   # copied, the reader keeps appending
+            st, valid = StateMaker.reconstruct(inputs, self.rotation, self.pos, np.array(entries), self.tolerance, self.clock)
+            self.rejected += int(np.sum(~valid))
+            return st
+        matt, mpos, macc = [wr.parse_many([e[i] for e in entries]) for i, wr in enumerate(StateMaker.wrappers.values())]
+        t = np.array([e[self._trigger_index]._timestamp for e in entries])
+        return StateMaker.build(self.rotation, self.pos, matt, mpos, macc, Time.from_t(t))
+
+    def batch(self, n: int=None, timeout: float=None) -> State:
+        """the next n States (waiting up to timeout for each) or, if n is None, all that are queued, as one State"""
+        entries = self._pop_all() if n is None else [self._pop(timeout) for _ in range(n)]
+        return self.build(entries) if len(entries) > 0 else None
+
+
+def _combinator_method(name: str, request: str):
+    def method(self, *args, **kwargs):
+        return getattr(self, name).generate(request, *args, **kwargs)
+    method.__name__ = f"{request}_{name}"
+    return method
+
+
+def add_combinators(cls: type) -> None:
+    """add each combinator to a vehicle class as an attribute built on first use, with last_ / get_ / next_ methods"""
     for cname, Combi in combinators.items():
-        combi = Combi(vehicle=obj)
-        if reduced_ids is None or all([id in reduced_ids for id in combi.ids]):
-            setattr(obj, cname.lower(), combi)
-            setattr(obj, f"last_{cname.lower()}", lambda *args, **kwargs: combi.generate("last", *args, **kwargs))
-            setattr(obj, f"get_{cname.lower()}", lambda *args, **kwargs: combi.generate("get", *args, **kwargs))
-            setattr(obj, f"next_{cname.lower()}", lambda *args, **kwargs: combi.generate("next", *args, **kwargs))
+        name = cname.lower()
+        combi = cached_property(Combi)
+        combi.__set_name__(cls, name)
+        setattr(cls, name, combi)
+        for request in ["last", "get", "next"]:
+            setattr(cls, f"{request}_{name}", _combinator_method(name, request))
@@ -0,0 +1,189 @@
+"""Send commands without waiting for each one, matching the COMMAND_ACK replies to them as they arrive.
+
+Every command returns a Future and stays in flight until it is acknowledged, so a burst of commands
+takes one round trip rather than one each. A COMMAND_ACK only names the command, so it is matched to
+the oldest command in flight with the same command id to the component it came from (or to the
+broadcast component), the vehicle answers commands in the order it receives them. An ack addressed
+to another system or component (another GCS on the link) is ignored.
+
+A command that is not acknowledged within its timeout is sent again, with the confirmation field
+incremented for COMMAND_LONG. After retries it fails with Timeout. MAV_RESULT_IN_PROGRESS keeps a
+command in flight without sending it again, any other result than MAV_RESULT_ACCEPTED fails it with
+CommandFailed. Deadlines are checked by a job on the shared scheduler while anything is in flight.
+
+The time from the first transmission of a command to its final ack goes into an IntervalHistogram
+for each command name.
+"""
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future
+from threading import Lock
+from time import time
+import numpy as np
+from loguru import logger
+from .messages import mavlink, wrappers
+from .commands import command_map, command_ids
+from .arrival_stats import IntervalHistogram
+from .scheduling import scheduler, Timeout, CommandFailed
+
+
+acknowledged = [mavlink.MAVLINK_MSG_ID_COMMAND_LONG, mavlink.MAVLINK_MSG_ID_COMMAND_INT]
+
+
+class PendingCommand:
+    def __init__(self, name: str, msg, timeout: float, retries: int) -> None:
+        self.name = name
+        self.msg = msg
+        self.timeout = timeout
+        self.retries = retries
+        self.future = Future()
+        self.first = time()
+        self.deadline = self.first + timeout
+        self.attempts = 1
+        self.progress = None
+
+    @property
+    def key(self) -> tuple:
+        return (self.msg.command, self.msg.target_component)
+
+
+class CommandStats:
+    def __init__(self) -> None:
+        self.sent = 0
+        self.retransmits = 0
+        self.accepted = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.latency = IntervalHistogram()
+
+    def stats(self) -> dict:
+        counts = np.array(self.latency.counts)
+        return dict(
+            sent=self.sent,
+            retransmits=self.retransmits,
+            accepted=self.accepted,
+            failed=self.failed,
+            timeouts=self.timeouts,
+            p50=self.latency.percentile(50, counts),
+            p99=self.latency.percentile(99, counts),
+        )
+
+
+class CommandSender:
+    def __init__(self, conn, sysid: int, timeout: float=1.0, retries: int=3, check_rate: float=50.0) -> None:
+        """timeout and retries are the defaults for each command, check_rate is how often (Hz) deadlines are checked"""
+        self.conn = conn
+        self.sysid = sysid
+        self.timeout = timeout
+        self.retries = retries
+        self.check_rate = check_rate
+        self.in_flight: dict[tuple, deque[PendingCommand]] = {}
+        self.commands: dict[str, CommandStats] = {}
+        self.unmatched = 0
+        self.ignored = 0
+        self._lock = Lock()
+        self._job = None
+        conn.subscribe(sysid, mavlink.MAVLINK_MSG_ID_COMMAND_ACK, self)
+
+    def __repr__(self):
+        return f"CommandSender(sysid={self.sysid}, in_flight={self.pending})"
+
+    @property
+    def pending(self) -> int:
+        return sum(len(q) for q in list(self.in_flight.values()))
+
+    def send(self, name: str, *args, timeout: float=None, retries: int=None, **kwargs) -> Future:
+        """send a command and return a Future of its CommandAck"""
+        msgid = command_ids[name]
+        if msgid not in acknowledged:
+            raise ValueError(f"{name} is not acknowledged with a COMMAND_ACK")
+        msg = wrappers[msgid](
+            time(), self.sysid, self.conn.master.target_component, *command_map[msgid][name](*args, **kwargs)
+        ).encoder()
+        cmd = PendingCommand(
+            name, msg, self.timeout if timeout is None else timeout, self.retries if retries is None else retries
+        )
+        with self._lock:
+            self.in_flight.setdefault(cmd.key, deque()).append(cmd)
+            self.commands.setdefault(name, CommandStats()).sent += 1
+            if self._job is None:
+                self._job = scheduler().add(self._check, self.check_rate)
+        self._transmit(cmd)
+        return cmd.future
+
+    def _transmit(self, cmd: PendingCommand):
+        logger.debug(f"Sending command {cmd.name}, attempt {cmd.attempts}")
+        self.conn.master.mav.send(cmd.msg)
+
+    def _for_us(self, ack) -> bool:
+        """False if the ack names a target (0 is unset) that is not this end of the link"""
+        mav = self.conn.master.mav
+        return ack.target_system in (0, mav.srcSystem) and ack.target_component in (0, mav.srcComponent)
+
+    def notify(self, lm):
+        ack = lm.last_message
+        if not self._for_us(ack):
+            self.ignored += 1
+            return
+        with self._lock:
+            queue = self.in_flight.get((ack.command, ack.get_srcComponent())) or self.in_flight.get((ack.command, 0))
+            if not queue:
+                self.unmatched += 1
+                return
+            cmd = queue[0]
+            if ack.result == mavlink.MAV_RESULT_IN_PROGRESS:
+                cmd.progress = ack.progress
+                cmd.deadline = time() + cmd.timeout
+                return
+            queue.popleft()
+            stats = self.commands[cmd.name]
+            stats.latency.add_interval(time() - cmd.first)
+            if ack.result == mavlink.MAV_RESULT_ACCEPTED:
+                stats.accepted += 1
+            else:
+                stats.failed += 1
+        if ack.result == mavlink.MAV_RESULT_ACCEPTED:
+            cmd.future.set_result(lm.wrapper())
+        else:
+            cmd.future.set_exception(CommandFailed(
+                f"{cmd.name} failed with {mavlink.enums['MAV_RESULT'][ack.result].name}", lm.wrapper()
+            ))
+
+    def _check(self):
+        """send again the commands whose deadline has passed, fail those that are out of retries"""
+        now = time()
+        resend, expired = [], []
+        with self._lock:
+            for queue in self.in_flight.values():
+                for cmd in queue:
+                    if cmd.deadline > now:
+                        continue
+                    if cmd.attempts > cmd.retries:
+                        expired.append(cmd)
+                    else:
+                        cmd.attempts += 1
+                        cmd.deadline = now + cmd.timeout
+                        self.commands[cmd.name].retransmits += 1
+                        resend.append(cmd)
+            for cmd in expired:
+                self.in_flight[cmd.key].remove(cmd)
+                self.commands[cmd.name].timeouts += 1
+            self.in_flight = {k: q for k, q in self.in_flight.items() if len(q) > 0}
+            if len(self.in_flight) == 0:
+                self._job.cancel()
+                self._job = None
+        for cmd in resend:
+            if hasattr(cmd.msg, "confirmation"):
+                cmd.msg.confirmation = min(cmd.msg.confirmation + 1, 255)
+            self._transmit(cmd)
+        for cmd in expired:
+            cmd.future.set_exception(Timeout(f"No ack for command {cmd.name} after {cmd.attempts} attempts"))
+
+    def stats(self) -> dict[str, dict]:
+        """counts and round trip percentiles for each command sent"""
+        return {name: s.stats() for name, s in list(self.commands.items())}
+
+    def histogram(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        """round trip bucket lower edges and counts of a command"""
+        hist = self.commands[name].latency
+        return hist.edges, np.array(hist.counts)
@@ -1,5 +1,6 @@
 from . import mavlink
 from geometry import GPS
+from functools import wraps
 
 command_map = {
     mavlink.MAVLINK_MSG_ID_COMMAND_LONG: dict(),
@@ -12,6 +13,7 @@ def pad_zeros(arr, length):
     return [arr[i] if i < len(arr) else 0 for i in range(length)]
 
 def _command(fun, msgid, length):
+    @wraps(fun)
     def outer(*args, **kwargs):
         return pad_zeros(fun(*args, **kwargs), length)
     command_map[msgid][fun.__name__] = outer
@@ -71,4 +73,4 @@ def do_reposition(pos: GPS, speed=-1, radius=0, yaw=0):
     return (speed, 1, radius, yaw, int(pos.lat[0] * 1e7), int(pos.long[0] * 1e7), pos.alt[0])
 
 all_commands = {k: v for m in command_map.values() for k, v in m.items()}
-
+command_ids = {k: msgid for msgid, m in command_map.items() for k in m.keys()}
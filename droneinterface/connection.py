@@ -3,14 +3,27 @@ from pymavlink import mavutil, DFReader
 from typing import Union
 from time import time, sleep
 from datetime import datetime
-from threading import Thread, Event
+from threading import Thread, Condition, Lock
+from functools import partial
 from loguru import logger
 from pathlib import Path
 from tempfile import TemporaryDirectory
 import pandas as pd
-import sys
 from .last_message import LastMessage
+from .messages import mavlink
 from .scheduling.exceptions import Timeout
+from .scheduling.registry import Registry, Waiter
+from .storage import StorageWriter, stores, stored_files
+from .dataflash import DataFlash
+from .alignment import align
+from .combinators import StateMaker
+from .command_sender import CommandSender
+from flightdata import Origin, State
+from geometry import GPS
+from .link_stats import LinkStats
+from .capture import FrameSplitter, TlogWriter
+from .lazy_messages import LazyMessages
+from .scheduling.scheduler import scheduler
 
 
 class Connection(Thread):
@@ -21,32 +34,63 @@ class Connection(Thread):
             store_messages: Union[list[int], str]="all", 
             append=True, 
             n=2,
-            timeout=5
+            timeout=5,
+            writer: StorageWriter=None,
+            storage: str="csv",
+            depth: Union[int, float, dict]=None,
+            capture: bool=False,
+            decode: list[int]=None,
+            readonly: bool=None
         ):
+        """storage: "csv" for one text file per message type or "columnar" for typed binary columns
+        depth: how much recent history to keep in a ring buffer for each message type, an int is a number of messages, 
+            a float is seconds. A dict sets it per message id, with the None key as the default. None (the default)
+            keeps no ring buffers, they are needed for recent, window, join_messages(window=) and coherent StateStreams.
+        capture: record the raw packets to outdir/capture.tlog instead of storing each message type. Only the 
+            ids in decode (default heartbeat) and those something is waiting for or subscribed to are decoded, 
+            see capture.Tlog to decode the rest afterwards
+        readonly: open stored message types without modifying them, the default when there is no master.
+            Stored types are only listed here, each is loaded the first time it is used."""
         super().__init__(daemon=True)
         self.master = master
+        self.depth = depth
+        self.writer = StorageWriter() if writer is None else writer
+        self.suffix = stores[storage].suffix
         self.outdir = Path(TemporaryDirectory().name) if outdir is None else outdir
         self.outdir.mkdir(exist_ok=True)
         
         self.systems: list[int] = []
-        self.msgs: dict[int: dict[str: LastMessage]] = {}   #first key system id, second key message id
+        self.msgs: dict[int: LazyMessages[str: LastMessage]] = {}   #first key system id, second key message id
+        self.readonly = master is None if readonly is None else readonly
         
-        self.waiters = {}
+        self.registry = Registry()
+        self.links: dict[tuple, LinkStats] = {}
+        self._sampler = None
+        self._closed = False
+        self.arrivals: dict[int, Condition] = {}
+        self.command_senders: dict[int, CommandSender] = {}
+        self._senders_lock = Lock()
         if any(Path(self.outdir).iterdir()):
             if not append:
                 raise Exception("Outdir is not empty. Provide an empty directory or set append=True")
             else:
-                for f in outdir.glob("*.csv"):
-                    sysid = int(f.name.split("_")[0])
-                    if sysid not in self.msgs:
-                        self.msgs[sysid] = {}
-                    lm = LastMessage.build_csv(f)
-                    self.msgs[sysid][lm.id] = lm
+                for f in stored_files(self.outdir):
+                    sysid, msgid = [int(v) for v in f.stem.split("_")[:2]]
+                    self.add_system(sysid)
+                    self.msgs[sysid].add_pending(msgid, partial(
+                        LastMessage.build_csv, f, 
+                        None if self.readonly else self.writer, 
+                        self.message_depth(msgid), 
+                        self.readonly
+                    ))
                     
         self.n = n
         self.timeout = timeout
-        self.store_messages = store_messages
+        self.store_messages = "none" if capture else store_messages
         self.last_t = None
+        self.capture = TlogWriter(self.outdir / "capture.tlog") if capture else None
+        self.splitter = FrameSplitter()
+        self.decode = {mavlink.MAVLINK_MSG_ID_HEARTBEAT} if decode is None else set(decode)
 
         if isinstance(self.store_messages, list):
             self.check_store = lambda id: id in self.store_messages
@@ -60,17 +104,19 @@ class Connection(Thread):
             self.builder = LastMessage.build_bin
             self._system_from_message = lambda msg: 1
             self._id_from_message = lambda msg : msg.get_type()            
+            self._account_link = lambda msg: None
         else:
             self.builder = LastMessage.build_mavlink
             self._system_from_message = lambda msg : msg.get_srcSystem()
             self._id_from_message = lambda msg : msg.__class__.id
+            self._account_link = self._account_mavlink
 
     @staticmethod
-    def connect(constr, outdir: Path=None, store_messages: Union[list[int], str]="all", append=True, n=2, timeout=5, **kwargs):
+    def connect(constr, outdir: Path=None, store_messages: Union[list[int], str]="all", append=True, n=2, timeout=5, writer: StorageWriter=None, storage: str="csv", depth: Union[int, float, dict]=None, capture: bool=False, decode: list[int]=None, **kwargs):
         return Connection(
             mavutil.mavlink_connection(constr, **kwargs),
             None if (outdir is None or store_messages=="none") else Connection.create_folder(outdir),
-            store_messages, append, n, timeout
+            store_messages, append, n, timeout, writer, storage, depth, capture, decode
         )
     
     def __str__(self):
@@ -82,29 +128,70 @@ class Connection(Thread):
         raise AttributeError(f"{name} not found in {self}")
 
     def run(self):
-        while self.is_alive():
+        if self.source == "MAV":
+            self._sampler = scheduler().add(self._sample_links, 1.0)
+        if self.capture is not None:
+            return self._run_capture()
+        while not self._closed:
             try:
                 msg = self.master.recv_msg()
                 if msg is None or not hasattr(msg, 'id'):
                     if self.source == "DF":
                         break
                     else:
-                        if self.timeout is not None:
-                            if self.last_t is not None:
-                                if time() - self.last_t > self.timeout:
-                                    raise Timeout(f"Connection lost, timeout after {self.timeout} seconds.")
+                        self._check_timeout()
+                        self.master.select(0.1)
                         continue
                 self.last_t = time()
-                system_id, msg = self.receive_message(msg)
-                
-                waiter_index = self.waiters[system_id]
-                if msg.id in waiter_index:
-                    waiter_index[msg.id].set()
+                self._account_link(msg)
+                self._deliver(msg)
 
             except Exception as ex:
                 logger.exception(f'Connection Error {ex}')
                 if isinstance(ex, Timeout):
                     break
+
+    def _run_capture(self):
+        while not self._closed and not self.capture.closed:
+            try:
+                data = self.master.recv(2**16)
+                if not data:
+                    self._check_timeout()
+                    self.master.select(0.1)
+                    continue
+                self.last_t = t = time()
+                subscribers = self.registry.subscribers
+                for frame, msgid, sysid, compid, seq in self.splitter.feed(data):
+                    self.capture.write(t, frame, msgid, sysid, compid)
+                    self._link((sysid, compid)).receive(seq, len(frame))
+                    if msgid in self.decode or (sysid, msgid) in subscribers or (sysid, None) in subscribers:
+                        try:
+                            msg = self.master.mav.decode(bytearray(frame))
+                        except mavlink.MAVError as ex:
+                            logger.debug(f"Failed to decode captured frame: {ex}")
+                            continue
+                        self.master.post_message(msg)
+                        msg._timestamp = t
+                        self._deliver(msg)
+            except Exception as ex:
+                logger.exception(f'Connection Error {ex}')
+                if isinstance(ex, Timeout):
+                    break
+
+    def _check_timeout(self):
+        if self.timeout is not None and self.last_t is not None:
+            if time() - self.last_t > self.timeout:
+                raise Timeout(f"Connection lost, timeout after {self.timeout} seconds.")
+
+    def _deliver(self, msg):
+        system_id, msg = self.receive_message(msg)
+        try:
+            self.registry.notify(system_id, msg.id, msg)
+        finally:
+            arrival = self.arrivals[system_id]
+            with arrival:
+                arrival.notify_all()
+
     def receive_message(self, msg):
         system_id = self.add_system(self._system_from_message(msg))
 
@@ -113,30 +200,98 @@ class Connection(Thread):
         if msg_id not in self.msgs[system_id]:
             self.msgs[system_id][msg_id] = self.builder(
                 msg, 
-                (self.outdir / f"{system_id}_{msg_id}.csv") if self.check_store(msg_id) else None,
-                self.n
+                (self.outdir / f"{system_id}_{msg_id}{self.suffix}") if self.check_store(msg_id) else None,
+                self.n,
+                self.writer,
+                self.message_depth(msg_id)
             )
         
         return system_id, self.msgs[system_id][msg_id].receive_message(msg)
     
+    def available(self) -> list[tuple]:
+        """(system id, message id) of every type received or stored, without loading any"""
+        return [(sysid, msgid) for sysid in self.systems for msgid in self.msgs[sysid].keys()]
+
+    def load(self, systemid: int=None, ids: list=None):
+        """load stored message types now rather than on first use, in parallel"""
+        for sysid in (self.systems if systemid is None else [systemid]):
+            self.msgs[sysid].load(ids)
+
+    def message_depth(self, msgid) -> Union[int, float]:
+        if isinstance(self.depth, dict):
+            return self.depth.get(msgid, self.depth.get(None))
+        return self.depth
+
+    def _link(self, key: tuple) -> LinkStats:
+        link = self.links.get(key)
+        if link is None:
+            link = self.links[key] = LinkStats(*key)
+        return link
+
+    def _account_mavlink(self, msg):
+        self._link((msg.get_srcSystem(), msg.get_srcComponent())).receive(msg.get_seq(), len(msg.get_msgbuf()))
+
+    def _sample_links(self):
+        for link in list(self.links.values()):
+            link.sample()
+
+    def link_stats(self, seconds: float=10.0) -> dict[tuple, dict]:
+        """packet loss and throughput for each (system, component) heard, rolling values over seconds"""
+        return {k: v.stats(seconds) for k, v in list(self.links.items())}
+
     def add_system(self, system_id):
         if system_id not in self.systems:
             self.systems.append(system_id)
-            self.msgs[system_id] = {}
-            self.waiters[system_id] = {}
+            self.msgs[system_id] = LazyMessages()
+            self.arrivals[system_id] = Condition()
         return system_id
 
-    def add_waiter(self, systemid, msgid) -> Event:
-        if msgid in self.waiters[systemid]:
-            self.waiters[systemid][msgid].clear()
-        else:
-            self.waiters[systemid][msgid] = Event()
-        return self.waiters[systemid][msgid]
+    def wait_for_message(self, systemid, timeout=None) -> bool:
+        """block until any message arrives from systemid, return False on timeout"""
+        arrival = self.arrivals[systemid]
+        with arrival:
+            return arrival.wait(timeout)
+
+    def add_waiter(self, systemid, msgid, after: int=None) -> Waiter:
+        """a handle that is set by the next message, or by the first message counted after `after`"""
+        lm = self.msgs[systemid].get(msgid)
+        if after is None:
+            after = 0 if lm is None else lm.count
+        waiter = self.registry.waiter(systemid, msgid, after)
+        # check again now it is registered, so a message that arrived in between is not missed
+        lm = self.msgs[systemid].get(msgid)
+        if lm is not None:
+            waiter.notify(lm)
+        return waiter
+
+    def remove_waiter(self, waiter: Waiter):
+        waiter.remove()
+
+    def subscribe(self, systemid, msgid, subscriber):
+        """subscriber.notify(lm) is called on the reader thread for every message received"""
+        return self.registry.add(systemid, msgid, subscriber)
+
+    def unsubscribe(self, systemid, msgid, subscriber):
+        self.registry.remove(systemid, msgid, subscriber)
 
-    def remove_waiter(self, systemid, msgid):
-        if systemid in self.waiters:
-            if msgid in self.waiters[systemid]:
-                del self.waiters[systemid][msgid]
+    def command_sender(self, systemid: int) -> CommandSender:
+        """the CommandSender for a system, created the first time it is used"""
+        with self._senders_lock:
+            if systemid not in self.command_senders:
+                self.command_senders[systemid] = CommandSender(self, systemid)
+            return self.command_senders[systemid]
+
+    def storage_stats(self) -> dict:
+        return self.writer.stats
+
+    def close(self):
+        """stop reading, write any queued messages to disk and stop the storage thread"""
+        self._closed = True
+        if self._sampler is not None:
+            self._sampler.cancel()
+        if self.capture is not None:
+            self.capture.close()
+        self.writer.stop()
 
     @staticmethod    
     def create_folder(path: Path):
@@ -152,30 +307,38 @@ class Connection(Thread):
                     return datetime.strptime(path.name[5:], '%Y_%m_%d_%H_%M_%S')
 
     @staticmethod
-    def parse_bin(path:str, store_messages: list):
-        conn = Connection(
-            mavutil.mavlink_connection(path),
-            store_messages=store_messages,
-        )
-        conn.start()
-        while conn.is_alive():
-            sys.stdout.write("\r%d%%" % conn.master.percent)
-            sys.stdout.flush()
-
-        return conn.join_messages(store_messages)
-
-    def join_messages(self, ids: list, systemid:int=1) -> pd.DataFrame:
-        joined_log = self.msgs[systemid][ids[0]].all_messages()
-        joined_log.columns = [f"{ids}_{c}" for c in joined_log.columns]
-        for id in ids[1:]:
-            if id=='PARM':
-                continue
-            df = self.msgs[systemid][id].all_messages()
-            df.columns = [f"{id}_{c}" for c in df.columns]
-
-            joined_log = pd.merge_asof(joined_log, df, on='timestamp')
-            
-        return joined_log
+    def parse_bin(path:str, store_messages: list, base=None, method="asof", tolerance=None, rate: float=None):
+        """decode the requested message types from a DataFlash log and align them, by default on the timestamps of the first
+        or at rate Hz if rate is given"""
+        frames = DataFlash(path).dataframes(store_messages)
+        ids = [id for id in store_messages if id in frames]
+        streams = {id: frames[id] for i, id in enumerate(ids) if i == 0 or id != "PARM"}
+        return align(streams, ids[0] if base is None else base, method, tolerance, rate).reset_index()
+
+    @staticmethod
+    def parse_bin_states(path: str, t0: float=None, t1: float=None, rate: float=None, origin: Origin=None, tolerance: float=0.5) -> State:
+        """one State from a DataFlash log as Vehicle.states gives for a stored session, see StateMaker.dataflash_inputs
+        for the messages used. origin defaults to the EKF origin (ORGN) or the first position"""
+        log = DataFlash(path)
+        if origin is None:
+            orgn = log.dataframe("ORGN") if "ORGN" in log.names else log.dataframe("POS", ["Lat", "Lng", "Alt"])
+            orgn = orgn.iloc[0]
+            origin = Origin("origin", GPS(orgn.Lat, orgn.Lng, orgn.Alt), 0.0)
+        return StateMaker.between(StateMaker.dataflash_inputs(log), origin.rotation, origin.pos, t0, t1, rate, tolerance)
+
+    def join_messages(self, ids: list, systemid:int=1, base=None, method="asof", tolerance=None, window: float=None, rate: float=None) -> pd.DataFrame:
+        """align several message types, by default on the timestamps of the first or at rate Hz if rate is given. 
+        See alignment for the options.
+        window: use the last window seconds held in memory rather than the stored messages"""
+        msgs = self.msgs[systemid]
+        streams = {id: msgs[id].window(window) if window is not None else msgs[id].arrays() for id in ids}
+        return align(streams, ids[0] if base is None else base, method, tolerance, rate).reset_index()
+
+    def arrival_stats(self, ids: list=None, systemid=1) -> dict:
+        """interval percentiles and rates for each message type, safe to call while messages are arriving"""
+        msgs = self.msgs[systemid]
+        ids = list(msgs.keys()) if ids is None else ids
+        return {id: msgs[id].arrivals.stats() for id in ids if id in msgs}
 
     def rates(self, ids: list=None, systemid=1):
         if ids is None:
@@ -0,0 +1,190 @@
+"""Decode ArduPilot DataFlash (.BIN) logs straight into DataFrames.
+
+Rather than stepping through the file one message at a time like DFReader, the whole file is
+mapped into a numpy buffer, every record header is located in one pass, and all the records of
+a requested type are decoded together by viewing their bytes as a structured dtype built
+from the FMT record.
+"""
+from __future__ import annotations
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from pymavlink.DFReader import FORMAT_TO_STRUCT
+
+
+HEAD1, HEAD2 = 0xA3, 0x95
+FMT_TYPE = 128
+FMT_LENGTH = 89
+_FMT_DTYPE = np.dtype([("type", "u1"), ("length", "u1"), ("name", "S4"), ("format", "S16"), ("columns", "S64")])
+_CHUNK = 2**16
+
+
+def _raw_field(code: str):
+    """convert a struct format code (eg 'h', '16s', '32h') into the on-disk numpy dtype field spec"""
+    count, char = (int(code[:-1]) if len(code) > 1 else 1), code[-1]
+    if char == "s":
+        return (f"S{count}",)
+    base = np.dtype(char).newbyteorder("<").str
+    return (base, (count,)) if count > 1 else (base,)
+
+
+def _gps_time(week, msec):
+    """GPS week and time of week to seconds since 1970, as DFReaderClock does"""
+    epoch = 86400*(10*365 + int((1980-1969)/4) + 1 + 6 - 2)
+    return epoch + 86400*7*week + msec*0.001 - 18
+
+
+class DFFormat:
+    def __init__(self, type: int, length: int, name: str, format: str, columns: list[str]):
+        self.type = type
+        self.length = length
+        self.name = name
+        self.format = format
+        self.columns = columns
+        self.dtype = np.dtype([(col, *_raw_field(FORMAT_TO_STRUCT[c][0])) for col, c in zip(columns, format)])
+        self.mults = {col: FORMAT_TO_STRUCT[c][1] for col, c in zip(columns, format) if FORMAT_TO_STRUCT[c][1] is not None}
+
+    def __repr__(self):
+        return f"DFFormat({self.type}, {self.name}, {self.format}, {self.columns})"
+
+
+class DataFlash:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.buf = np.fromfile(self.path, dtype=np.uint8)
+        self.formats: dict[int, DFFormat] = {}
+        self._find_records()
+        self._timebase = None
+
+    @property
+    def names(self) -> dict[str, DFFormat]:
+        return {f.name: f for f in self.formats.values()}
+
+    def _is_header(self, offsets: np.ndarray) -> np.ndarray:
+        ok = offsets + 2 < len(self.buf)
+        res = np.zeros(len(offsets), dtype=bool)
+        o = offsets[ok]
+        res[ok] = (self.buf[o] == HEAD1) & (self.buf[o + 1] == HEAD2)
+        return res
+
+    def _find_records(self):
+        buf = self.buf
+        candidates = np.flatnonzero((buf[:-2] == HEAD1) & (buf[1:-1] == HEAD2))
+        types = buf[candidates + 2]
+
+        # the format records have a fixed length so they can be read before anything else
+        fmts = candidates[types == FMT_TYPE]
+        fmts = fmts[(fmts + FMT_LENGTH == len(buf)) | self._is_header(fmts + FMT_LENGTH)]
+        for f in self._gather(fmts, _FMT_DTYPE):
+            name = f["name"].rstrip(b"\0").decode("ascii", "replace")
+            fmt = f["format"].rstrip(b"\0").decode("ascii", "replace")
+            cols = f["columns"].rstrip(b"\0").decode("ascii", "replace")
+            try:
+                dff = DFFormat(int(f["type"]), int(f["length"]), name, fmt, cols.split(",") if cols else [])
+            except (KeyError, TypeError, ValueError):
+                continue  # unsupported format characters, the type will be skipped
+            if dff.dtype.itemsize == dff.length - 3:
+                self.formats[dff.type] = dff
+
+        lengths = np.zeros(256, dtype=np.int64)
+        for f in self.formats.values():
+            lengths[f.type] = f.length
+        lengths[FMT_TYPE] = FMT_LENGTH
+
+        # a real record is followed by another header (or the end of the file)
+        ends = candidates + lengths[types]
+        valid = (lengths[types] > 0) & ((ends == len(buf)) | self._is_header(ends))
+        candidates, types, ends = candidates[valid], types[valid], ends[valid]
+
+        # records that do not overlap their neighbours are certain, where they do overlap (a false
+        # header inside a payload) walk the chain to pick the real one. A start beyond the expected
+        # one is a resync after corrupt data
+        prev_end = np.concatenate([[0], ends[:-1]])
+        next_start = np.concatenate([candidates[1:], [ends[-1] if len(ends) else 0]])
+        clean = (candidates >= prev_end) & (ends <= next_start)
+        keep = clean.copy()
+        amb = np.flatnonzero(~clean)
+        after_clean = (amb > 0) & clean[amb - 1]
+        expected = 0
+        for i, start, end, reset, prev in zip(
+            amb.tolist(), candidates[amb].tolist(), ends[amb].tolist(), 
+            after_clean.tolist(), ends[amb - 1].tolist()
+        ):
+            if reset:
+                expected = prev
+            if start >= expected:
+                keep[i] = True
+                expected = end
+        self.offsets = candidates[keep]
+        self.types = types[keep]
+
+    def _gather(self, offsets: np.ndarray, dtype: np.dtype) -> np.ndarray:
+        """copy the payloads of records at offsets into a structured array, in chunks to bound memory"""
+        out = np.empty(len(offsets), dtype=dtype)
+        cols = np.arange(3, 3 + dtype.itemsize)
+        for i in range(0, len(offsets), _CHUNK):
+            idx = offsets[i:i + _CHUNK, None] + cols
+            out[i:i + _CHUNK] = np.ascontiguousarray(self.buf[idx]).view(dtype)[:, 0]
+        return out
+
+    def records(self, name: str) -> np.ndarray:
+        """all the records of a type as a raw (unscaled) structured array"""
+        fmt = self.names[name]
+        return self._gather(self.offsets[self.types == fmt.type], fmt.dtype)
+
+    @property
+    def timebase(self) -> float:
+        """offset from TimeUS to unix time, from the first GPS message with a week number"""
+        if self._timebase is None:
+            self._timebase = 0.0
+            for name in ["GPS", "GPS2"]:
+                if name in self.names and all(c in self.names[name].columns for c in ["TimeUS", "GWk", "GMS"]):
+                    gps = self.records(name)
+                    gps = gps[(gps["TimeUS"] != 0) & (gps["GWk"] != 0)]
+                    if len(gps) > 0:
+                        self._timebase = _gps_time(int(gps["GWk"][0]), int(gps["GMS"][0])) - gps["TimeUS"][0] * 1e-6
+                        break
+        return self._timebase
+
+    def _carried_times(self) -> np.ndarray:
+        """timestamp of every record, records with no time of their own take the previous one"""
+        times = np.full(len(self.offsets), np.nan)
+        for fmt in self.formats.values():
+            if len(fmt.columns) > 0 and fmt.columns[0] == "TimeUS":
+                mask = self.types == fmt.type
+                times[mask] = self._gather(self.offsets[mask], np.dtype([("TimeUS", "<u8")]))["TimeUS"] * 1e-6
+        has_time = ~np.isnan(times)
+        last = np.maximum.accumulate(np.where(has_time, np.arange(len(times)), 0))
+        return np.where(has_time[last], times[last], 0.0) + self.timebase
+
+    def dataframe(self, name: str, fields: list[str]=None) -> pd.DataFrame:
+        """decode every record of one type, indexed by timestamp. fields limits the columns that are built"""
+        fmt = self.names[name]
+        recs = self.records(name)
+        fields = fmt.columns if fields is None else [f for f in fields if f in fmt.columns]
+
+        if len(fmt.columns) > 0 and fmt.columns[0] == "TimeUS":
+            timestamp = recs["TimeUS"] * 1e-6 + self.timebase
+        elif len(fmt.columns) > 0 and fmt.columns[0] == "TimeMS":
+            timestamp = recs["TimeMS"] * 1e-3 + self.timebase
+        else:
+            timestamp = self._carried_times()[self.types == fmt.type]
+
+        cols = {}
+        for col in fields:
+            arr = recs[col]
+            if arr.dtype.kind == "S":
+                cols[col] = np.char.decode(np.char.rstrip(arr, b"\0"), "ascii", "replace")
+            elif arr.ndim > 1:
+                for i in range(arr.shape[1]):
+                    cols[f"{col}_{i}"] = arr[:, i]
+            elif col in fmt.mults:
+                cols[col] = arr * fmt.mults[col]
+            else:
+                cols[col] = arr
+        return pd.DataFrame(cols, index=pd.Index(timestamp, name="timestamp"))
+
+    def dataframes(self, names: list[str], fields: dict[str, list[str]]=None) -> dict[str, pd.DataFrame]:
+        """decode several types, missing types are skipped"""
+        fields = {} if fields is None else fields
+        return {name: self.dataframe(name, fields.get(name)) for name in names if name in self.names}
@@ -6,29 +6,47 @@ from pathlib import Path
 import pandas as pd
 from functools import partial
 from collections import deque
+from loguru import logger
 from .messages import wrappers
+from .storage import StorageWriter, ColumnarStore, store_for, mavlink_dtype, dataflash_dtype
+from .ring_buffer import RingBuffer
+from .arrival_stats import ArrivalStats
 
 from . import mavlink
 
 class LastMessage:
-    def __init__(self, id, colmap: dict, rev_colmap: dict, outfile: Path=None, n=3):
+    def __init__(self, id, colmap: dict, rev_colmap: dict, outfile: Path=None, n=3, writer: StorageWriter=None, dtype: np.dtype=None, depth: Union[int, float]=None, readonly: bool=False):
+        """depth: keep the recent messages in a RingBuffer as well, an int is a number of rows, a float is seconds
+        readonly: read an existing outfile without creating or modifying it"""
         self.id = id
+        self.dtype = dtype
+        self.ring = None
+        if depth is not None and dtype is not None:
+            self.ring = RingBuffer(dtype, horizon=depth) if isinstance(depth, float) else RingBuffer(dtype, depth)
         self.history = deque(maxlen=n)
+        self.wrapped = {}   # history index: (message, its wrapper)
+        self.wrapped_hits = 0
+        self.wrapped_misses = 0
         self.last_time = None
+        self.count = 0
+        self.arrivals = ArrivalStats.for_dtype(dtype)
         self.colmap = colmap 
         self.rev_colmap = rev_colmap
         self.rate = 0
         self.outfile = outfile
+        self.store = None
         if self.outfile is not None:
-            if not self.outfile.exists():
-                with open(self.outfile, "w") as f:
-                    print(",".join(list(self.colmap.keys())), file=f)
-            else:
-                df = pd.read_csv(self.outfile)
-                for i in range(n):
-                    if i < len(df):
-                        self.history.appendleft(self.create_message(df.iloc[-(i+1)]))
-            self.io = open(self.outfile, "a")
+            exists = self.outfile.exists()
+            self.store = store_for(self.outfile)(self.outfile, self, writer, readonly)
+            if exists:
+                df = self.store.tail(n)
+                for i in range(len(df)):
+                    self.history.append(self.create_message(df.iloc[i]))
+                if len(self.history) > 0:
+                    self.last_time = self.history[-1]._timestamp
+                    t = self.times
+                    if t[-1] > t[0]:
+                        self.rate = (len(t) - 1) / (t[-1] - t[0])
 
     def __repr__(self):
         return f'LastMessage(age={time()-self.last_time}, rate={self.rate}, msg={self.last_message})'
@@ -42,7 +60,7 @@ class LastMessage:
         return self.history[-1]
 
     @staticmethod
-    def _build_mavlink(msgcls, outfile: Path=None, n=3):
+    def _build_mavlink(msgcls, outfile: Path=None, n=3, writer: StorageWriter=None, depth: Union[int, float]=None, readonly: bool=False):
         colmap = {"timestamp": lambda msg: msg._timestamp}
         rev_colmap = {}
         for fname, l in zip(msgcls.ordered_fieldnames, msgcls.lengths):
@@ -59,20 +77,25 @@ class LastMessage:
             colmap, 
             rev_colmap, 
             outfile, 
-            n
+            n,
+            writer,
+            mavlink_dtype(msgcls),
+            depth,
+            readonly
         )
 
     @staticmethod
-    def build_mavlink(msg, outfile: Path=None, n=3):
-        return LastMessage._build_mavlink(msg.__class__, outfile, n)
+    def build_mavlink(msg, outfile: Path=None, n=3, writer: StorageWriter=None, depth: Union[int, float]=None):
+        return LastMessage._build_mavlink(msg.__class__, outfile, n, writer, depth)
 
     @staticmethod
-    def build_csv(outfile: Path):
+    def build_csv(outfile: Path, writer: StorageWriter=None, depth: Union[int, float]=None, readonly: bool=False):
+        """load a stored message type, csv or columnar depending on the suffix"""
         msgid = int(outfile.stem.split("_")[1])         
-        return LastMessage._build_mavlink(mavlink.mavlink_map[msgid], outfile)
+        return LastMessage._build_mavlink(mavlink.mavlink_map[msgid], outfile, writer=writer, depth=depth, readonly=readonly)
 
     @staticmethod
-    def build_bin(msg, outfile: Path=None, n=3):
+    def build_bin(msg, outfile: Path=None, n=3, writer: StorageWriter=None, depth: Union[int, float]=None):
         colmap = {"timestamp": lambda msg: msg._timestamp}
         rev_colmap = dict()
         for fname in msg._fieldnames:
@@ -84,29 +107,83 @@ class LastMessage:
             colmap, 
             rev_colmap, 
             outfile, 
-            n
+            n,
+            writer,
+            dataflash_dtype(msg.fmt),
+            depth
         )
 
     def receive_message(self, msg):
         self.history.append(msg)
+        self.count += 1
         t = time()
         n = len(self.history)
         if self.last_time is not None:
             self.rate = self.rate * (n - 1) / n +  1 / (n * (t - self.last_time))
         self.last_time = t
-        if self.outfile is not None:
-            data = [str(v(msg)) for v in self.colmap.values()]
-            print(",".join(data), file=self.io)
-            self.io.flush()
+        self.arrivals.record(msg)
+        if self.store is not None:
+            self.store.append(msg)
+        if self.ring is not None:
+            try:
+                self.ring.append(self.row(msg))
+            except Exception as ex:
+                logger.exception(f"Failed to add message {self.id} to the ring buffer: {ex}")
         return self
 
+    def format_row(self, msg) -> str:
+        return ",".join([str(v(msg)) for v in self.colmap.values()])
+
+    def row(self, msg) -> tuple:
+        return tuple([msg._timestamp] + [getattr(msg, name) for name in self.dtype.names[1:]])
+
     def create_message(self, data:pd.Series):
         msg =  mavlink.mavlink_map[self.id](**{k:rmap(data) for k, rmap in self.rev_colmap.items()})
         msg._timestamp = data.name
         return msg
 
     def all_messages(self) -> pd.DataFrame:
-        return pd.read_csv(self.outfile).set_index("timestamp")
+        self.store.flush()
+        return self.store.read()
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """all the stored messages as one typed array per field"""
+        self.store.flush()
+        return self.store.arrays()
+
+    @staticmethod
+    def _view(rows: np.ndarray, frame: bool):
+        return ColumnarStore.to_frame({name: rows[name] for name in rows.dtype.names}) if frame else rows
+
+    def _ring(self) -> RingBuffer:
+        if self.ring is None:
+            raise ValueError(f"No ring buffer is kept for message {self.id}, set the depth of the Connection")
+        return self.ring
+
+    def recent(self, n: int=None, frame: bool=False) -> Union[np.ndarray, pd.DataFrame]:
+        """a copy of the latest n messages from the ring buffer, a structured array or a DataFrame"""
+        return LastMessage._view(self._ring().last(n, copy=True), frame)
+
+    def window(self, seconds: float, end: float=None, frame: bool=False) -> Union[np.ndarray, pd.DataFrame]:
+        """a copy of the messages from the ring buffer in the seconds up to end (default the latest message)"""
+        return LastMessage._view(self._ring().window(seconds, end, copy=True), frame)
 
     def wrapper(self, i=-1):
-        return wrappers[self.id].parse(self.history[i])
+        """the wrapper of history[i], parsed once per message, or None if nothing has been received. The cache 
+        entry for index i is replaced when a new message moves into that place in the history, so nothing is 
+        done when messages arrive. Every caller gets the same wrapper so it is read only, copy() it to change it"""
+        if len(self.history) == 0:
+            return None
+        msg = self.history[i]
+        cached = self.wrapped.get(i)
+        if cached is not None and cached[0] is msg:
+            self.wrapped_hits += 1
+            return cached[1]
+        self.wrapped_misses += 1
+        wr = wrappers[self.id].ReadOnly.parse(msg)
+        self.wrapped[i] = (msg, wr)
+        return wr
+
+    def batch(self, seconds: float=None):
+        """every stored message, or the last seconds of the ring buffer, parsed into one wrapper of arrays"""
+        return wrappers[self.id].parse_many(self.arrays() if seconds is None else self.window(seconds))
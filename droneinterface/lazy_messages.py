@@ -0,0 +1,73 @@
+"""The messages of one system, where the types stored in a folder are only loaded when first used.
+
+Opening a session folder only lists the files. Each stored type is registered with a loader
+and its LastMessage (which reads the end of the file and builds the column maps) is created the
+first time it is looked up, so an analysis that needs two message types only pays for two.
+"""
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Callable
+
+
+class LazyMessages(dict):
+    def __init__(self) -> None:
+        super().__init__()
+        self.pending: dict = {}
+        self._lock = Lock()
+        self._locks: dict = {}
+
+    def add_pending(self, msgid, loader: Callable):
+        """loader() builds the LastMessage for msgid when it is first needed"""
+        with self._lock:
+            self.pending[msgid] = loader
+
+    def __missing__(self, msgid):
+        with self._lock:
+            loader = self.pending.get(msgid)
+            key_lock = None if loader is None else self._locks.setdefault(msgid, Lock())
+        if loader is None:
+            raise KeyError(msgid)
+        with key_lock:
+            if not dict.__contains__(self, msgid):
+                dict.__setitem__(self, msgid, loader())
+                with self._lock:
+                    self.pending.pop(msgid, None)
+        return dict.__getitem__(self, msgid)
+
+    def __contains__(self, msgid):
+        return dict.__contains__(self, msgid) or msgid in self.pending
+
+    def get(self, msgid, default=None):
+        return self[msgid] if msgid in self else default
+
+    def keys(self):
+        with self._lock:
+            pending = list(self.pending.keys())
+        return list(dict.keys(self)) + [k for k in pending if not dict.__contains__(self, k)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def values(self):
+        self.load()
+        return dict.values(self)
+
+    def items(self):
+        self.load()
+        return dict.items(self)
+
+    @property
+    def loaded(self) -> list:
+        return list(dict.keys(self))
+
+    def load(self, ids: list=None):
+        """build the pending LastMessages now, in parallel"""
+        with self._lock:
+            ids = list(self.pending.keys()) if ids is None else [id for id in ids if id in self.pending]
+        if len(ids) > 0:
+            with ThreadPoolExecutor() as pool:
+                list(pool.map(self.__getitem__, ids))
@@ -0,0 +1,77 @@
+"""Packet loss on a MAVLink link, from the sequence number in each packet header.
+
+Each (system, component) numbers its packets 0-255 and wraps, so a jump from the expected number is a
+burst of lost packets and a repeat of the previous number is a duplicate. A packet that arrives with
+the expected number costs one comparison, everything else is handled off the hot path.
+"""
+from __future__ import annotations
+from collections import deque, Counter
+from time import time
+
+
+class LinkStats:
+    def __init__(self, sysid: int, compid: int, maxlen: int=3600) -> None:
+        """maxlen: number of samples kept for rolling statistics, one is taken each time sample is called"""
+        self.sysid = sysid
+        self.compid = compid
+        self.expected = None
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.bytes = 0
+        self.bursts = Counter()
+        self.samples = deque(maxlen=maxlen)
+
+    def __repr__(self):
+        return f"LinkStats(sysid={self.sysid}, compid={self.compid}, received={self.received}, lost={self.lost})"
+
+    def receive(self, seq: int, nbytes: int):
+        if seq != self.expected and self._irregular(seq):
+            return
+        self.expected = (seq + 1) & 0xFF
+        self.received += 1
+        self.bytes += nbytes
+
+    def _irregular(self, seq: int) -> bool:
+        """account for a packet that is not the one expected, return True if it should be ignored"""
+        if self.expected is None:
+            self.samples.append((time(), 0, 0, 0))
+            return False
+        gap = (seq - self.expected) & 0xFF
+        if gap == 0xFF:
+            self.duplicates += 1
+            return True
+        self.lost += gap
+        self.bursts[gap] += 1
+        return False
+
+    @property
+    def loss(self) -> float:
+        """percentage of packets lost since the link was first seen"""
+        total = self.received + self.lost
+        return 100 * self.lost / total if total > 0 else 0.0
+
+    def sample(self):
+        self.samples.append((time(), self.received, self.lost, self.bytes))
+
+    def rolling(self, seconds: float=10.0) -> dict:
+        """loss percentage, packet rate and byte rate over roughly the last seconds, from the samples"""
+        now = (time(), self.received, self.lost, self.bytes)
+        then = next((s for s in reversed(self.samples) if now[0] - s[0] >= seconds), self.samples[0] if self.samples else now)
+        dt, received, lost, nbytes = [a - b for a, b in zip(now, then)]
+        return dict(
+            loss=100 * lost / (received + lost) if received + lost > 0 else 0.0,
+            packets_per_s=received / dt if dt > 0 else 0.0,
+            bytes_per_s=nbytes / dt if dt > 0 else 0.0,
+        )
+
+    def stats(self, seconds: float=10.0) -> dict:
+        return dict(
+            received=self.received,
+            lost=self.lost,
+            duplicates=self.duplicates,
+            loss=self.loss,
+            bytes=self.bytes,
+            bursts=dict(sorted(self.bursts.items())),
+            **{f"rolling_{k}": v for k, v in self.rolling(seconds).items()},
+        )
@@ -5,3 +5,9 @@ from .wrappers import *
 
 
 wrappermap = {wr.__name__.lower(): wr for wr in wrappers.values()}
+
+
+def wrap(msg):
+    """the wrapper for a raw message, or the message itself if there is no wrapper for it"""
+    wrapper = wrappers.get(msg.get_msgId())
+    return msg if wrapper is None else wrapper.parse(msg)
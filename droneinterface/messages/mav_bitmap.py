@@ -1,32 +1,73 @@
 from droneinterface.messages import mavlink
 from functools import partial
+import numpy as np
+import pandas as pd
 
 enums = {}
 
 def mav_bitmap(name):
+    """A class per enum whose properties test one flag of value. value can be one integer or an array of
+    them (from parse_many), then each flag is a boolean array and frame / transitions cover every row at once.
+    The lookup and the flag masks are built once per enum and shared by every instance."""
     if name not in enums:
         enum = mavlink.enums[name]
         lookup = {v.name.lower(): k for k, v in enum.items()}
+        flags = {k: v for k, v in lookup.items() if v > 0 and v & (v - 1) == 0}   # the single bit entries
+        masks = np.array(list(flags.values()), dtype=np.int64)
 
         def constructor(self, value):
-            self.value = value
+            self.value = np.asarray(value, dtype=np.int64) if isinstance(value, (list, tuple, np.ndarray)) else value
 
-        def getattr(self, name):
+        def length(self):
+            if np.ndim(self.value) == 0:
+                raise TypeError(f"{self.__class__.__name__} of one value has no len()")
+            return len(self.value)
+
+        def truth(self):
+            # one value is always true, as any object, rather than testing whether a flag is set
+            return np.ndim(self.value) == 0 or len(self.value) > 0
+
+        def test_flag(self, name):
             return lookup[name] & self.value == lookup[name]
 
         def repr(self):
+            if np.ndim(self.value) > 0:
+                return f"{self.__class__.__name__}(len={len(self.value)})"
             return f"{self.__class__.__name__}({self.value}:{[k for k, v in lookup.items() if v & self.value == v]})"
 
-        attrs = {name: property(partial(getattr, name=name)) for name in lookup.keys()}
+        def flag_array(self, m: np.ndarray=masks) -> np.ndarray:
+            """a boolean row for each value and a column for each flag in m"""
+            return (np.atleast_1d(self.value).astype(np.int64)[:, None] & m) == m
+
+        def frame(self, index=None) -> pd.DataFrame:
+            """every flag as a boolean column, index (such as the timestamps) labels the rows"""
+            return pd.DataFrame(flag_array(self), columns=list(flags.keys()), index=index)
+
+        def transitions(self, flag: str=None, index=None) -> pd.DataFrame:
+            """the rows where a flag (or any flag) changed, with the flag name and its new state"""
+            names = np.array(list(flags.keys()) if flag is None else [flag])
+            arr = flag_array(self, masks if flag is None else np.array([flags[flag]], dtype=np.int64))
+            rows, cols = np.nonzero(arr[1:] != arr[:-1])
+            rows = rows + 1
+            index = pd.RangeIndex(len(arr)) if index is None else pd.Index(index)
+            return pd.DataFrame(dict(flag=names[cols], state=arr[rows, cols]), index=index[rows])
+
+        attrs = {name: property(partial(test_flag, name=name)) for name in lookup.keys()}
 
         enums[name] = type(
             name,
             (object,),
             dict(
+                __slots__ = ("value",),
                 lookup = lookup,
+                flags = flags,
                 __init__ = constructor,
                 __repr__ = repr,
+                __len__ = length,
+                __bool__ = truth,
                 data = property(lambda self: [self.value]),
+                frame = frame,
+                transitions = transitions,
                 **attrs
             )
         )
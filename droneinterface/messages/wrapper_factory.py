@@ -2,7 +2,9 @@ from __future__ import annotations
 from droneinterface.messages import mavlink
 import inspect
 from numbers import Number
-
+from operator import attrgetter
+import numpy as np
+import pandas as pd
 from pandas.api.types import is_list_like
 
 wrappers = {}
@@ -39,6 +41,12 @@ class ParamLink:
     def read(self, msg: mavlink.MAVLink_message):
         return self.builder(*[tof(getattr(msg, n)) for tof, n in zip(self.tofuncs, self.params)])
 
+    def read_many(self, cols: dict[str, np.ndarray]):
+        """build from whole columns. Array fields are given to the tofuncs element first, as v[0] is the 
+        first element in a message, and turned back to a row per message for the builder"""
+        vals = [tof(cols[n].T) for tof, n in zip(self.tofuncs, self.params)]
+        return self.builder(*[v.T if np.ndim(v) == 2 else v for v in vals])
+
     def write(self, value):
         #converts the DroneInterface type into a dict
         val = [value] if len(self.params) == 1 else value.data[0]  # assumes it derives from pfc-geometry Base
@@ -46,6 +54,35 @@ class ParamLink:
         return {name: value for name, value in zip(self.params, vos)}
     
     
+class FieldId:
+    """For messages with an id field, the id of the wrapper class is the message id and the id of an instance is the field"""
+    def __init__(self, msg_id: int) -> None:
+        self.msg_id = msg_id
+
+    def __get__(self, obj, objtype=None):
+        return self.msg_id if obj is None else obj._id
+
+
+def message_columns(MsgCls: type, data) -> dict[str, np.ndarray]:
+    """timestamp and an array for each field (2d for array fields) from a list of messages, a DataFrame
+    as the stores read it, a structured array from the ring buffer or the dict of arrays from a store"""
+    if isinstance(data, pd.DataFrame):
+        df = data if "timestamp" in data.columns else data.reset_index()
+        cols = dict(timestamp=df["timestamp"].to_numpy())
+        for fname, l in zip(MsgCls.ordered_fieldnames, MsgCls.lengths):
+            cols[fname] = df[fname].to_numpy() if l == 1 else df.loc[:, [f"{fname}_{i}" for i in range(l)]].to_numpy()
+        return cols
+    elif isinstance(data, np.ndarray):
+        return {name: data[name] for name in data.dtype.names}
+    elif isinstance(data, dict):
+        return {k: np.asarray(v) for k, v in data.items()}
+    msgs = list(data)
+    return dict(
+        timestamp=np.array([msg._timestamp for msg in msgs]),
+        **{fname: np.array([getattr(msg, fname) for msg in msgs]) for fname in MsgCls.ordered_fieldnames}
+    )
+
+
 def wrapper_factory(name:str, msg_id: int, links: list, props: dict=None, set_id: int=None):
     MsgCls: type = mavlink.mavlink_map[msg_id]
     
@@ -60,53 +97,118 @@ def wrapper_factory(name:str, msg_id: int, links: list, props: dict=None, set_id
     for ula in unlinkedargs:
         links.append(ParamLink(ula, lambda v: v, [ula]))
 
+    #fields named like a class attribute are found with a leading underscore
+    reserved = {"id", "data", "timestamp", "parse", "parse_many", "encoder", "setter", "copy", "ReadOnly"} | set(props.keys())
+    names = tuple(f"_{l.name}" if l.name in reserved else l.name for l in links)
+    nlinked = len(links) - len(unlinkedargs)
+    linked = {n: l for n, l in zip(names[:nlinked], links[:nlinked])}
+    
+    #fields that are only copied are read from the message, a constructed wrapper keeps them in a Fields instead
+    Fields = type(f"{name}Fields", (object,), dict(__slots__=tuple(unlinkedargs)))
+
+    def own(self):
+        """the fields of this wrapper to write to. A parsed wrapper shares its raw message with the history
+        and other wrappers, so the first write decodes the links and copies the fields out of it"""
+        if not isinstance(self._msg, Fields):
+            for n in linked:
+                getattr(self, n)
+            fields = Fields()
+            for f in unlinkedargs:
+                setattr(fields, f, getattr(self._msg, f))
+            self._msg = fields
+        return self._msg
+
+    through = {
+        n: property(attrgetter(f"_msg.{l.name}"), lambda self, v, f=l.name: setattr(own(self), f, v)) 
+        for n, l in zip(names[nlinked:], links[nlinked:])
+    }
+
     def constructor(self, timestamp, *args, **kwargs):
         self.timestamp = timestamp
-        for pl, val in zip(links[:len(args)], args):
-            kwargs[pl.name] = val
+        self._msg = Fields()
+        for setter, val in zip(setters, args):
+            setter(self, val)
         for k, v in kwargs.items():
-            setattr(self, k, v)
-        for l in links:
-            if not hasattr(self, l.name):
-                raise AttributeError(f"Missing required attribute {l.name} in {self.__class__.__name__}")
+            setattr(self, f"_{k}" if k in reserved else k, v)
+        if len(args) < len(names):
+            missing = [l.name for l in links[len(args):] if l.name not in kwargs]
+            if len(missing) > 0:
+                raise AttributeError(f"Missing required attribute {missing[0]} in {self.__class__.__name__}")
     
+    def decode(self, name):
+        """decode a linked attribute from the raw message the first time it is read, later reads find it in its slot"""
+        if name not in linked or isinstance(self._msg, Fields):
+            raise AttributeError(f"{self.__class__.__name__} has no attribute {name}")
+        value = linked[name].read(self._msg)
+        object.__setattr__(self, name, value)   # also on a ReadOnly wrapper
+        return value
+
     @classmethod
     def parser(cls, msg: MsgCls):
+        """wrap msg without decoding it, the linked attributes are read when they are first used"""
         assert msg.__class__.id == msg_id    
-        return cls(msg._timestamp, *[pl.read(msg) for pl in links])
+        self = cls.__new__(cls)
+        object.__setattr__(self, "timestamp", msg._timestamp)
+        object.__setattr__(self, "_msg", msg)
+        return self
     
+    @classmethod
+    def many_parser(cls, data):
+        """one wrapper holding every message in data, the timestamp is an array and the linked attributes
+        are multi row geometry objects or arrays. See message_columns for the types data can be"""
+        cols = message_columns(MsgCls, data)
+        return cls(cols["timestamp"], *[pl.read_many(cols) for pl in links])
+
+    def copier(self):
+        """a wrapper of the same class with the same values that can be changed without affecting this one"""
+        other = Cls.__new__(Cls)
+        for n in Cls.__slots__:
+            try:
+                getattr(Cls, n).__set__(other, getattr(Cls, n).__get__(self))
+            except AttributeError:
+                pass   # a link that has not been decoded yet
+        return other
+
+    def refuse(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is shared and read only, set {name} on a copy()")
+
     def encoder(self) -> MsgCls:
-        kws = [l.write(getattr(self, l.name)) for l in links]
+        kws = [l.write(v) for l, v in zip(links, self.data)]
         return MsgCls(**{k: v for kw in kws for k, v in kw.items()})
     
     def setter(self, target_system, target_component):
         if set_id is not None:
-            return mavlink.mavlink_map(set_id)(
+            return mavlink.mavlink_map[set_id](
                 target_system = target_system, 
                 target_component = target_component,
-                **{l.write(getattr(self, l.name)) for l in links}
+                **{k: v for l, val in zip(links, self.data) for k, v in l.write(val).items()}
             )
         else:
             return None
     
     def repr(self):
-        return f"{self.__class__.__name__}(\n    {',\n    '.join([f'{l.name}={getattr(self, l.name)}' for l in links])}\n)"
-
-    Cls = type(
-        name,
-        (object,),
-        dict(
-            __init__ = constructor,
-            parse = parser,
-            encoder = encoder,
-            setter = setter,
-            __str__ = lambda self: f"id:{self.id}, name:{self.__class__.__name__}, time:{self.timestamp}",
-            __repr__ = repr,
-            id = msg_id,
-            data = property(lambda self: [getattr(self, l.name) for l in links]),
-            **props
-        )
+        return f"{self.__class__.__name__}(\n    {',\n    '.join([f'{l.name}={v}' for l, v in zip(links, self.data)])}\n)"
+
+    attrs = dict(
+        __slots__ = ("timestamp", "_msg") + tuple(linked.keys()),
+        __init__ = constructor,
+        __getattr__ = decode,
+        parse = parser,
+        parse_many = many_parser,
+        encoder = encoder,
+        setter = setter,
+        copy = copier,
+        __str__ = lambda self: f"id:{self.id}, name:{self.__class__.__name__}, time:{self.timestamp}",
+        __repr__ = repr,
+        id = FieldId(msg_id) if "_id" in names else msg_id,
+        data = property(lambda self: [getattr(self, n) for n in names]),
+        **through,
+        **props
     )
+    Cls = type(name, (object,), attrs)
+    setters = [getattr(Cls, n).__set__ for n in names]
+    # handed out to every caller of LastMessage.wrapper, so it can not be changed
+    Cls.ReadOnly = type(name, (Cls,), dict(__slots__=(), __setattr__=refuse))
     
     wrappers[msg_id] = Cls
     
@@ -0,0 +1,67 @@
+"""Recent messages of one type held as rows of a preallocated structured array.
+
+Every row is written twice, at i and i + depth, so the latest n rows are always one contiguous
+slice and last / window return views rather than copies. The views alias the buffer, so copy
+anything that needs to outlive the next depth messages. Another thread than the one appending
+should ask for a copy, which is taken under the lock append holds.
+"""
+from __future__ import annotations
+from threading import Lock
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, dtype: np.dtype, depth: int=None, horizon: float=None, max_depth: int=2**20) -> None:
+        """depth: number of rows to keep
+        horizon: seconds of messages to keep instead, the buffer grows until it holds this long
+        """
+        self.dtype = dtype
+        self.horizon = horizon
+        self.max_depth = max_depth
+        self.depth = depth if depth is not None else 256
+        self.data = np.zeros(2 * self.depth, dtype=dtype)
+        self.head = 0
+        self.count = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, row: tuple):
+        with self.lock:
+            if self.horizon is not None and self.count == self.depth and self.depth < self.max_depth:
+                if row[0] - self.data["timestamp"][self.head] < self.horizon:
+                    self._grow()
+            self.data[self.head] = row
+            self.data[self.head + self.depth] = row
+            self.head = (self.head + 1) % self.depth
+            self.count = min(self.count + 1, self.depth)
+
+    def _grow(self):
+        rows = self.last(self.count).copy()
+        self.depth = min(self.depth * 2, self.max_depth)
+        self.data = np.zeros(2 * self.depth, dtype=self.dtype)
+        self.data[:len(rows)] = rows
+        self.data[self.depth:self.depth + len(rows)] = rows
+        self.head = len(rows) % self.depth
+
+    def last(self, n: int=None, copy: bool=False) -> np.ndarray:
+        """a view of the latest n rows, oldest first, or a copy if copy is True"""
+        if copy:
+            with self.lock:
+                return self.last(n).copy()
+        n = self.count if n is None else min(n, self.count)
+        end = self.head + self.depth
+        return self.data[end - n:end]
+
+    def window(self, seconds: float, end: float=None, copy: bool=False) -> np.ndarray:
+        """a view of the rows in the seconds up to end, which defaults to the latest timestamp, or a copy if copy is True"""
+        if copy:
+            with self.lock:
+                return self.window(seconds, end).copy()
+        rows = self.last()
+        if len(rows) == 0:
+            return rows
+        t = rows["timestamp"]
+        end = t[-1] if end is None else end
+        return rows[np.searchsorted(t, end - seconds, side="left"):np.searchsorted(t, end, side="right")]
@@ -1,6 +1,9 @@
 from .exceptions import *
+from .scheduler import Scheduler, scheduler
 from .observer import Observer
 from .repeater import Repeater
 from .waiter import MessageWaiter
+from .registry import Registry, Waiter
+from .stream import MessageStream
 from .await_condition import AwaitCondition
-from .watcher import Watcher
\ No newline at end of file
+from .watcher import Watcher
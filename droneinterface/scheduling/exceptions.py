@@ -6,4 +6,10 @@ class TooOld(Exception):
         pass
 
 class NeverReceived(Exception):
-        pass
\ No newline at end of file
+        pass
+
+class CommandFailed(Exception):
+        """a command was acknowledged with a result other than MAV_RESULT_ACCEPTED, ack is the CommandAck"""
+        def __init__(self, message: str, ack=None) -> None:
+            super().__init__(message)
+            self.ack = ack
@@ -1,25 +1,33 @@
 
-from threading import Thread
 from .rate_history import RateHistory
+from .scheduler import Scheduler, Job, scheduler
 
 
-class Observer(Thread):
-    def __init__(self, veh, ids: list[int], rate: int) -> None:
-        super().__init__(daemon=True)
+class Observer:
+    """Keep the rate of messages ids at or above rate while active, 
+    checking the measured rates check_rate times a second on the shared scheduler"""
+    def __init__(self, veh, ids: list[int], rate: int, check_rate: float=1.0, sched: Scheduler=None) -> None:
         self.veh = veh
         self.base_rates = {id: RateHistory(self.veh, id, rate) for id in ids}
+        self.check_rate = check_rate
+        self.scheduler = scheduler() if sched is None else sched
+        self.job: Job = None
         
     def __getattr__(self, name):
         return getattr(self.veh, name)
     
-    def run(self):
-        while not self._is_stopped:
-            for rh in self.base_rates.values():
-                rh.set_rate(self.veh)
+    def set_rates(self):
+        for rh in self.base_rates.values():
+            rh.set_rate(self.veh)
+
+    def start(self):
+        if self.job is None:
+            self.job = self.scheduler.add(self.set_rates, self.check_rate)
 
     def stop(self):
-        self._is_stopped = True
-        self.join()
+        if self.job is not None:
+            self.job.cancel(wait=True)   # a set_rates in progress would undo reset_rate
+            self.job = None
         for rh in self.base_rates.values():
             rh.reset_rate(self.veh)
 
@@ -18,7 +18,7 @@ class RateHistory:
         rate = self.current_rate()
         if rate < self.desired_rate:
             logger.debug(f"increasing rate for msg {self.id} from {rate} to {self.desired_rate}")
-            veh.set_message_rate(self.id, self.desired_rate * 1.5)
+            veh.set_message_rate(self.id, self.desired_rate * 1.5, retries=0)   # checked again next time, no need to retry
 
     def reset_rate(self, veh):
         veh.set_message_rate(self.id, self.initial_rate)
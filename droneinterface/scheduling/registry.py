@@ -0,0 +1,81 @@
+"""Fan out message arrivals from the Connection reader to any number of subscribers.
+
+Subscribers are held in a tuple per (system id, message id) that is replaced rather than modified
+when someone subscribes or unsubscribes, so the reader can iterate it without taking a lock.
+A subscriber is anything with a notify(lm: LastMessage) method. Subscribing with msgid=None
+receives every message from the system. A subscriber that raises is logged and skipped, the others
+are still notified.
+"""
+from __future__ import annotations
+from threading import Event, Lock
+from .. import logger
+
+
+class Waiter:
+    """One caller's handle for the next message of a type. 
+    It is set by any message counted after `after`, including one that arrived before it was registered"""
+    def __init__(self, registry: Registry, systemid: int, msgid, after: int) -> None:
+        self.registry = registry
+        self.systemid = systemid
+        self.msgid = msgid
+        self.after = after
+        self.event = Event()
+        self.lm = None
+
+    def notify(self, lm):
+        if lm.count > self.after:
+            self.lm = lm
+            self.event.set()
+
+    def wait(self, timeout=None) -> bool:
+        return self.event.wait(timeout)
+
+    def is_set(self) -> bool:
+        return self.event.is_set()
+
+    def remove(self):
+        self.registry.remove(self.systemid, self.msgid, self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, xc_type, exc_value, exc_tb):
+        self.remove()
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.subscribers: dict[tuple, tuple] = {}
+        self._lock = Lock()
+
+    def add(self, systemid: int, msgid, subscriber):
+        with self._lock:
+            key = (systemid, msgid)
+            self.subscribers[key] = self.subscribers.get(key, ()) + (subscriber,)
+        return subscriber
+
+    def remove(self, systemid: int, msgid, subscriber):
+        with self._lock:
+            key = (systemid, msgid)
+            subs = tuple(s for s in self.subscribers.get(key, ()) if s is not subscriber)
+            if len(subs) > 0:
+                self.subscribers[key] = subs
+            elif key in self.subscribers:
+                del self.subscribers[key]
+
+    def waiter(self, systemid: int, msgid, after: int) -> Waiter:
+        return self.add(systemid, msgid, Waiter(self, systemid, msgid, after))
+
+    def notify(self, systemid: int, msgid, lm):
+        for key in [(systemid, msgid), (systemid, None)]:
+            subs = self.subscribers.get(key)
+            if subs is not None:
+                for sub in subs:
+                    try:
+                        sub.notify(lm)
+                    except Exception as ex:
+                        logger.exception(f"Subscriber {sub} failed on message {msgid}: {ex}")
+    
+    def count(self, systemid: int=None, msgid=None) -> int:
+        return sum(len(v) for k, v in self.subscribers.items() 
+            if (systemid is None or k[0]==systemid) and (msgid is None or k[1]==msgid))
@@ -1,27 +1,33 @@
 
-from threading import Thread
 from .. import logger
-from time import time
+from .scheduler import Scheduler, Job, scheduler
 
 
 
-class Repeater(Thread):
-    def __init__(self, method, rate):
-        super().__init__(daemon=True)
+class Repeater:
+    """Call method at rate Hz on the shared scheduler"""
+    def __init__(self, method, rate, sched: Scheduler=None):
         self.method = method
         self.rate = rate
+        self.scheduler = scheduler() if sched is None else sched
+        self.job: Job = None
 
-    def run(self):
-        last_call = 0
-        while not self._is_stopped:
-            if time() - last_call >= 1 / self.rate:
-                self.method()
-                last_call = time()
-        logger.info("Repeater Stopped")
+    def start(self):
+        if not self.is_alive():
+            self.job = self.scheduler.add(lambda : self.method(), self.rate)
+
+    def is_alive(self):
+        return self.job is not None and not self.job.cancelled
     
     def stop(self):
-        self._is_stopped = True
-        self.join() 
+        """stop calling method, waiting for a call in progress to return"""
+        if self.is_alive():
+            self.job.cancel(wait=True)
+            logger.info("Repeater Stopped")
+
+    @property
+    def stats(self) -> dict:
+        return None if self.job is None else self.job.stats
 
     def __enter__(self):
         self.start()
@@ -0,0 +1,126 @@
+"""Run many periodic jobs from a single thread, ordered by their next deadline in a heap"""
+from __future__ import annotations
+from threading import Thread, Condition, Lock, Event, current_thread
+from time import time
+import heapq
+from itertools import count
+from .. import logger
+
+
+class Job:
+    def __init__(self, scheduler: Scheduler, method, rate: float) -> None:
+        self.scheduler = scheduler
+        self.method = method
+        self.period = 1 / rate
+        self.cancelled = False
+        self.idle = Event()   # clear while method is running
+        self.idle.set()
+        self.calls = 0
+        self.misses = 0
+        self.max_lateness = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    @property
+    def rate(self):
+        return 1 / self.period
+
+    def cancel(self, wait: bool=False):
+        """stop calling method. wait: also wait for a call that has started to return, unless this is
+        called from a job on the same scheduler"""
+        with self.scheduler._cond:   # so a call can not start between the check and this
+            self.cancelled = True
+        if wait and current_thread() is not self.scheduler:
+            self.idle.wait()
+
+    def record(self, lateness: float):
+        """Welford update of the lateness mean and variance"""
+        self.calls += 1
+        delta = lateness - self._mean
+        self._mean += delta / self.calls
+        self._m2 += delta * (lateness - self._mean)
+        self.max_lateness = max(self.max_lateness, lateness)
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            rate=self.rate,
+            calls=self.calls,
+            misses=self.misses,
+            mean_lateness=self._mean,
+            max_lateness=self.max_lateness,
+            jitter=(self._m2 / self.calls) ** 0.5 if self.calls > 0 else 0.0,
+        )
+
+
+class Scheduler(Thread):
+    """Calls each job at its target rate. Deadlines advance by whole periods from the first one
+    so the rate does not drift, deadlines that have already passed are counted as misses and skipped.
+    Jobs share the thread so they should return quickly."""
+    def __init__(self) -> None:
+        super().__init__(daemon=True)
+        self.heap = []
+        self.jobs: list[Job] = []
+        self._cond = Condition()
+        self._count = count()
+
+    def add(self, method, rate: float, delay: float=0) -> Job:
+        job = Job(self, method, rate)
+        with self._cond:
+            self.jobs.append(job)
+            heapq.heappush(self.heap, (time() + delay, next(self._count), job))
+            self._cond.notify()
+            if not self.is_alive():   # under the lock so two threads adding the first jobs do not both start it
+                self.start()
+        return job
+
+    def stats(self) -> list[dict]:
+        with self._cond:
+            return [job.stats for job in self.jobs if not job.cancelled]
+
+    def run(self):
+        while True:
+            with self._cond:
+                while len(self.heap) == 0:
+                    self._cond.wait()
+                deadline, _, job = self.heap[0]
+                if job.cancelled:
+                    heapq.heappop(self.heap)
+                    self.jobs.remove(job)
+                    continue
+                delay = deadline - time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self.heap)
+                job.idle.clear()
+
+            now = time()
+            job.record(now - deadline)
+            try:
+                job.method()
+            except Exception as ex:
+                logger.exception(f"Scheduled job {job.method} failed: {ex}")
+            finally:
+                job.idle.set()
+
+            missed = int((time() - deadline) // job.period)
+            job.misses += missed
+            with self._cond:
+                if job.cancelled:
+                    self.jobs.remove(job)
+                else:
+                    heapq.heappush(self.heap, (deadline + (missed + 1) * job.period, next(self._count), job))
+
+
+_scheduler: Scheduler = None
+_scheduler_lock = Lock()
+
+
+def scheduler() -> Scheduler:
+    """The shared scheduler, started on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+        return _scheduler
@@ -0,0 +1,133 @@
+"""Every message of the requested types, pushed from the Connection reader into a bounded queue.
+
+Unlike looping on next_message nothing is lost between calls, the stream is registered once and
+collects messages until it is closed. When the consumer falls behind the policy decides what happens:
+    drop_oldest: discard the oldest queued message to make room
+    drop_newest: discard the message that has just arrived
+    block: hold up the Connection reader until there is room (or block_timeout, then drop the newest).
+        This stalls every other message from the connection so only use it for short bursts.
+An exception from the callback is logged and counted as an error, the stream carries on.
+"""
+from __future__ import annotations
+from threading import Condition
+from collections import deque
+from time import time
+from typing import Callable
+from .exceptions import Timeout
+from .. import logger
+
+
+policies = ["drop_oldest", "drop_newest", "block"]
+
+
+class MessageStream:
+    def __init__(self, conn, systemid: int, ids: list, maxlen: int=1000, policy: str="drop_oldest", 
+                 callback: Callable=None, parse: Callable=None, block_timeout: float=None) -> None:
+        """callback: if given it is called with every parsed message on the reader thread instead of queueing it
+        parse: applied to each raw message as it is read from the stream, defaults to returning the raw message"""
+        if policy not in policies:
+            raise ValueError(f"Unknown policy {policy}, expected one of {policies}")
+        self.conn = conn
+        self.systemid = systemid
+        self.ids = ids
+        self.maxlen = maxlen
+        self.policy = policy
+        self.callback = callback
+        self.parse = (lambda msg: msg) if parse is None else parse
+        self.block_timeout = block_timeout
+        self.queue = deque()
+        self.cond = Condition()
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+        self.closed = False
+        for id in self.ids:
+            self.conn.subscribe(self.systemid, id, self)
+
+    def notify(self, lm):
+        self.put(lm.last_message)
+
+    def put(self, msg):
+        """queue (or call back with) one item, applying the policy if the queue is full"""
+        self.received += 1
+        if self.callback is not None:
+            try:
+                self.callback(self.parse(msg))
+            except Exception as ex:
+                self.errors += 1
+                logger.exception(f"Stream callback failed for messages {self.ids}: {ex}")
+            return
+        with self.cond:
+            if len(self.queue) >= self.maxlen:
+                if self.policy == "drop_oldest":
+                    self.queue.popleft()
+                    self.dropped += 1
+                elif self.policy == "drop_newest" or not self._wait_for_room():
+                    self.dropped += 1
+                    return
+            self.queue.append(msg)
+            self.cond.notify_all()
+
+    def _wait_for_room(self) -> bool:
+        return self.cond.wait_for(
+            lambda: len(self.queue) < self.maxlen or self.closed, self.block_timeout
+        ) and not self.closed
+
+    def _pop(self, timeout: float=None):
+        with self.cond:
+            if not self.cond.wait_for(lambda: len(self.queue) > 0 or self.closed, timeout):
+                raise Timeout(f"timeout after {timeout} seconds waiting for messages {self.ids}")
+            if len(self.queue) == 0:
+                raise StopIteration
+            msg = self.queue.popleft()
+            self.cond.notify_all()
+        return msg
+
+    def _pop_all(self) -> list:
+        with self.cond:
+            msgs = list(self.queue)
+            self.queue.clear()
+            self.cond.notify_all()
+        return msgs
+
+    def get(self, timeout: float=None):
+        """the next message, waiting up to timeout seconds for one to arrive"""
+        return self.parse(self._pop(timeout))
+
+    def drain(self) -> list:
+        """everything queued so far, without waiting"""
+        return [self.parse(msg) for msg in self._pop_all()]
+
+    def record(self, duration: float) -> list:
+        """every message received in the next duration seconds"""
+        stop = time() + duration
+        msgs = []
+        while time() < stop:
+            try:
+                msgs.append(self.get(stop - time()))
+            except (Timeout, StopIteration):
+                break
+        return msgs
+
+    @property
+    def stats(self) -> dict:
+        return dict(received=self.received, dropped=self.dropped, errors=self.errors, queued=len(self.queue))
+
+    def close(self):
+        for id in self.ids:
+            self.conn.unsubscribe(self.systemid, id, self)
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.get()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, xc_type, exc_value, exc_tb):
+        self.close()
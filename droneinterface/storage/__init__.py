@@ -0,0 +1,21 @@
+from .writer import StorageWriter
+from .csv_store import CSVStore
+from .columnar_store import ColumnarStore
+from .schema import mavlink_dtype, dataflash_dtype
+
+
+stores = {"csv": CSVStore, "columnar": ColumnarStore}
+
+
+def store_for(path):
+    """pick the store class from the file suffix"""
+    for store in stores.values():
+        if path.suffix == store.suffix:
+            return store
+    raise ValueError(f"No storage backend for {path}")
+
+
+def stored_files(outdir):
+    """the csv files or columnar folders in outdir that hold a message type"""
+    suffixes = [store.suffix for store in stores.values()]
+    return sorted(f for f in outdir.iterdir() if f.suffix in suffixes)
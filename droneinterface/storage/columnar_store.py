@@ -0,0 +1,104 @@
+"""Store one message type as a folder of typed binary columns.
+
+Each field is appended to its own raw little-endian file, array fields (voltages, servos etc)
+keep their shape as a single 2d column. The dtype is saved alongside in schema.json so
+reading is a memory map of each file with no parsing.
+"""
+from __future__ import annotations
+from pathlib import Path
+import json
+import numpy as np
+import pandas as pd
+from .writer import StorageWriter
+
+
+class ColumnarStore:
+    suffix = ".col"
+
+    def __init__(self, path: Path, lm, writer: StorageWriter=None, readonly: bool=False) -> None:
+        self.path = path
+        self.lm = lm
+        self.writer = writer
+        self.readonly = readonly
+        self.rows = []
+        self.ios = {}
+        schema = self.path / "schema.json"
+        if schema.exists():
+            self.dtype = np.dtype([tuple(f) for f in json.loads(schema.read_text())])
+        else:
+            self.dtype = lm.dtype
+            if not self.readonly:
+                self.path.mkdir(exist_ok=True)
+                schema.write_text(json.dumps(np.lib.format.dtype_to_descr(self.dtype)))
+        if self.writer is not None and not self.readonly:
+            self.writer.register(self)
+
+    def column_file(self, name: str) -> Path:
+        return self.path / f"{name}.bin"
+
+    def append(self, msg) -> bool:
+        if self.readonly:
+            raise PermissionError(f"{self.path} was opened read only")
+        if self.writer is not None:
+            return self.writer.put(self, msg)
+        self.buffer_item(msg)
+        self.write()
+        return True
+
+    def buffer_item(self, msg) -> int:
+        self.rows.append(msg)
+        return self.dtype.itemsize
+
+    def write(self) -> int:
+        if len(self.rows) == 0:
+            return 0
+        msgs = self.rows
+        self.rows = []
+        arr = np.array([self.lm.row(msg) for msg in msgs], dtype=self.dtype)
+        for name in self.dtype.names:
+            if name not in self.ios:
+                self.ios[name] = open(self.column_file(name), "ab")
+            arr[name].tofile(self.ios[name])
+            self.ios[name].flush()
+        return len(msgs)
+
+    def close(self):
+        for io in self.ios.values():
+            io.close()
+        self.ios = {}
+
+    def flush(self, timeout=None) -> bool:
+        return self.writer.flush(timeout) if self.writer is not None else True
+
+    def _column(self, name: str) -> np.ndarray:
+        field = self.dtype[name]
+        base, shape = (field.base, field.shape) if field.shape else (field, ())
+        f = self.column_file(name)
+        if not f.exists() or f.stat().st_size == 0:
+            return np.empty((0, *shape), dtype=base)
+        return np.memmap(f, dtype=base, mode="r").reshape(-1, *shape)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """memory mapped columns, truncated to the rows that were completely written"""
+        arrs = {name: self._column(name) for name in self.dtype.names}
+        n = min(len(a) for a in arrs.values())
+        return {k: v[:n] for k, v in arrs.items()}
+
+    @staticmethod
+    def to_frame(arrs: dict[str, np.ndarray]) -> pd.DataFrame:
+        cols = {}
+        for name, arr in arrs.items():
+            if name == "timestamp":
+                continue
+            if arr.ndim == 1:
+                cols[name] = arr
+            else:
+                for i in range(arr.shape[1]):
+                    cols[f"{name}_{i}"] = arr[:, i]
+        return pd.DataFrame(cols, index=pd.Index(arrs["timestamp"], name="timestamp"))
+
+    def read(self) -> pd.DataFrame:
+        return ColumnarStore.to_frame(self.arrays())
+
+    def tail(self, n: int) -> pd.DataFrame:
+        return ColumnarStore.to_frame({k: v[-n:] for k, v in self.arrays().items()})
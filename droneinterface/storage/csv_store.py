@@ -0,0 +1,117 @@
+"""Store one message type as rows of text in a csv file"""
+from __future__ import annotations
+from pathlib import Path
+from io import BytesIO
+import numpy as np
+import pandas as pd
+from .writer import StorageWriter
+
+
+class CSVStore:
+    suffix = ".csv"
+
+    def __init__(self, path: Path, lm, writer: StorageWriter=None, readonly: bool=False) -> None:
+        self.path = path
+        self.lm = lm
+        self.writer = writer
+        self.readonly = readonly
+        self.buffer = []
+        self.io = None
+        if self.readonly:
+            pass
+        elif not self.path.exists():
+            with open(self.path, "w") as f:
+                print(",".join(list(self.lm.colmap.keys())), file=f)
+        else:
+            self._end_last_row()
+        if self.writer is not None and not self.readonly:
+            self.writer.register(self)
+
+    @staticmethod
+    def _complete_end(f, block: int=2**12) -> int:
+        """the offset after the last newline of an open binary file, the end of its last complete row"""
+        end = f.seek(0, 2)
+        pos = end
+        while pos > 0:
+            pos = max(0, pos - block)
+            f.seek(pos)
+            data = f.read(end - pos)
+            if b"\n" in data:
+                return pos + data.rfind(b"\n") + 1
+        return 0
+
+    def _end_last_row(self):
+        """make sure new rows start on their own line. A last row with no newline was cut off while
+        being written (it can be cut inside a field, so it cannot be checked) and is removed"""
+        with open(self.path, "rb+") as f:
+            f.truncate(CSVStore._complete_end(f))
+
+    def append(self, msg) -> bool:
+        if self.readonly:
+            raise PermissionError(f"{self.path} was opened read only")
+        if self.writer is not None:
+            return self.writer.put(self, msg)
+        self.buffer_item(msg)
+        self.write()
+        return True
+
+    def buffer_item(self, msg) -> int:
+        line = self.lm.format_row(msg)
+        self.buffer.append(line)
+        return len(line) + 1
+
+    def write(self) -> int:
+        if len(self.buffer) == 0:
+            return 0
+        if self.io is None:
+            self.io = open(self.path, "a")
+        lines = self.buffer
+        self.buffer = []
+        self.io.write("\n".join(lines) + "\n")
+        self.io.flush()
+        return len(lines)
+
+    def close(self):
+        if self.io is not None:
+            self.io.close()
+            self.io = None
+
+    def flush(self, timeout=None) -> bool:
+        return self.writer.flush(timeout) if self.writer is not None else True
+
+    def read(self) -> pd.DataFrame:
+        """every complete row, a last row with no newline is still being written"""
+        with open(self.path, "rb") as f:
+            end = CSVStore._complete_end(f)
+            if end == f.seek(0, 2):
+                return pd.read_csv(self.path).set_index("timestamp")
+            f.seek(0)
+            return pd.read_csv(BytesIO(f.read(end))).set_index("timestamp")
+
+    def tail(self, n: int, block: int=2**14) -> pd.DataFrame:
+        """the last n complete rows, read backwards from the end of the file so the cost does not grow with its length"""
+        with open(self.path, "rb") as f:
+            header = f.readline()
+            start = f.tell()
+            end = f.seek(0, 2)
+            data = b""
+            pos = end
+            while pos > start and data.count(b"\n") <= n:
+                pos = max(start, pos - block)
+                f.seek(pos)
+                data = f.read(end - pos)
+        lines = data.split(b"\n")[:-1]   # after the last newline is empty, or a row that was being written
+        if pos > start:
+            lines = lines[1:]   # the first line may have been cut by the seek
+        return pd.read_csv(BytesIO(header + b"\n".join(lines[max(len(lines) - n, 0):]) + b"\n")).set_index("timestamp")
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        df = self.read()
+        arrs = dict(timestamp=df.index.to_numpy())
+        for name in self.lm.dtype.names[1:]:
+            shape = self.lm.dtype[name].shape
+            if len(shape) == 0:
+                arrs[name] = df[name].to_numpy()
+            else:
+                arrs[name] = df.loc[:, [f"{name}_{i}" for i in range(shape[0])]].to_numpy()
+        return arrs
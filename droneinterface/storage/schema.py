@@ -0,0 +1,46 @@
+"""numpy dtypes describing one stored row of a message type"""
+import numpy as np
+from pymavlink.DFReader import FORMAT_TO_STRUCT
+
+
+_mavlink_types = {
+    "int8_t": "i1", "uint8_t": "u1",
+    "int16_t": "i2", "uint16_t": "u2",
+    "int32_t": "i4", "uint32_t": "u4",
+    "int64_t": "i8", "uint64_t": "u8",
+    "float": "f4", "double": "f8",
+}
+
+
+def mavlink_dtype(msgcls) -> np.dtype:
+    fields = [("timestamp", "f8")]
+    for fname, length in zip(msgcls.ordered_fieldnames, msgcls.lengths):
+        if fname == "timestamp":
+            continue  # a handful of messages have their own timestamp field, the receive time takes the column
+        i = msgcls.fieldnames.index(fname)
+        ftype = msgcls.fieldtypes[i]
+        if ftype == "char":
+            fields.append((fname, f"U{max(msgcls.array_lengths[i], 1)}"))
+        elif length > 1:
+            fields.append((fname, _mavlink_types[ftype], (length,)))
+        else:
+            fields.append((fname, _mavlink_types[ftype]))
+    return np.dtype(fields)
+
+
+def _struct_dtype(code: str, mult):
+    """convert a struct format code (eg 'h', '16s', '32h') into a numpy dtype field spec"""
+    count, char = (int(code[:-1]) if len(code) > 1 else 1), code[-1]
+    if char == "s":
+        return (f"U{count}",)
+    base = "f8" if mult is not None else np.dtype(char).str
+    return (base, (count,)) if count > 1 else (base,)
+
+
+def dataflash_dtype(fmt) -> np.dtype:
+    """dtype of the decoded (scaled) values of a DFReader.DFFormat"""
+    fields = [("timestamp", "f8")]
+    for col, c in zip(fmt.columns, fmt.format):
+        code, mult, _ = FORMAT_TO_STRUCT[c]
+        fields.append((col, *_struct_dtype(code, mult)))
+    return np.dtype(fields)
@@ -0,0 +1,127 @@
+"""Write message rows to disk from a background thread so the Connection reader never waits on the disk"""
+from __future__ import annotations
+from threading import Thread, Event, Lock
+from queue import Queue, Full, Empty
+from time import time
+import atexit
+from loguru import logger
+
+
+_FLUSH = object()
+_STOP = object()
+
+
+class StorageWriter(Thread):
+    def __init__(self, maxsize: int=10000, flush_interval: float=1.0, flush_bytes: int=2**16, block: bool=False) -> None:
+        """maxsize: bounded queue length, rows that do not fit are dropped (or wait if block=True)
+        flush_interval: maximum seconds a row stays in memory before it is written to disk
+        flush_bytes: write to disk as soon as this many bytes are buffered
+
+        Stores (CSVStore, ColumnarStore) register here and must provide
+        buffer_item(msg) -> nbytes, write() -> nrows and close().
+        """
+        super().__init__(daemon=True)
+        self.queue = Queue(maxsize)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.block = block
+        self.stores = []
+        self.dropped = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.flushes = 0
+        self._buffered = 0
+        self._stopped = False
+        self._lock = Lock()
+
+    def register(self, store):
+        with self._lock:
+            self.stores.append(store)
+            if not self.is_alive() and not self._stopped:
+                self.start()
+                atexit.register(self.stop)
+        return store
+
+    def put(self, store, msg) -> bool:
+        if self._stopped:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put((store, msg), self.block)
+            return True
+        except Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout=None) -> bool:
+        """Write everything queued so far and wait for it to reach the disk"""
+        if not self.is_alive():
+            return False
+        done = Event()
+        self.queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def stop(self):
+        self._stopped = True
+        if self.is_alive():
+            self.queue.put((_STOP, None))
+            self.join()
+            atexit.unregister(self.stop)
+        while True:   # rows put while it was stopping
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except Empty:
+                break
+
+    @property
+    def stats(self) -> dict:
+        return dict(
+            queue_depth=self.queue.qsize(),
+            dropped=self.dropped,
+            written=self.written,
+            bytes_written=self.bytes_written,
+            flushes=self.flushes,
+        )
+
+    def run(self):
+        last_flush = time()
+        while True:
+            try:
+                store, item = self.queue.get(timeout=self.flush_interval)
+            except Empty:
+                store, item = None, None
+
+            if store is _FLUSH:
+                self._write()
+                last_flush = time()
+                item.set()
+                continue
+            elif store is _STOP:
+                self._write()
+                self._close()
+                break
+            elif store is not None:
+                try:
+                    self._buffered += store.buffer_item(item)
+                except Exception as ex:
+                    logger.exception(f"Failed to buffer row for {store.path}: {ex}")
+
+            if self._buffered >= self.flush_bytes or time() - last_flush >= self.flush_interval:
+                self._write()
+                last_flush = time()
+
+    def _write(self):
+        for store in self.stores:
+            try:
+                self.written += store.write()
+            except Exception as ex:
+                logger.exception(f"Failed to write {store.path}: {ex}")
+        if self._buffered > 0:
+            self.bytes_written += self._buffered
+            self.flushes += 1
+        self._buffered = 0
+
+    def _close(self):
+        for store in self.stores:
+            store.close()
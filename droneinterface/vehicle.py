@@ -2,19 +2,21 @@
 If wrappers do not exist for the requested message then the original message object is returned
 """
 from __future__ import annotations
-from typing import Union
+from typing import Union, Callable
 from time import time
-from .messages import wrappers, wrappermap
+from .messages import wrappers, wrappermap, wrap
 from loguru import logger
-from .commands import command_map, all_commands
-from flightdata import Origin
-from .combinators import append_combinators
+from .commands import command_map, command_ids, all_commands
+from flightdata import Origin, State
+from .combinators import add_combinators, StateStream, StateMaker
+from .command_sender import CommandSender, acknowledged
+from concurrent.futures import Future
 import inspect
 from . import mavlink
 from . import Connection, LastMessage
 from pymavlink.mavutil import mavfile_state
 from pathlib import Path
-from droneinterface.scheduling import Observer, Repeater, MessageWaiter, Timeout, TooOld, NeverReceived
+from droneinterface.scheduling import Observer, Repeater, MessageWaiter, MessageStream, Timeout, TooOld, NeverReceived
 from .scheduling import AwaitCondition
 
 
@@ -30,8 +32,6 @@ class Vehicle:
         
         self.msgs = self.conn.msgs[self.sysid]
         self.origin = origin
-    
-        append_combinators(self)
 
     
     @property
@@ -59,45 +59,51 @@ class Vehicle:
     def from_folder(outdir:Path, sysid: int, compid:int=1, origin: Origin=None):
         conn = Connection(outdir=outdir)
         veh = Vehicle(conn, sysid, compid)
-        origin = Origin("origin", veh.last_globalorigin().position, 0.0) if origin is None else origin
+        if origin is None:
+            gorigin = veh.last_globalorigin()
+            if gorigin is not None:
+                origin = Origin("origin", gorigin.position, 0.0)
+            else:   # none stored, start from the first position as parse_bin_states does
+                positions = veh.msgs[mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT].arrays()
+                origin = Origin("origin", wrappers[mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT].parse_many(positions).position[0], 0.0)
 
         return veh.update(
             origin=origin
         )
 
+    @classmethod
+    def _init_args(cls) -> list[str]:
+        if "_args" not in cls.__dict__:
+            cls._args = inspect.getfullargspec(cls.__init__)[0][1:]
+        return cls._args
+
     def update(self, **kwargs) -> Vehicle:
-        args = inspect.getfullargspec(self.__class__.__init__)[0]
-        args.remove("self")
         return Vehicle(
-                *[(kwargs[a] if (a in kwargs) else getattr(self, a)) for a in args]
+                *[(kwargs[a] if (a in kwargs) else getattr(self, a)) for a in self._init_args()]
             )
 
     def __getattr__(self, name):
-        name = name.lower()
-        if name in all_commands:
-            return lambda *args, **kwargs : self.send_command(name, *args, **kwargs)
-        elif name in ['parameters', 'msgs']:
-            return getattr(self.conn, name)[self.sysid]
-        elif name in self.mfst_keys:
-            return getattr(self.conn.master.sysid_state[self.sysid], name)
-        elif "_" in name:
-            _spl = name.split("_")
-            if _spl[1] in wrappermap:
-                if _spl[0] in ["last", "get", "next", "_last", "_get", "_next"]:
-                    return lambda *args, **kwargs: getattr(self, f"{_spl[0]}_message")(wrappermap[_spl[1]].id, *args, **kwargs)
-                elif _spl[0] == 'send':
-                    return lambda *args, **kwargs: self.send_message(wrappermap[_spl[1]](time(), self.sysid, self.compid, *args, **kwargs))
+        """the message accessors and commands are methods of the class (see add_accessors), this only
+        handles other capitalisations of them and the mavfile state of the vehicle"""
+        lname = name.lower()
+        if lname != name and hasattr(self.__class__, lname):
+            return getattr(self, lname)
+        elif lname in ['parameters', 'msgs']:
+            return getattr(self.conn, lname)[self.sysid]
+        elif lname in self.mfst_keys:
+            return getattr(self.conn.master.sysid_state[self.sysid], lname)
         
         raise AttributeError(f"{name} not available in {self}")
     
     def wait_for_test(self, test, timeout=None):
-        start = time()
-        check_t = lambda : time() < start + timeout  # noqa: E731
-        if timeout is None:
-            check_t = lambda : True  # noqa: E731
-        while check_t() and self.conn.is_alive():
+        """re-evaluate test each time a message arrives from this vehicle, until it returns True"""
+        stop = None if timeout is None else time() + timeout
+        while self.conn.is_alive():
             if test():
                 return
+            if stop is not None and time() >= stop:
+                break
+            self.conn.wait_for_message(self.sysid, 1.0 if stop is None else min(stop - time(), 1.0))
         raise Timeout(f"Timeout after {timeout} seconds waiting for test {test}")
 
     def wait_for_boot(self) -> Vehicle:
@@ -121,20 +127,28 @@ class Vehicle:
                 if not informed:
                     logger.debug(f"Waiting for {name}")
                     informed = True
+                self.conn.wait_for_message(self.sysid, 1.0)
 
         logger.info("Booted")
         return self
 
-    def send_command(self, name, *args, **kwargs):
-        for msgid, cmap in command_map.items():
-            if name in cmap:
-                self.send_message(
-                    wrappers[msgid](
-                        time(), self.sysid, self.conn.master.target_component, 
-                        *cmap[name]( *args, **kwargs)
-                    )
+    @property
+    def commands(self) -> CommandSender:
+        return self.conn.command_sender(self.sysid)
+
+    def send_command(self, name, *args, **kwargs) -> Future:
+        """send a command, returning a Future of its CommandAck (see CommandSender). timeout and retries 
+        can be passed with the command's arguments. Mission items are sent without waiting for an ack, None is returned"""
+        if name in command_ids:
+            msgid = command_ids[name]
+            if msgid in acknowledged:
+                return self.commands.send(name, *args, **kwargs)
+            self.send_message(
+                wrappers[msgid](
+                    time(), self.sysid, self.conn.master.target_component, 
+                    *command_map[msgid][name]( *args, **kwargs)
                 )
-                break
+            )
         
     def send_message(self, msg):
         logger.debug(f"Sending message {str(msg)}")
@@ -200,11 +214,10 @@ class Vehicle:
         
     def _next_message(self, id, timeout=0.2) -> LastMessage:
         """Wait timeout seconds for the next message"""
-        event = self.conn.add_waiter(self.sysid, id)
-        if event.wait(timeout):
-            return self._last_message(id, None)
-        else:
-            raise Timeout(f'timeout after {timeout} seconds waiting for message {id}')
+        with self.conn.add_waiter(self.sysid, id) as waiter:
+            if waiter.wait(timeout):
+                return waiter.lm
+        raise Timeout(f'timeout after {timeout} seconds waiting for message {id}')
         
     def _get_message(self, id, timeout=0.2, max_age=0.1) -> LastMessage:
         """get a message. 
@@ -222,28 +235,17 @@ class Vehicle:
                     pass
         
         stop = time() + timeout
-
-        msgwaiter = self.conn.add_waiter(self.sysid, id)
-
-        lastrequest=0
+        interval = min(timeout, 1)
 
         msg=None
-        while time() < stop:
-            if msgwaiter.is_set():
-                msg = self._last_message(id, None)
-                break
-            if time() > lastrequest + min(timeout, 1):
-                if msg is None:
-                    self.request_message(id)
-                else:
-                    if msg.rate < (1/(min(timeout, 2))):
-                        self.request_message(id)
-                lastrequest = time()
-        else:
-            logger.debug(f"Failed to receive msg {str(id)} after {timeout} seconds")
-            msg=None
-        
-        self.conn.remove_waiter(self.sysid, id)
+        with self.conn.add_waiter(self.sysid, id) as msgwaiter:
+            while time() < stop:
+                self.request_message(id, retries=0)   # requested again each interval
+                if msgwaiter.wait(min(interval, stop - time())):
+                    msg = msgwaiter.lm
+                    break
+            else:
+                logger.debug(f"Failed to receive msg {str(id)} after {timeout} seconds")
 
         logger.debug(f"Received message: {str(msg)}")
         return msg
@@ -259,6 +261,18 @@ class Vehicle:
     def get_message(self, id, *args, **kwargs):
             return self._message("get", id, *args, **kwargs)
 
+    def history(self, id, n: int=None, frame: bool=False):
+        """the latest n messages of a type as a structured array copied from the ring buffer, or a DataFrame"""
+        return self._last_message(id).recent(n, frame)
+
+    def window(self, id, seconds: float, end: float=None, frame: bool=False):
+        """the messages of a type received in the seconds up to end (default the latest), copied from the ring buffer"""
+        return self._last_message(id).window(seconds, end, frame)
+
+    def batch(self, id, seconds: float=None):
+        """the stored messages of a type, or the last seconds of them, as one wrapper whose attributes hold every row"""
+        return self._last_message(id).batch(seconds)
+
     def subscribe(self, ids: Union[list[int], int], rate: int):
         return Observer(
             self, 
@@ -266,14 +280,85 @@ class Vehicle:
             rate
         )
     
+    def stream(self, ids: Union[list[int], int], maxlen: int=1000, policy: str="drop_oldest", callback=None, block_timeout: float=None) -> MessageStream:
+        """every message of the requested types from now until the stream is closed, see MessageStream for the policies.
+        Iterate over it, call get / drain / record, or pass a callback to handle each message on the reader thread"""
+        return MessageStream(
+            self.conn, self.sysid, [ids] if isinstance(ids, int) else ids, 
+            maxlen, policy, callback, wrap, block_timeout
+        )
+
+    def state_stream(self, trigger: int=mavlink.MAVLINK_MSG_ID_ATTITUDE_QUATERNION, maxlen: int=1000, policy: str="drop_oldest", callback=None, 
+                     block_timeout: float=None, coherent: bool=False, tolerance: float=0.2, clock: str="time_boot_ms") -> StateStream:
+        """a State each time the trigger message arrives, built from the latest attitude, position and imu messages,
+        or with coherent=True from all of them interpolated to the time of the trigger.
+        Use get / iterate for single States or batch(n) for one State of n rows"""
+        return StateStream(self, trigger, maxlen, policy, callback, block_timeout, coherent, tolerance, clock)
+
+    def states(self, t0: float=None, t1: float=None, rate: float=None, tolerance: float=0.5, clock: str="time_boot_ms") -> State:
+        """one State from the stored attitude, position and imu messages received from t0 to t1 (default the whole
+        session), a row per attitude message or at rate Hz. See StateMaker.between"""
+        return StateMaker.between(
+            {wr.id: self.msgs[wr.id].arrays() for wr in StateMaker.wrappers.values()},
+            self.origin.rotation, self.origin.pos, t0, t1, rate, tolerance, clock
+        )
+
     def parallel_messages(self, method: str, ids, *args, **kwargs):
         
         ths = [MessageWaiter(getattr(self, f"{method}_message"), id, *args, **kwargs) for id in ids]
         
-        while any([th.is_alive() for th in ths]):
-            pass
+        for th in ths:
+            th.join()
         return [th.result for th in ths]
 
 
+def _message_accessor(method: str, wrapper: type) -> Callable:
+    id = wrapper.id
+    if method == "send":
+        def accessor(self, *args, **kwargs):
+            return self.send_message(wrapper(time(), self.sysid, self.compid, *args, **kwargs))
+    elif method.startswith("_"):
+        inner = f"{method}_message"
+        def accessor(self, *args, **kwargs) -> LastMessage:
+            return getattr(self, inner)(id, *args, **kwargs)
+    else:
+        inner = f"_{method}_message"
+        def accessor(self, *args, **kwargs):
+            msg = getattr(self, inner)(id, *args, **kwargs)
+            return msg.wrapper() if msg is not None else None
+    accessor.__doc__ = f"{method.strip('_')} {wrapper.__name__} (message {id})"
+    return accessor
+
+
+def _command_accessor(name: str) -> Callable:
+    def command(self, *args, **kwargs):
+        return self.send_command(name, *args, **kwargs)
+    command.__doc__ = all_commands[name].__doc__ or f"send the {name} command"
+    command.__signature__ = inspect.signature(all_commands[name]).replace(
+        parameters=[inspect.Parameter("self", inspect.Parameter.POSITIONAL_OR_KEYWORD)] + list(inspect.signature(all_commands[name]).parameters.values())
+    )
+    return command
+
+
+def add_accessors(cls: type) -> type:
+    """give cls a method for every command and a last_ / get_ / next_ / send_ method (and _last_ / _get_ / _next_
+    for the LastMessage) for every wrapper, named with the lowercase and the class name of the wrapper, 
+    so the calls are normal method lookups that show up in autocompletion. Existing attributes are not replaced."""
+    def add(name: str, make: Callable, *args):
+        if not hasattr(cls, name):
+            fun = make(*args)
+            fun.__name__ = name
+            fun.__qualname__ = f"{cls.__name__}.{name}"
+            setattr(cls, name, fun)
+
+    for name in all_commands:
+        add(name, _command_accessor, name)
+    for lname, wrapper in wrappermap.items():
+        for method in ["last", "get", "next", "send", "_last", "_get", "_next"]:
+            add(f"{method}_{lname}", _message_accessor, method, wrapper)
+            add(f"{method}_{wrapper.__name__}", _message_accessor, method, wrapper)
+    add_combinators(cls)
+    return cls
 
 
+add_accessors(Vehicle)
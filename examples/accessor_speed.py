@@ -0,0 +1,43 @@
+"""Per call overhead of the generated accessor methods, against the string dispatch in __getattr__ they replace"""
+from timeit import timeit
+from time import time
+from droneinterface import Connection, Vehicle
+from droneinterface.messages import wrappermap
+from droneinterface.commands import all_commands
+from tests.fake_master import FakeMaster, heartbeat
+
+
+def string_dispatch(veh: Vehicle, name: str):
+    """what Vehicle.__getattr__ did for every accessor call"""
+    name = name.lower()
+    if name in all_commands:
+        return lambda *args, **kwargs : veh.send_command(name, *args, **kwargs)
+    elif name in Vehicle.mfst_keys:
+        return getattr(veh.conn.master.sysid_state[veh.sysid], name)
+    elif "_" in name:
+        _spl = name.split("_")
+        if _spl[1] in wrappermap:
+            if _spl[0] in ["last", "get", "next", "_last", "_get", "_next"]:
+                return lambda *args, **kwargs: getattr(veh, f"{_spl[0]}_message")(wrappermap[_spl[1]].id, *args, **kwargs)
+            elif _spl[0] == 'send':
+                return lambda *args, **kwargs: veh.send_message(wrappermap[_spl[1]](time(), veh.sysid, veh.compid, *args, **kwargs))
+
+
+conn = Connection(FakeMaster(), timeout=None)
+conn.start()
+veh = Vehicle(conn, 1, 1)
+conn.master.push(heartbeat())
+veh.wait_for_test(lambda: 0 in veh.msgs, 3)
+
+n = 100000
+for label, stmt in [
+    ("lookup, string dispatch", lambda: string_dispatch(veh, "last_Heartbeat")),
+    ("lookup, method", lambda: veh.last_Heartbeat),
+    ("_last_, method", lambda: veh._last_Heartbeat()),
+    ("last_, string dispatch", lambda: string_dispatch(veh, "last_Heartbeat")()),
+    ("last_, method", lambda: veh.last_Heartbeat()),
+    ("update", lambda: veh.update(compid=1)),
+]:
+    print(f"{label:25s} {timeit(stmt, number=n) / n * 1e6:.2f}us per call")
+
+conn.close()
@@ -0,0 +1,28 @@
+"""Compare aligning many message streams with a chain of pd.merge_asof against alignment.align"""
+from droneinterface.alignment import align
+import numpy as np
+import pandas as pd
+from time import time
+
+
+rng = np.random.default_rng(0)
+streams = {}
+for i, rate in enumerate([400, 200, 100, 50, 50, 25, 10, 10, 5, 1]):
+    n = rate * 600
+    t = np.sort(rng.uniform(0, 600, n))
+    streams[f"msg{i}"] = pd.DataFrame(
+        rng.normal(size=(n, 8)), columns=[f"f{j}" for j in range(8)], index=pd.Index(t, name="timestamp")
+    )
+print(f"{len(streams)} streams, {sum(len(df) for df in streams.values())} rows")
+
+start = time()
+frames = list(streams.items())
+joined = frames[0][1].add_prefix(f"{frames[0][0]}_").reset_index()
+for id, df in frames[1:]:
+    joined = pd.merge_asof(joined, df.add_prefix(f"{id}_").reset_index(), on="timestamp")
+print(f"merge_asof chain:          {time() - start:.3f}s")
+
+for base, rate, method in [("msg0", None, "asof"), ("msg0", None, "linear"), ("union", None, "asof"), (None, 50.0, "nearest")]:
+    start = time()
+    df = align(streams, base, method, rate=rate)
+    print(f"align base={base if rate is None else f'{rate}Hz'}, {method}: {time() - start:.3f}s, {len(df)} rows")
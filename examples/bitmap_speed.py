@@ -0,0 +1,30 @@
+"""When did the prearm check fail over an hour of SYS_STATUS at 10Hz, one bitmap per row against one pass over the array"""
+from time import perf_counter
+import numpy as np
+from droneinterface.messages import mavlink
+from droneinterface.messages.mav_bitmap import mav_bitmap
+
+
+Sensor = mav_bitmap("MAV_SYS_STATUS_SENSOR")
+prearm = mavlink.MAV_SYS_STATUS_PREARM_CHECK
+n = 36000
+t = np.arange(n) * 0.1
+health = np.full(n, 2**22 - 1 | prearm)
+for start in np.random.default_rng(0).integers(0, n - 50, 20):
+    health[start:start + 50] &= ~prearm
+
+Sensor(health[:10]).transitions()   # first use of the pandas paths
+
+start = perf_counter()
+states = [Sensor(int(v)).mav_sys_status_prearm_check for v in health]
+failed = [t[i] for i in range(1, n) if states[i - 1] and not states[i]]
+print(f"bitmap per row: {perf_counter() - start:.3f}s, {len(failed)} failures")
+
+start = perf_counter()
+tr = Sensor(health).transitions("mav_sys_status_prearm_check", t)
+failed = tr.index[~tr.state]
+print(f"one array:      {perf_counter() - start:.4f}s, {len(failed)} failures")
+
+start = perf_counter()
+df = Sensor(health).frame(t)
+print(f"frame of all {df.shape[1]} flags: {perf_counter() - start:.4f}s")
@@ -0,0 +1,39 @@
+"""Compare recording a MAVLink stream by decoding every packet with recording the raw frames"""
+from droneinterface.capture import FrameSplitter, TlogWriter, Tlog
+from droneinterface.messages import mavlink
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import time
+
+
+tl = Tlog(Path("simulator/mav.tlog"))
+stream = b"".join(
+    bytes(tl.buf[o + 8:o + 8 + l]) for o, l in zip(tl.index["offset"].tolist(), tl.index["length"].tolist())
+)
+chunks = [stream[i:i + 4096] for i in range(0, len(stream), 4096)]
+print(f"{len(tl.index)} packets, {len(stream) / 1e6:.1f}MB")
+
+start = time()
+mav = mavlink.MAVLink(None)
+mav.robust_parsing = True
+ndecoded = 0
+for chunk in chunks:
+    ndecoded += len(mav.parse_buffer(chunk) or [])
+decode_time = time() - start
+print(f"decode every packet: {decode_time:.2f}s, {ndecoded / decode_time:.0f} packets/s")
+
+with TemporaryDirectory() as tdir:
+    start = time()
+    splitter = FrameSplitter()
+    writer = TlogWriter(Path(tdir) / "capture.tlog")
+    t = time()
+    for chunk in chunks:
+        for frame, msgid, sysid, compid, seq in splitter.feed(chunk):
+            writer.write(t, frame, msgid, sysid, compid)
+    writer.close()
+    capture_time = time() - start
+    print(f"capture raw frames:  {capture_time:.2f}s, {writer.frames / capture_time:.0f} packets/s")
+
+    start = time()
+    df = Tlog(Path(tdir) / "capture.tlog").dataframe(mavlink.MAVLINK_MSG_ID_ATTITUDE)
+    print(f"decode {len(df)} ATTITUDE afterwards: {time() - start:.2f}s")
@@ -0,0 +1,44 @@
+"""Position error of the latest position message at each attitude time against the position interpolated to the
+attitude time, for a synthetic 10 minute flight at 20 m/s, and the time to reconstruct its States"""
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from flightdata import Origin
+from geometry import GPS
+from droneinterface.alignment import align
+from droneinterface.combinators import StateMaker
+
+
+seconds, yaw_rate, speed = 600, 2.0, 20.0
+origin = Origin("origin", GPS(50, 1, 100), 0.0)
+lat_rate = speed / 6371000 * 180 / np.pi * 1e7   # lat units per second
+
+
+def frame(ms, **cols):
+    return pd.DataFrame(dict(timestamp=1000 + ms / 1000, time_boot_ms=ms, **cols)).set_index("timestamp")
+
+
+att_ms = np.arange(0, seconds * 1000, 20)     # 50Hz
+pos_ms = np.arange(7, seconds * 1000, 100)    # 10Hz
+imu_ms = np.arange(3, seconds * 1000, 40)     # 25Hz
+zero = lambda ms: np.zeros(len(ms))
+inputs = {
+    31: frame(att_ms, q1=np.cos(yaw_rate * att_ms / 2000), q2=zero(att_ms), q3=zero(att_ms), q4=np.sin(yaw_rate * att_ms / 2000),
+              rollspeed=zero(att_ms), pitchspeed=zero(att_ms), yawspeed=zero(att_ms) + yaw_rate,
+              **{f"repr_offset_q_{i}": zero(att_ms) + (i == 0) for i in range(4)}),
+    33: frame(pos_ms, lat=500000000 + lat_rate * pos_ms / 1000, lon=zero(pos_ms) + 10000000, alt=zero(pos_ms) + 100000, 
+              relative_alt=zero(pos_ms), vx=zero(pos_ms) + speed * 100, vy=zero(pos_ms), vz=zero(pos_ms), hdg=zero(pos_ms)),
+    26: frame(imu_ms, **{k: zero(imu_ms) for k in ["xacc", "yacc", "zacc", "xgyro", "ygyro", "zgyro", "xmag", "ymag", "zmag", "temperature"]}),
+}
+
+start = perf_counter()
+st, valid = StateMaker.reconstruct(inputs, origin.rotation, origin.pos, base=31, tolerance=0.2)
+print(f"reconstruct {len(st)} States: {perf_counter() - start:.2f}s")
+t = inputs[31].time_boot_ms.to_numpy()[valid] / 1000
+truth = 500000000 + lat_rate * t
+
+# the latest position at each attitude time, as the StateMaker uses them without interpolation
+latest = align({id: df.set_index("time_boot_ms") for id, df in inputs.items()}, base=31, method="asof")["33_lat"].to_numpy()[valid]
+wrs, _ = StateMaker.resample(inputs, t, 0.2, "time_boot_ms")
+print(f"position error, latest:       max {np.abs(latest - truth).max() / lat_rate * speed:.2f}m")
+print(f"position error, interpolated: max {np.abs(wrs['mpos'].position.lat * 1e7 - truth).max() / lat_rate * speed:.2f}m")
@@ -0,0 +1,41 @@
+"""Time to set 20 message intervals over a link with a 50ms round trip: waiting for the ack of each command
+before sending the next, against sending them all and waiting on their futures"""
+from concurrent.futures import wait
+from threading import Timer
+from time import perf_counter
+from droneinterface import Connection, Vehicle
+from droneinterface.messages import mavlink
+from tests.fake_master import FakeMaster
+
+
+class AckingMaster(FakeMaster):
+    """acknowledges every command after a round trip, dropping the first transmission of every tenth"""
+    rtt = 0.05
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def send(self, msg):
+        super().send(msg)
+        self.count += 1
+        if self.count % 10 == 0 and msg.confirmation == 0:
+            return
+        Timer(self.rtt, self.push, [mavlink.MAVLink_command_ack_message(msg.command, mavlink.MAV_RESULT_ACCEPTED)]).start()
+
+
+conn = Connection(AckingMaster(), timeout=None)
+conn.start()
+veh = Vehicle(conn, 1, 1)
+veh.commands.timeout = 0.2
+ids = list(range(20))
+
+start = perf_counter()
+for id in ids:
+    veh.set_message_rate(id, 10).result(2)
+print(f"one at a time: {perf_counter() - start:.2f}s")
+
+start = perf_counter()
+done, not_done = wait([veh.set_message_rate(id, 10) for id in ids], 2)
+print(f"pipelined:     {perf_counter() - start:.2f}s, {len(done)} acknowledged")
+print(veh.commands.stats()["set_message_rate"])
@@ -1,13 +1,11 @@
-from droneinterface import Vehicle, enable_logging, mavlink, Watcher
+from droneinterface import Vehicle, enable_logging, mavlink
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
-import numpy as np
-import pandas as pd
 
 enable_logging('DEBUG')
 
 #setup the connection
-vehicle = Vehicle.connect('tcp:127.0.0.1:5762', 1, 1, "log_tmp")
+vehicle = Vehicle.connect('tcp:127.0.0.1:5762', 1, 1, "log_tmp", depth=100.0)
 
 vehicle.wait_for_test(lambda : vehicle.get_SysStatus().can_arm)
 
@@ -15,23 +13,20 @@ vehicle.arm()
 vehicle.set_mode(mavlink.PLANE_MODE_AUTO)
 
 with vehicle.subscribe(mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT, 5):
-    watcher = Watcher(lambda : vehicle.next_custompidstate(None).data, 1000, None)
-
 
     figure= plt.figure()
     line, = plt.plot([0], [0], '-')
-    plt.axis([0, 100, 15, 25])
+    plt.axis([-100, 0, 0, 200])
 
 
     def animate(i):
-        try:
-            df = pd.DataFrame(watcher.data)
-            line.set_data(list(watcher.times), df.iloc[:, 1])
-        except Exception as ex:
-            pass
+        # the last 100 seconds, copied from the ring buffer rather than a list of messages
+        rows = vehicle.window(mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT, 100.0)
+        if len(rows) > 0:
+            line.set_data(rows["timestamp"] - rows["timestamp"][-1], rows["relative_alt"] / 1000)
         return line,
 
 
     ani = FuncAnimation(figure, animate, interval=10)
 
-    plt.show()
\ No newline at end of file
+    plt.show()
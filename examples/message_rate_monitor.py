@@ -10,6 +10,7 @@ vehicle = Vehicle.connect('tcp:127.0.0.1:5762', 1, 1, "log_tmp")
 
 def print_rates():
     print(dumps({m.last_message.__class__.__name__: m.rate for m in vehicle.conn.msgs[1].values()}, indent=2))
+    print(dumps({str(k): v for k, v in vehicle.conn.link_stats().items()}, indent=2))
     
 
 while True:
@@ -77,10 +77,10 @@ vehicle = Vehicle.connect('tcp:127.0.0.1:5762', 1, 1, "log_tmp")
 def update_traces():
 	while True:
 		x.append(time() - start)
-		data = vehicle.conn.rates(msgkeys)
+		data = vehicle.conn.arrival_stats(msgkeys)
 
-		for k, v in zip(msgkeys, data):
-			ys[k].append(v)
+		for k in msgkeys:
+			ys[k].append(data[k]["last_second_rate"] if k in data else 0)
 		update_arrs()
 		sleep(1)
 
@@ -10,17 +10,20 @@ from multiprocessing import Process
 
 #vehicle = Vehicle.connect('udp:0.0.0.0:14550', 4, outdir = Path("log_tmp"))
 
+flap_repeaters: dict[str, Repeater] = {}
+
 def set_flap(vehicle: Vehicle, pwm, location="inbd") -> Repeater:    
     pwm = max(pwm, 1100)
     pwm = min(pwm, 1900)
-    repeater = Repeater(
-        lambda : vehicle.send_message(RCOverride.set_channel(
-            vehicle.sysid, vehicle.compid,
-            5 if location == "otbd" else 7, 
-            pwm
-        )),
-        0.5
+    msg = RCOverride.set_channel(
+        vehicle.sysid, vehicle.compid,
+        5 if location == "otbd" else 7, 
+        pwm
     )
+    if location not in flap_repeaters:
+        flap_repeaters[location] = Repeater(None, 0.5)
+    repeater = flap_repeaters[location]
+    repeater.method = lambda : vehicle.send_message(msg)
     repeater.start()
     return repeater
 
@@ -0,0 +1,60 @@
+"""Reconstruct the States of a stored hour long flight in one pass with Vehicle.states, against building a State
+from single messages for each attitude message"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import numpy as np
+from flightdata import Origin
+from geometry import GPS, Time
+from droneinterface import LastMessage, Vehicle, mavlink
+from droneinterface.combinators import StateMaker
+from droneinterface.messages import wrappers
+
+
+seconds = 3600
+origin = Origin("origin", GPS(50, 1, 100), 0.0)
+
+
+def store(outdir: Path, msgcls, ms, make):
+    lm = LastMessage._build_mavlink(msgcls, outdir / f"1_{msgcls.id}.col")
+    for t in ms.tolist():
+        msg = make(t)
+        msg._timestamp = 1000 + t / 1000 + 0.003
+        lm.store.buffer_item(msg)
+    lm.store.write()
+    lm.store.close()
+
+
+def build_session(outdir: Path):
+    """yawing at 0.1 rad/s and moving north at 20 m/s, attitude at 50Hz, position at 10Hz, imu at 25Hz"""
+    store(outdir, mavlink.MAVLink_attitude_quaternion_message, np.arange(0, seconds * 1000, 20),
+          lambda ms: mavlink.MAVLink_attitude_quaternion_message(ms, np.cos(ms / 20000), 0, 0, np.sin(ms / 20000), 0, 0, 0.1, [0, 0, 0, 0]))
+    store(outdir, mavlink.MAVLink_global_position_int_message, np.arange(7, seconds * 1000, 100),
+          lambda ms: mavlink.MAVLink_global_position_int_message(ms, int(500000000 + ms * 0.18), 10000000, 100000, 0, 2000, 0, 0, 0))
+    store(outdir, mavlink.MAVLink_scaled_imu_message, np.arange(3, seconds * 1000, 40),
+          lambda ms: mavlink.MAVLink_scaled_imu_message(ms, 0, 0, -1000, 0, 0, 0, 0, 0, 0))
+
+
+if __name__ == "__main__":
+    with TemporaryDirectory() as tmp:
+        build_session(Path(tmp))
+        veh = Vehicle.from_folder(Path(tmp), 1, origin=origin)
+
+        start = perf_counter()
+        st = veh.states()
+        print(f"states(): {len(st)} States in {perf_counter() - start:.2f}s")
+
+        start = perf_counter()
+        st = veh.states(1600, 1700, rate=10.0)
+        print(f"states(1600, 1700, rate=10): {len(st)} States in {perf_counter() - start:.2f}s")
+
+        # one State at a time from the stored messages, as last_state builds them
+        frames = {id: veh.msgs[id].all_messages() for id in [31, 33, 26]}
+        n = 200
+        start = perf_counter()
+        for i in range(n):
+            t = frames[31].index[i]
+            msgs = [wrappers[id].parse(veh.msgs[id].create_message(df.iloc[df.index.searchsorted(t, "right") - 1])) for id, df in frames.items()]
+            StateMaker.build(origin.rotation, origin.pos, *msgs, Time.from_t(t))
+        per_state = (perf_counter() - start) / n
+        print(f"single States: {per_state * 1e3:.2f}ms each, {per_state * len(frames[31]):.0f}s for the flight")
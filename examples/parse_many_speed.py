@@ -0,0 +1,36 @@
+"""Parse an hour of GLOBAL_POSITION_INT at 10Hz one message at a time and with parse_many"""
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from droneinterface.messages import mavlink, GlobalPositionInt
+
+
+n = 36000
+rng = np.random.default_rng(0)
+msgs = []
+for i in range(n):
+    msg = mavlink.MAVLink_global_position_int_message(
+        i * 100, *rng.integers(-10**8, 10**8, 3).tolist(), *rng.integers(0, 10**5, 1).tolist(),
+        *rng.integers(-1000, 1000, 3).tolist(), 9000
+    )
+    msg._timestamp = i * 0.1
+    msgs.append(msg)
+cols = {"timestamp": np.array([m._timestamp for m in msgs])}
+cols.update({f: np.array([getattr(m, f) for m in msgs]) for f in mavlink.MAVLink_global_position_int_message.ordered_fieldnames})
+df = pd.DataFrame(cols).set_index("timestamp")
+
+start = perf_counter()
+each = [GlobalPositionInt.parse(msg) for msg in msgs]
+print(f"parse each message:       {perf_counter() - start:.3f}s")
+
+start = perf_counter()
+GlobalPositionInt.parse_many(msgs)
+print(f"parse_many, messages:     {perf_counter() - start:.3f}s")
+
+start = perf_counter()
+GlobalPositionInt.parse_many(df)
+print(f"parse_many, stored frame: {perf_counter() - start:.3f}s")
+
+start = perf_counter()
+GlobalPositionInt.parse_many(cols)
+print(f"parse_many, store arrays: {perf_counter() - start:.3f}s")
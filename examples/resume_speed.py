@@ -0,0 +1,41 @@
+"""Time resuming a Connection on a large session folder, against reading every csv in full.
+usage: python examples/resume_speed.py [size in MB, default 500]"""
+from droneinterface import Connection, LastMessage, mavlink
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import time
+import numpy as np
+import pandas as pd
+import sys
+
+
+size = float(sys.argv[1]) * 1e6 if len(sys.argv) > 1 else 500e6
+ids = [0, 1, 24, 30, 32, 33, 36, 65, 74, 147]
+
+with TemporaryDirectory() as tdir:
+    outdir = Path(tdir)
+    block = 10000
+    for id in ids:
+        f = outdir / f"1_{id}.csv"
+        lm = LastMessage._build_mavlink(mavlink.mavlink_map[id], f)
+        ncols = len(lm.colmap)
+        with open(f, "a") as io:
+            t = 0
+            while f.stat().st_size < size / len(ids):
+                data = np.random.randint(0, 1000, (block, ncols)).astype(float)
+                data[:, 0] = t + np.arange(block) * 0.01
+                t = data[-1, 0] + 0.01
+                np.savetxt(io, data, delimiter=",", fmt="%g")
+                io.flush()
+    total = sum(f.stat().st_size for f in outdir.iterdir())
+    print(f"{len(ids)} files, {total / 1e6:.0f}MB")
+
+    start = time()
+    for f in outdir.iterdir():
+        pd.read_csv(f).iloc[-3:]
+    print(f"read every file in full: {time() - start:.2f}s")
+
+    start = time()
+    conn = Connection(outdir=outdir)
+    print(f"resume with tail seek:   {time() - start:.3f}s")
+    conn.close()
@@ -0,0 +1,47 @@
+"""Cost per State: the thread per message get_state, a State per trigger from a StateStream, and batches of 100"""
+from time import perf_counter
+from threading import active_count
+from flightdata import Origin
+from geometry import GPS
+from droneinterface import Connection, Vehicle
+from droneinterface.messages import mavlink
+from tests.fake_master import FakeMaster
+
+
+conn = Connection(FakeMaster(), timeout=None)
+conn.start()
+veh = Vehicle(conn, 1, 1, Origin("origin", GPS(50, 1, 100), 0.0))
+
+
+def push(i):
+    conn.master.push(mavlink.MAVLink_scaled_imu_message(i, 0, 0, -1000, 0, 0, 0, 0, 0, 0))
+    conn.master.push(mavlink.MAVLink_global_position_int_message(i, 500000000 + i, 10000000, 100000, 0, 100, 0, 0, 0))
+    conn.master.push(mavlink.MAVLink_attitude_quaternion_message(i, 1, 0, 0, 0, 0, 0, 0.1, [1, 0, 0, 0]))
+
+
+push(0)
+veh.wait_for_test(lambda: all(id in veh.msgs for id in veh.state.ids), 3)
+
+n = 1000
+start, threads = perf_counter(), 0
+for _ in range(n):
+    veh.get_state(1, max_age=None)
+    threads += 3
+print(f"get_state:           {(perf_counter() - start) / n * 1e6:.0f}us per State, {threads} threads started")
+
+with veh.state_stream(maxlen=2 * n) as stream:
+    for i in range(1, n + 1):
+        push(i)
+    start = perf_counter()
+    for _ in range(n):
+        stream.get(1)
+    print(f"StateStream.get:     {(perf_counter() - start) / n * 1e6:.0f}us per State, {active_count()} threads running")
+
+    for i in range(1, n + 1):
+        push(i)
+    start = perf_counter()
+    for _ in range(n // 100):
+        stream.batch(100, 1)
+    print(f"StateStream.batch:   {(perf_counter() - start) / n * 1e6:.0f}us per State")
+
+conn.close()
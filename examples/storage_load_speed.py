@@ -0,0 +1,49 @@
+"""Compare loading every message type of a session stored as csv and as typed columns"""
+from droneinterface import LastMessage, mavlink
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import time
+
+
+def build_session(outdir: Path, suffix: str, nrows: int):
+    """write nrows of every message type that can be built with default arguments"""
+    lms = []
+    for msgid, msgcls in mavlink.mavlink_map.items():
+        lm = LastMessage._build_mavlink(msgcls, outdir / f"1_{msgid}{suffix}")
+        rows = []
+        for i in range(nrows):
+            try:
+                msg = msgcls(**{
+                    f: [i] * l if l > 1 else ("a" if t == "char" else i) 
+                    for f, t, l in zip(
+                        msgcls.ordered_fieldnames,
+                        [msgcls.fieldtypes[msgcls.fieldnames.index(f)] for f in msgcls.ordered_fieldnames], 
+                        msgcls.lengths
+                    )
+                })
+            except Exception:
+                break
+            msg._timestamp = i
+            rows.append(msg)
+        for msg in rows:
+            lm.store.buffer_item(msg)
+        lm.store.write()
+        lm.store.close()
+        lms.append(lm)
+    return lms
+
+
+if __name__ == "__main__":
+    nrows = 2000
+    for suffix in [".csv", ".col"]:
+        with TemporaryDirectory() as tmp:
+            lms = build_session(Path(tmp), suffix, nrows)
+            start = time()
+            data = [lm.all_messages() for lm in lms]
+            duration = time() - start
+            print(f"{suffix}: loaded {len(data)} message types x {nrows} rows as DataFrames in {duration:.3f} seconds")
+
+            start = time()
+            data = [lm.arrays() for lm in lms]
+            duration = time() - start
+            print(f"{suffix}: loaded {len(data)} message types x {nrows} rows as arrays in {duration:.3f} seconds")
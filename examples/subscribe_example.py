@@ -1,19 +1,12 @@
-from droneinterface import Vehicle, enable_logging, mavlink, Timeout
+from droneinterface import Vehicle, enable_logging, mavlink
 
-from time import time
 import numpy as np
 import pandas as pd
 
 
 def record_message(vehicle, id, duration):
-    msgs = []
-    start = time()
-    while time() < start + duration:
-        try:
-            msgs.append(vehicle.next_message(id, timeout=duration))
-        except Timeout:
-            pass
-    return msgs
+    with vehicle.stream(id) as stream:
+        return stream.record(duration)
 
 enable_logging('DEBUG')
 #setup the connection
@@ -0,0 +1,42 @@
+"""Time from a message arriving to a waiting thread waking up, for different numbers of waiters
+on the same message."""
+from threading import Thread
+from time import perf_counter, sleep
+import numpy as np
+from droneinterface import Connection
+from tests.fake_master import FakeMaster, heartbeat
+
+
+conn = Connection(FakeMaster(), timeout=None)
+conn.start()
+conn.add_system(1)
+
+
+def measure(nwaiters: int, repeats: int=50):
+    latencies = []
+    for _ in range(repeats):
+        woke = []
+        waiters = [conn.add_waiter(1, 0) for _ in range(nwaiters)]
+
+        def wait(w):
+            w.wait(1)
+            woke.append(perf_counter())
+        threads = [Thread(target=wait, args=(w,)) for w in waiters]
+        for t in threads:
+            t.start()
+        sleep(0.001)
+        sent = perf_counter()
+        conn.master.push(heartbeat())
+        for t in threads:
+            t.join()
+        for w in waiters:
+            w.remove()
+        latencies.append(max(woke) - sent)
+    return np.array(latencies) * 1000
+
+
+for n in [1, 10, 100]:
+    lat = measure(n)
+    print(f"{n:4d} waiters: median {np.median(lat):.2f}ms, p99 {np.percentile(lat, 99):.2f}ms")
+
+conn.close()
@@ -0,0 +1,24 @@
+"""Polling last_heartbeat and last_globalpositionint while nothing new arrives, the wrapper is parsed once per message"""
+from timeit import timeit
+from droneinterface import Connection, Vehicle
+from droneinterface.messages import mavlink, GlobalPositionInt
+from tests.fake_master import FakeMaster, heartbeat
+
+
+conn = Connection(FakeMaster(), timeout=None)
+conn.start()
+veh = Vehicle(conn, 1, 1)
+conn.master.push(heartbeat())
+conn.master.push(mavlink.MAVLink_global_position_int_message(1, 500000000, 10000000, 100000, 5000, 10, 2, -3, 9000))
+veh.wait_for_test(lambda: 0 in veh.msgs and 33 in veh.msgs, 3)
+
+n = 100000
+for label, poll in [
+    ("last_heartbeat().armed", lambda: veh.last_heartbeat().armed),
+    ("last_globalpositionint().position", lambda: veh.last_globalpositionint().position),
+    ("GlobalPositionInt.parse().position", lambda: GlobalPositionInt.parse(veh.msgs[33].last_message).position),
+]:
+    print(f"{label:35s} {timeit(poll, number=n) / n * 1e6:.2f}us")
+lm = veh.msgs[33]
+print(f"hits {lm.wrapped_hits}, misses {lm.wrapped_misses}")
+conn.close()
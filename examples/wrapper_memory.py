@@ -0,0 +1,49 @@
+"""Memory and time to parse and keep 400 messages of every wrapped type, with every attribute decoded.
+The raw messages are made before measuring, so the memory is what the wrappers and decoded values add."""
+from time import perf_counter
+import tracemalloc
+import numpy as np
+from droneinterface.messages import mavlink, wrappers
+
+
+rng = np.random.default_rng(0)
+
+
+def example(msgcls):
+    types = dict(zip(msgcls.fieldnames, msgcls.fieldtypes))
+    kwargs = {}
+    for name, length in zip(msgcls.ordered_fieldnames, msgcls.array_lengths):
+        if types[name] == "char":
+            kwargs[name] = "abc"
+        else:
+            values = rng.uniform(1, 100, max(length, 1))
+            values = values.tolist() if types[name] in ["float", "double"] else values.astype(int).tolist()
+            kwargs[name] = values if length > 0 else values[0]
+    msg = msgcls(**kwargs)
+    msg._timestamp = rng.uniform()
+    return msg
+
+
+n = 400
+msgs = {msgid: [example(mavlink.mavlink_map[msgid]) for _ in range(n)] for msgid in wrappers}
+
+for label, read in [("parse only", False), ("parse and read everything", True)]:
+    failed = []
+    kept = []
+    tracemalloc.start()
+    start = perf_counter()
+    for msgid, msgs_of_type in msgs.items():
+        try:
+            for msg in msgs_of_type:
+                wr = wrappers[msgid].parse(msg)
+                if read:
+                    wr.data
+                kept.append(wr)
+        except Exception as ex:
+            failed.append((msgid, repr(ex)))
+    elapsed = perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label}: {len(msgs) - len(failed)} types, {len(kept)} wrappers, {elapsed:.2f}s, {size / len(kept):.0f} bytes per wrapper")
+    if len(failed) > 0:
+        print(f"    failed: {failed[:3]}")
@@ -0,0 +1,22 @@
+"""Cost of parsing a message into its wrapper and reading one attribute, or all of them"""
+from timeit import timeit
+from droneinterface.messages import mavlink, Heartbeat, GlobalPositionInt, AttitudeQuaternion
+
+
+hb = mavlink.MAVLink_heartbeat_message(1, 3, 129, 0, 4, 3)
+gpi = mavlink.MAVLink_global_position_int_message(1, 500000000, 10000000, 100000, 5000, 10, 2, -3, 9000)
+att = mavlink.MAVLink_attitude_quaternion_message(1, 1, 0, 0, 0, 0.1, 0, 0, [1, 0, 0, 0])
+for msg in [hb, gpi, att]:
+    msg._timestamp = 0.0
+
+n = 20000
+for label, stmt in [
+    ("Heartbeat .armed", lambda: Heartbeat.parse(hb).armed),
+    ("Heartbeat all", lambda: Heartbeat.parse(hb).data),
+    ("GlobalPositionInt .position", lambda: GlobalPositionInt.parse(gpi).position),
+    ("GlobalPositionInt .time_boot_ms", lambda: GlobalPositionInt.parse(gpi).time_boot_ms),
+    ("GlobalPositionInt all", lambda: GlobalPositionInt.parse(gpi).data),
+    ("AttitudeQuaternion .att", lambda: AttitudeQuaternion.parse(att).att),
+    ("AttitudeQuaternion all", lambda: AttitudeQuaternion.parse(att).data),
+]:
+    print(f"{label:35s} {timeit(stmt, number=n) / n * 1e6:.2f}us")
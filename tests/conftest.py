@@ -0,0 +1,29 @@
+from pytest import fixture
+from droneinterface import Connection, Vehicle
+from tests.fake_master import FakeMaster
+
+
+@fixture
+def make_conn():
+    """start Connections to FakeMasters, every one is closed at teardown"""
+    conns = []
+
+    def make(**kwargs):
+        conn = Connection(FakeMaster(), timeout=None, **kwargs)
+        conn.start()
+        conns.append(conn)
+        return conn
+
+    yield make
+    for conn in conns:
+        conn.close()
+
+
+@fixture
+def fake_conn(make_conn):
+    return make_conn()
+
+
+@fixture
+def veh(fake_conn):
+    return Vehicle(fake_conn, 1, 1)
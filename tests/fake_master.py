@@ -0,0 +1,65 @@
+"""A stand in for a pymavlink mavfile so Connection and Vehicle can be tested without SITL"""
+from collections import deque
+from threading import Event
+from time import time
+from droneinterface.messages import mavlink
+
+
+class FakeMaster:
+    address = "fake"
+    target_component = 1
+    srcSystem = 255
+    srcComponent = 0
+
+    def __init__(self):
+        self.inbox = deque()
+        self.ready = Event()
+        self.sent = []
+        self.mav = self
+        self.sysid_state = {}
+        self.param_state = {}
+        self.senders = {}
+        self.decoder = mavlink.MAVLink(None)
+
+    def push(self, msg, sysid=1, compid=1):
+        """pack msg as (sysid, compid) would send it, so it has a sequence number and a buffer"""
+        if (sysid, compid) not in self.senders:
+            self.senders[(sysid, compid)] = mavlink.MAVLink(None, sysid, compid)
+        sender = self.senders[(sysid, compid)]
+        msg.pack(sender)
+        sender.seq = (sender.seq + 1) % 256
+        msg._timestamp = time()
+        self.inbox.append(msg)
+        self.ready.set()
+
+    def recv_msg(self):
+        try:
+            return self.inbox.popleft()
+        except IndexError:
+            self.ready.clear()
+            return None
+
+    def recv(self, n=None):
+        """the bytes of everything pushed so far, as a capture connection reads them"""
+        msgs = []
+        while len(self.inbox) > 0:
+            msgs.append(self.inbox.popleft())
+        if len(msgs) == 0:
+            self.ready.clear()
+        return b"".join(bytes(msg.get_msgbuf()) for msg in msgs)
+
+    def decode(self, msgbuf):
+        return self.decoder.decode(msgbuf)
+
+    def post_message(self, msg):
+        pass
+
+    def select(self, timeout):
+        return self.ready.wait(timeout)
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+def heartbeat():
+    return mavlink.MAVLink_heartbeat_message(1, 3, 1, 0, 4, 3)
@@ -0,0 +1,92 @@
+import asyncio
+import numpy as np
+from pytest import raises
+from droneinterface import Timeout
+from droneinterface.aio import AsyncVehicle
+from droneinterface.messages import mavlink
+from tests.fake_master import heartbeat
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+def test_many_waiters_one_message(veh):
+    async def main():
+        aveh = AsyncVehicle(veh)
+        waits = [asyncio.ensure_future(aveh.next_message(0, 1)) for _ in range(1000)]
+        await asyncio.sleep(0)
+        veh.conn.master.push(heartbeat())
+        res = await asyncio.gather(*waits)
+        assert all(r.id == 0 for r in res)
+        assert veh.conn.registry.count() == 0
+    run(main())
+
+
+def test_next_message_timeout(veh):
+    async def main():
+        with raises(Timeout):
+            await AsyncVehicle(veh).next_heartbeat(0.05)
+        assert veh.conn.registry.count() == 0
+    run(main())
+
+
+def test_stream_drops_oldest(veh):
+    async def main():
+        aveh = AsyncVehicle(veh)
+        async with aveh.stream(0, maxlen=2) as stream:
+            for i in range(5):
+                msg = heartbeat()
+                msg.custom_mode = i
+                veh.conn.master.push(msg)
+            while stream.queue.qsize() + stream.dropped < 5:
+                await asyncio.sleep(0.01)
+            assert [(await stream.get(1)).custom_mode for _ in range(2)] == [3, 4]
+            assert stream.stats == dict(received=5, dropped=3, queued=0)
+    run(main())
+
+
+def test_command_waits_for_ack(veh):
+    async def main():
+        aveh = AsyncVehicle(veh)
+        asyncio.get_running_loop().call_later(0.05, lambda: veh.conn.master.push(
+            mavlink.MAVLink_command_ack_message(mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 0)
+        ))
+        ack = await aveh.command("arm", timeout=1)
+        assert ack.command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM
+        assert len(veh.conn.master.sent) == 1
+    run(main())
+
+
+def test_set_parameter_float32(veh):
+    async def main():
+        aveh = AsyncVehicle(veh)
+        master = veh.conn.master
+        reply = mavlink.MAVLink_param_value_message(b"TRIM_THROTTLE", float(np.float32(0.1)), mavlink.MAVLINK_TYPE_FLOAT, 1, 0)
+        master.push(reply)
+        reply = master.decode(master.inbox.pop().get_msgbuf())   # decoded as received, param_id a str
+        reply._timestamp = 0.0
+        asyncio.get_running_loop().call_later(0.05, lambda: (master.inbox.append(reply), master.ready.set()))
+        value = await aveh.set_parameter("TRIM_THROTTLE", 0.1, retry_interval=1, retries=1)
+        assert np.float32(value) == np.float32(0.1)
+    run(main())
+
+
+def test_close_ends_iteration(veh):
+    async def main():
+        aveh = AsyncVehicle(veh)
+        stream = aveh.stream(0)
+        asyncio.get_running_loop().call_later(0.05, stream.close)
+        assert [msg async for msg in stream] == []
+    run(main())
+
+
+def test_closed_loop_unsubscribes(veh):
+    async def main():
+        AsyncVehicle(veh).stream(0)   # left open when the loop closes
+    run(main())
+    assert veh.conn.registry.count(1, 0) == 1
+    with veh.conn.add_waiter(1, 0) as waiter:
+        veh.conn.master.push(heartbeat())
+        assert waiter.wait(1)
+    assert veh.conn.registry.count(1, 0) == 0
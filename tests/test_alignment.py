@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from pytest import raises
+from droneinterface.alignment import align, resample, time_base
+
+
+def frame(t, **cols):
+    return pd.DataFrame(cols, index=pd.Index(np.asarray(t, dtype=float), name="timestamp"))
+
+
+a = frame([0, 1, 2, 3], x=[0, 10, 20, 30])
+b = frame([0.4, 1.6, 2.5], y=[1.0, 2.0, 3.0], mode=["a", "b", "c"])
+
+
+def test_asof_matches_merge_asof():
+    df = align({"a": a, "b": b}, "a")
+    expected = pd.merge_asof(a.reset_index(), b.reset_index(), on="timestamp")
+    np.testing.assert_array_equal(df.index, expected.timestamp)
+    np.testing.assert_array_equal(df.b_y, expected.y)
+    assert list(df.columns) == ["a_x", "b_y", "b_mode"]
+
+
+def test_nearest_and_tolerance():
+    df = align({"a": a, "b": b}, "a", method={"b": "nearest"}, tolerance={"b": 0.5})
+    np.testing.assert_array_equal(df.b_y, [1.0, np.nan, 2.0, 3.0])
+    assert df.b_mode.tolist() == ["a", None, "b", "c"]
+
+
+def test_linear():
+    df = align({"a": a, "b": b}, np.array([0.0, 1.0, 1.6, 3.0]), method="linear")
+    np.testing.assert_allclose(df.a_x, [0, 10, 16, 30])
+    np.testing.assert_allclose(df.b_y, [np.nan, 1.5, 2.0, np.nan])
+    assert df.b_mode.tolist() == [None, "a", "b", None]
+
+
+def test_time_bases():
+    streams = {"a": (a.index.to_numpy(), {}), "b": (b.index.to_numpy(), {})}
+    np.testing.assert_array_equal(time_base(streams, "union"), [0, 0.4, 1, 1.6, 2, 2.5, 3])
+    np.testing.assert_array_equal(time_base(streams, rate=2.0), np.arange(7) / 2)
+    with raises(ValueError):
+        time_base(streams, "c")
+
+
+def test_number_base_is_a_label():
+    streams = {10: (a.index.to_numpy(), {}), 33: (b.index.to_numpy(), {})}
+    np.testing.assert_array_equal(time_base(streams, 10), [0, 1, 2, 3])
+    with raises(ValueError):
+        time_base(streams, 2)
+    with raises(ValueError):
+        time_base(streams, 2.0)
+
+
+def test_structured_array_stream():
+    arr = np.zeros(3, dtype=[("timestamp", "f8"), ("v", "f4", (2,))])
+    arr["timestamp"] = [0, 1, 2]
+    arr["v"] = [[0, 1], [2, 3], [4, 5]]
+    df = align({33: arr}, np.array([1.5]))
+    assert df.loc[1.5, "33_v_1"] == 3
+
+
+def test_unknown_method():
+    with raises(ValueError):
+        resample(np.array([0.0]), {}, np.array([0.0]), "cubic")
+
+
+def test_slerp():
+    from droneinterface.alignment import slerp
+    yaw = lambda a: np.array([[np.cos(a / 2), 0, 0, np.sin(a / 2)]])
+    np.testing.assert_array_almost_equal(slerp(yaw(0), yaw(np.pi / 2), np.array([0.5])), yaw(np.pi / 4))
+    np.testing.assert_array_almost_equal(slerp(yaw(0.1), -yaw(0.3), np.array([0.5])), yaw(0.2))   # the short way round
+    np.testing.assert_array_almost_equal(slerp(yaw(0.1), yaw(0.1), np.array([0.3])), yaw(0.1))
+
+
+def test_interpolate():
+    from droneinterface.alignment import interpolate
+    t = np.array([0.0, 1.0, 2.0, 4.0])
+    q = np.array([[np.cos(a / 2), 0, 0, np.sin(a / 2)] for a in [0, 0.2, 0.4, 0.8]])
+    cols = dict(x=np.array([0, 10, 20, 40]), v=np.arange(8).reshape(4, 2), q=q, name=np.array(list("abcd")))
+    out, valid = interpolate(t, cols, np.array([-1, 0.5, 2.0, 3.0, 5.0]), ["q"], tolerance=0.9)
+    np.testing.assert_array_almost_equal(out["x"][1:4], [5, 20, 30])
+    np.testing.assert_array_almost_equal(out["v"][1], [1, 2])
+    np.testing.assert_array_almost_equal(out["q"][3], [np.cos(0.3), 0, 0, np.sin(0.3)])
+    assert out["name"][1] == "a"
+    assert valid.tolist() == [False, True, True, False, False]   # 3.0 is 1s from the samples either side
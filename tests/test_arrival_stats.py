@@ -0,0 +1,50 @@
+import numpy as np
+from time import sleep
+from types import SimpleNamespace
+from droneinterface.arrival_stats import ArrivalStats, IntervalHistogram
+from droneinterface.messages import mavlink
+
+
+def msg(t, boot_ms):
+    return SimpleNamespace(_timestamp=t, time_boot_ms=boot_ms)
+
+
+def test_percentiles():
+    hist = IntervalHistogram()
+    for t in np.cumsum(np.full(1000, 0.01)):
+        hist.add(t)
+    assert 0.0085 < hist.percentile(50) < 0.0115
+    assert sum(hist.counts) == 999
+
+
+def test_vehicle_clock():
+    stats = ArrivalStats("time_boot_ms")
+    rng = np.random.default_rng(0)
+    for i in range(500):
+        stats.record(msg(1000 + i * 0.02 + rng.uniform(0, 0.01), i * 20))
+    res = stats.stats()
+    assert res["count"] == 500
+    assert 0.018 < res["vehicle_p50"] < 0.025
+    assert res["vehicle_p99"] == res["vehicle_p50"]
+    assert res["p99"] > res["vehicle_p99"]
+    assert 49 < res["rate"] < 51
+
+
+def test_timeline():
+    stats = ArrivalStats()
+    for i in range(300):
+        stats.record(msg(100 + i * 0.1, 0))
+    seconds, counts = stats.timeline()
+    np.testing.assert_array_equal(seconds, np.arange(100, 129))
+    assert all(counts[1:] == 10)
+    assert stats.stats()["last_second_rate"] == 10
+
+
+def test_connection_arrival_stats(fake_conn):
+    conn = fake_conn
+    for i in range(20):
+        conn.master.push(mavlink.MAVLink_scaled_imu_message(i * 10, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+    sleep(0.2)
+    stats = conn.arrival_stats()[mavlink.MAVLINK_MSG_ID_SCALED_IMU]
+    assert stats["count"] == 20
+    assert 0.0085 < stats["vehicle_p50"] < 0.0115
@@ -0,0 +1,97 @@
+import numpy as np
+from pathlib import Path
+from time import sleep
+from pytest import fixture
+from pymavlink import mavutil
+from droneinterface import Connection
+from droneinterface.capture import FrameSplitter, Tlog, TlogWriter
+from droneinterface.messages import mavlink
+from tests.fake_master import FakeMaster, heartbeat
+
+
+tlog = Path("simulator/mav.tlog")
+
+
+def test_tlog_index_matches_mavutil():
+    index = Tlog(tlog).index
+    master = mavutil.mavlink_connection(str(tlog))
+    msgs = [master.recv_msg() for _ in range(2000)]
+    np.testing.assert_array_equal(index["msgid"][:2000], [m.get_msgId() for m in msgs])
+    np.testing.assert_array_almost_equal(index["timestamp"][:2000], [m._timestamp for m in msgs])
+
+
+def test_splitter_resyncs_across_chunks():
+    tl = Tlog(tlog)
+    frames = [bytes(tl.buf[o + 8:o + 8 + l]) for o, l in zip(tl.index["offset"][:500].tolist(), tl.index["length"][:500].tolist())]
+    stream = b"\x00\x01garbage" + b"".join(frames)
+    splitter = FrameSplitter()
+    out = []
+    for i in range(0, len(stream), 37):
+        out += [f[0] for f in splitter.feed(stream[i:i + 37])]
+    assert out == frames
+    assert splitter.skipped == 9
+
+
+def test_splitter_skips_noise_start_bytes():
+    tl = Tlog(tlog)
+    frames = [bytes(tl.buf[o + 8:o + 8 + l]) for o, l in zip(tl.index["offset"][:200].tolist(), tl.index["length"][:200].tolist())]
+    corrupt = bytearray(frames[50])
+    corrupt[-3] ^= 0xFF
+    stream = b"".join(frames[:10]) + b"\xfd\xfe" + b"".join(frames[10:50]) + bytes(corrupt) + b"".join(frames[51:])
+    splitter = FrameSplitter()
+    out = []
+    for i in range(0, len(stream), 64):
+        out += [f[0] for f in splitter.feed(stream[i:i + 64])]
+    assert out == frames[:50] + frames[51:]
+    assert splitter.rejected >= 3
+
+
+def test_unknown_message_ids_kept(tmp_path):
+    frames = [bytes(heartbeat().pack(mavlink.MAVLink(None, 1, 1))) for _ in range(3)]
+    unknown = bytearray(frames[1])
+    unknown[7:10] = (0xABCDEF).to_bytes(3, "little")   # not in the dialect, so its CRC can not be checked
+    assert 0xABCDEF not in mavlink.mavlink_map
+    splitter = FrameSplitter()
+    out = splitter.feed(frames[0] + bytes(unknown))
+    assert [f[1] for f in out] == [0]   # waits to see the next frame start
+    out += splitter.feed(frames[2])
+    assert [f[1] for f in out] == [0, 0xABCDEF, 0] and splitter.unchecked == 1
+
+    writer = TlogWriter(tmp_path / "capture.tlog")
+    for frame, msgid, sysid, compid, seq in out:
+        writer.write(1.0, frame, msgid, sysid, compid)
+    writer.close()
+    index = Tlog(tmp_path / "capture.tlog").index
+    assert index["msgid"].tolist() == [0, 0xABCDEF, 0]
+    assert index["checked"].tolist() == [1, 0, 1]
+
+
+@fixture
+def capture_conn(tmp_path):
+    conn = Connection(FakeMaster(), tmp_path, timeout=None, capture=True)
+    conn.start()
+    yield conn
+    conn.close()
+
+
+def imu(i):
+    return mavlink.MAVLink_scaled_imu_message(i, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+
+
+def test_capture_decodes_watched_only(capture_conn: Connection):
+    for i in range(20):
+        capture_conn.master.push(imu(i))
+    capture_conn.master.push(heartbeat())
+    sleep(0.3)
+    assert mavlink.MAVLINK_MSG_ID_SCALED_IMU not in capture_conn.msgs[1]
+    assert mavlink.MAVLINK_MSG_ID_HEARTBEAT in capture_conn.msgs[1]
+
+    with capture_conn.add_waiter(1, mavlink.MAVLINK_MSG_ID_SCALED_IMU) as waiter:
+        capture_conn.master.push(imu(20))
+        assert waiter.wait(1)
+        assert waiter.lm.last_message.time_boot_ms == 20
+
+    capture_conn.capture.flush()
+    df = Tlog(capture_conn.outdir / "capture.tlog").dataframe(mavlink.MAVLINK_MSG_ID_SCALED_IMU)
+    np.testing.assert_array_equal(df.time_boot_ms, np.arange(21))
+    assert capture_conn.link_stats()[(1, 1)]["received"] == 22
@@ -0,0 +1,78 @@
+from concurrent.futures import wait
+from pytest import raises
+from droneinterface import Timeout, CommandFailed
+from droneinterface.messages import mavlink
+
+
+def ack(command, result=mavlink.MAV_RESULT_ACCEPTED, progress=0, target_system=0, target_component=0):
+    return mavlink.MAVLink_command_ack_message(command, result, progress, 0, target_system, target_component)
+
+
+def test_burst_in_flight_together(veh):
+    futures = [veh.set_message_rate(id, 10) for id in range(20)]
+    assert len(veh.conn.master.sent) == 20 and veh.commands.pending == 20
+    for _ in range(20):
+        veh.conn.master.push(ack(mavlink.MAV_CMD_SET_MESSAGE_INTERVAL))
+    done, not_done = wait(futures, 2)
+    assert len(not_done) == 0
+    assert all(f.result().command == mavlink.MAV_CMD_SET_MESSAGE_INTERVAL for f in futures)
+    stats = veh.commands.stats()["set_message_rate"]
+    assert stats["sent"] == stats["accepted"] == 20 and stats["retransmits"] == 0
+    assert stats["p99"] < 2
+    assert veh.commands.histogram("set_message_rate")[1].sum() == 20
+
+
+def test_acks_matched_by_command(veh):
+    arm = veh.arm()
+    speed = veh.set_airspeed(20)
+    veh.conn.master.push(ack(mavlink.MAV_CMD_DO_CHANGE_SPEED))
+    assert speed.result(2).command == mavlink.MAV_CMD_DO_CHANGE_SPEED
+    assert not arm.done()
+    veh.conn.master.push(ack(mavlink.MAV_CMD_REQUEST_MESSAGE))
+    veh.conn.master.push(ack(mavlink.MAV_CMD_COMPONENT_ARM_DISARM))
+    assert arm.result(2).command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM
+    assert veh.commands.unmatched == 1
+
+
+def test_retransmit_then_timeout(veh):
+    future = veh.send_command("arm", timeout=0.05, retries=2)
+    with raises(Timeout):
+        future.result(2)
+    sent = veh.conn.master.sent
+    assert len(sent) == 3 and sent[-1].confirmation == 2
+    assert veh.commands.stats()["arm"]["timeouts"] == 1
+    assert veh.commands.pending == 0
+
+
+def test_rejected(veh):
+    future = veh.disarm()
+    veh.conn.master.push(ack(mavlink.MAV_CMD_COMPONENT_ARM_DISARM, mavlink.MAV_RESULT_DENIED))
+    with raises(CommandFailed) as ex:
+        future.result(2)
+    assert ex.value.ack.result == mavlink.MAV_RESULT_DENIED
+
+
+def test_in_progress_keeps_waiting(veh):
+    future = veh.send_command("request_message", 33, timeout=0.2, retries=0)
+    veh.conn.master.push(ack(mavlink.MAV_CMD_REQUEST_MESSAGE, mavlink.MAV_RESULT_IN_PROGRESS, 50))
+    veh.wait_for_test(lambda: mavlink.MAVLINK_MSG_ID_COMMAND_ACK in veh.msgs, 2)
+    assert not future.done()
+    veh.conn.master.push(ack(mavlink.MAV_CMD_REQUEST_MESSAGE))
+    assert future.result(2).result == mavlink.MAV_RESULT_ACCEPTED
+
+
+def test_polling_requests_not_retried(veh):
+    veh.commands.timeout = 0.05
+    assert veh.get_message(mavlink.MAVLINK_MSG_ID_GLOBAL_POSITION_INT, timeout=0.25) is None
+    veh.wait_for_test(lambda: veh.commands.pending == 0, 2)
+    assert len(veh.conn.master.sent) == 1
+    assert veh.commands.stats()["request_message"]["retransmits"] == 0
+
+
+def test_acks_for_other_gcs_ignored(veh):
+    arm = veh.arm()
+    veh.conn.master.push(ack(mavlink.MAV_CMD_COMPONENT_ARM_DISARM, mavlink.MAV_RESULT_DENIED, target_system=254, target_component=190))
+    veh.conn.master.push(ack(mavlink.MAV_CMD_COMPONENT_ARM_DISARM, mavlink.MAV_RESULT_DENIED, target_system=255, target_component=1))
+    veh.conn.master.push(ack(mavlink.MAV_CMD_COMPONENT_ARM_DISARM, target_system=255))
+    assert arm.result(2).result == mavlink.MAV_RESULT_ACCEPTED
+    assert veh.commands.ignored == 2
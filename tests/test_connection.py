@@ -1,6 +1,8 @@
 from droneinterface import Connection
-from pytest import fixture
+from pytest import fixture, raises
 from pathlib import Path
+from tests.fake_master import heartbeat
+from droneinterface.messages import mavlink
 
 
 
@@ -14,3 +16,80 @@ def test_csv_msgs_parsed(conn_csv):
     assert 0 in conn_csv.msgs[4]
 
 
+def test_folder_loaded_on_demand(conn_csv):
+    assert (4, 32) in conn_csv.available()
+    assert conn_csv.msgs[4].loaded == []
+    assert conn_csv.msgs[4][32].id == 32
+    assert conn_csv.msgs[4].loaded == [32]
+    assert conn_csv.msgs[4][32].store.readonly
+
+
+def test_missing_message_raises(conn_csv):
+    with raises(KeyError):
+        conn_csv.msgs[4][9999]
+    assert conn_csv.msgs[4].get(9999) is None
+
+
+def test_open_large_session(tmp_path):
+    ids = list(mavlink.mavlink_map.keys())
+    for id in ids:
+        (tmp_path / f"1_{id}.csv").write_text("timestamp\n")
+    conn = Connection(outdir=tmp_path)
+    assert conn.msgs[1].loaded == []
+    assert len(conn.available()) == len(ids)
+    conn.load(1, ids[:10])
+    assert len(conn.msgs[1].loaded) == 10
+
+
+
+def test_concurrent_waiters(fake_conn):
+    fake_conn.add_system(1)
+    waiters = [fake_conn.add_waiter(1, 0) for _ in range(5)]
+    waiters[0].remove()
+    fake_conn.master.push(heartbeat())
+    assert all(w.wait(1) for w in waiters[1:])
+    assert not waiters[0].is_set()
+    for w in waiters[1:]:
+        w.remove()
+    assert fake_conn.registry.count() == 0
+
+
+def test_late_waiter_not_missed(fake_conn):
+    fake_conn.add_system(1)
+    fake_conn.master.push(heartbeat())
+    fake_conn.wait_for_message(1, 1)
+    with fake_conn.add_waiter(1, 0, after=0) as waiter:
+        assert waiter.is_set()
+    with fake_conn.add_waiter(1, 0) as waiter:
+        assert not waiter.is_set()
+
+
+class Failing:
+    def notify(self, lm):
+        raise RuntimeError("subscriber failed")
+
+
+class Recording:
+    def __init__(self):
+        self.received = []
+
+    def notify(self, lm):
+        self.received.append(lm.last_message)
+
+
+def test_failing_subscriber_skipped(fake_conn):
+    fake_conn.add_system(1)
+    recording = Recording()
+    fake_conn.subscribe(1, 0, Failing())
+    fake_conn.subscribe(1, 0, recording)
+    with fake_conn.add_waiter(1, 0) as waiter:
+        fake_conn.master.push(heartbeat())
+        assert waiter.wait(1)
+    assert len(recording.received) == 1
+    assert fake_conn.is_alive()
+
+
+def test_close_stops_reader(fake_conn):
+    fake_conn.close()
+    fake_conn.join(1)
+    assert not fake_conn.is_alive()
@@ -0,0 +1,125 @@
+from droneinterface.dataflash import DataFlash
+from droneinterface import Connection
+from pymavlink import DFReader
+from pytest import fixture
+import struct
+import numpy as np
+
+
+def fmt_record(type, name, fmt, columns):
+    length = 3 + struct.calcsize("<" + "".join(DFReader.FORMAT_TO_STRUCT[c][0] for c in fmt))
+    return struct.pack("<BBBBB4s16s64s", 0xA3, 0x95, 128, type, length, name.encode(), fmt.encode(), columns.encode())
+
+
+def record(type, fmt, *values):
+    return struct.pack("<BBB", 0xA3, 0x95, type) + struct.pack("<" + "".join(DFReader.FORMAT_TO_STRUCT[c][0] for c in fmt), *values)
+
+
+@fixture(scope="module")
+def binfile(tmp_path_factory):
+    path = tmp_path_factory.mktemp("df") / "test.BIN"
+    data = fmt_record(128, "FMT", "BBnNZ", "Type,Length,Name,Format,Columns")
+    data += fmt_record(129, "GPS", "QBIHLL", "TimeUS,Status,GMS,GWk,Lat,Lng")
+    data += fmt_record(130, "TST", "QfcN", "TimeUS,Val,Cnt,Nm")
+    data += fmt_record(131, "MSG", "Z", "Message")
+    for i in range(200):
+        t = 1000000 + i * 20000
+        # bytes a3 95 inside the payload should not be mistaken for a header
+        data += record(130, "QfcN", t, np.frombuffer(b"\xa3\x95\x82\x40", "<f4")[0], i, b"name")
+        if i % 10 == 0:
+            data += record(129, "QBIHLL", t + 5, 3, 100000 + i * 20, 2250, 514000000 + i, -26000000 - i)
+        if i % 50 == 0:
+            data += record(131, "Z", f"message {i}".encode())
+    path.write_bytes(data)
+    return path
+
+
+def test_formats(binfile):
+    df = DataFlash(binfile)
+    assert set(df.names.keys()) == {"FMT", "GPS", "TST", "MSG"}
+
+
+def test_matches_dfreader(binfile):
+    dfl = DataFlash(binfile)
+    tst = dfl.dataframe("TST")
+    gps = dfl.dataframe("GPS")
+
+    reader = DFReader.DFReader_binary(str(binfile))
+    msgs = {"TST": [], "GPS": []}
+    while (m := reader.recv_msg()) is not None:
+        if m.get_type() in msgs:
+            msgs[m.get_type()].append(m)
+
+    assert len(tst) == len(msgs["TST"]) == 200
+    assert len(gps) == len(msgs["GPS"]) == 20
+    np.testing.assert_allclose(tst.index, [m._timestamp for m in msgs["TST"]])
+    np.testing.assert_allclose(tst.Cnt, [m.Cnt for m in msgs["TST"]])
+    np.testing.assert_allclose(gps.Lat, [m.Lat for m in msgs["GPS"]])
+    assert tst.Nm.iloc[0] == msgs["TST"][0].Nm
+
+
+def test_untimed_messages(binfile):
+    msg = DataFlash(binfile).dataframe("MSG")
+    assert len(msg) == 4
+    assert msg.Message.iloc[1] == "message 50"
+    assert np.all(np.diff(msg.index) > 0)
+
+
+def test_selected_fields(binfile):
+    tst = DataFlash(binfile).dataframe("TST", ["Cnt"])
+    assert list(tst.columns) == ["Cnt"]
+
+
+def test_parse_bin(binfile):
+    df = Connection.parse_bin(binfile, ["TST", "GPS"])
+    assert len(df) == 200
+
+
+@fixture(scope="module")
+def flightfile(tmp_path_factory):
+    """yawing at 1 rad/s and moving north at 11.1 m/s for 2 seconds, with a second EKF core and IMU to ignore"""
+    path = tmp_path_factory.mktemp("df") / "flight.BIN"
+    data = fmt_record(128, "FMT", "BBnNZ", "Type,Length,Name,Format,Columns")
+    data += fmt_record(140, "XKQ", "QBffff", "TimeUS,C,Q1,Q2,Q3,Q4")
+    data += fmt_record(141, "POS", "QLLfff", "TimeUS,Lat,Lng,Alt,RelHomeAlt,RelOriginAlt")
+    data += fmt_record(142, "XKF1", "QBffffff", "TimeUS,C,Roll,Pitch,Yaw,VN,VE,VD")
+    data += fmt_record(143, "IMU", "QBffffff", "TimeUS,I,GyrX,GyrY,GyrZ,AccX,AccY,AccZ")
+    data += fmt_record(144, "ORGN", "QBLLe", "TimeUS,Type,Lat,Lng,Alt")
+    data += record(144, "QBLLe", 1000, 0, 500000000, 10000000, 10000)
+    for ms in range(0, 2000, 10):
+        t = 1000000 + ms * 1000
+        if ms % 20 == 0:
+            data += record(140, "QBffff", t, 0, np.cos(ms / 2000), 0, 0, np.sin(ms / 2000))
+            data += record(140, "QBffff", t, 1, 1, 0, 0, 0)
+        if ms % 100 == 50:
+            data += record(141, "QLLfff", t, 500000000 + ms, 10000000, 100, 0, 0)
+        if ms % 40 == 0:
+            data += record(142, "QBffffff", t, 0, 0, 0, np.degrees(ms / 1000), 11.1, 0, 0)
+            for i in range(2):
+                data += record(143, "QBffffff", t, i, 0, 0, 1 - i, 0, 0, -9.80665)
+    path.write_bytes(data)
+    return path
+
+
+def test_dataflash_state_inputs(flightfile):
+    from droneinterface.combinators import StateMaker
+    inputs = StateMaker.dataflash_inputs(flightfile)
+    att, pos, imu = inputs[31], inputs[33], inputs[26]
+    assert len(att["timestamp"]) == 100 and len(pos["timestamp"]) == 20 and len(imu["timestamp"]) == 50
+    np.testing.assert_allclose(att["q4"], np.sin(att["time_boot_ms"] / 2000 - 0.5), atol=1e-6)
+    np.testing.assert_allclose(att["yawspeed"], 1)
+    np.testing.assert_allclose(pos["lat"], 500000000 + pos["time_boot_ms"] - 1000, atol=0.5)
+    np.testing.assert_allclose(pos["vx"], 1110, rtol=1e-6)
+    np.testing.assert_allclose(imu["zacc"], -1000)
+
+
+def test_parse_bin_states(flightfile):
+    st = Connection.parse_bin_states(flightfile)
+    assert len(st) >= 90
+    assert np.all((st.t >= 1.0) & (st.t <= 3.0))
+    np.testing.assert_allclose(np.diff(st.pos.y), 0.222, atol=0.01)   # 11.1 m/s north (y) at 50Hz
+    np.testing.assert_allclose(st.pos.z, 0, atol=1e-6)   # at the altitude of ORGN
+
+    st = Connection.parse_bin_states(flightfile, 1.5, 2.5, rate=20.0)
+    assert len(st) == 21
+    np.testing.assert_allclose(st.t, 1.5 + np.arange(21) * 0.05)
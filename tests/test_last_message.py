@@ -2,7 +2,7 @@ from droneinterface.last_message import LastMessage
 from pathlib import Path
 import numpy as np
 import pandas as pd
-from pytest import fixture
+from pytest import fixture, raises
 from droneinterface.messages import mavlink
 from tempfile import TemporaryFile
 
@@ -44,4 +44,41 @@ def test_store_hb(temp_csv):
 
     assert len(lm.all_messages()) == 1
 
-    
\ No newline at end of file
+    
+
+def test_wrapper_is_cached():
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[0], n=3)
+    msgs = [mavlink.MAVLink_heartbeat_message(1, 3, 129, i, 4, 3) for i in range(3)]
+    for msg in msgs[:2]:
+        msg._timestamp = 0.0
+        lm.receive_message(msg)
+    
+    wr = lm.wrapper()
+    assert lm.wrapper() is wr
+    assert lm.wrapper(0) is not wr and lm.wrapper(0).custom_mode == 0
+    assert (lm.wrapped_hits, lm.wrapped_misses) == (2, 2)
+
+    msgs[2]._timestamp = 1.0
+    lm.receive_message(msgs[2])
+    assert lm.wrapper() is not wr and lm.wrapper().custom_mode == 2
+    assert lm.wrapper(-2) is not wr and lm.wrapper(-2).custom_mode == 1
+    assert lm.wrapped_misses == 4
+
+
+def test_shared_wrapper_read_only():
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[0], n=3)
+    assert lm.wrapper() is None
+    msg = mavlink.MAVLink_heartbeat_message(1, 3, 129, 5, 4, 3)
+    msg._timestamp = 0.0
+    lm.receive_message(msg)
+
+    wr = lm.wrapper()
+    with raises(AttributeError):
+        wr.custom_mode = 6
+    with raises(AttributeError):
+        wr.system_status = None
+    mine = wr.copy()
+    mine.custom_mode = 6
+    mine.system_status = None
+    assert mine.custom_mode == 6 and mine.system_status is None and mine.armed
+    assert lm.wrapper() is wr and wr.custom_mode == 5 and wr.system_status is not None and msg.custom_mode == 5
@@ -0,0 +1,47 @@
+from time import sleep
+from droneinterface.link_stats import LinkStats
+from tests.fake_master import heartbeat
+
+
+def test_gaps_and_wrap():
+    link = LinkStats(1, 1)
+    for seq in [250, 251, 252, 255, 0, 1, 5, 6]:
+        link.receive(seq, 10)
+    assert link.received == 8
+    assert link.lost == 2 + 3
+    assert link.bursts == {2: 1, 3: 1}
+    assert link.bytes == 80
+
+
+def test_duplicates():
+    link = LinkStats(1, 1)
+    for seq in [10, 11, 11, 12]:
+        link.receive(seq, 10)
+    assert link.received == 3
+    assert link.duplicates == 1
+    assert link.lost == 0
+
+
+def test_rolling():
+    link = LinkStats(1, 1)
+    link.receive(0, 10)
+    link.samples[0] = (link.samples[0][0] - 10, 0, 0, 0)
+    for seq in range(1, 100, 2):
+        link.receive(seq, 10)
+    rolling = link.rolling(10)
+    assert rolling["loss"] == 49.0
+    assert 5.0 < rolling["packets_per_s"] < 5.2
+
+
+def test_connection_link_stats(fake_conn):
+    conn = fake_conn
+    for i in range(20):
+        if i % 5 == 4:
+            conn.master.senders[(1, 1)].seq += 1
+        conn.master.push(heartbeat())
+    conn.master.push(heartbeat(), compid=2)
+    sleep(0.2)
+    stats = conn.link_stats()
+    assert stats[(1, 1)]["received"] == 20
+    assert stats[(1, 1)]["lost"] == 4
+    assert stats[(1, 2)]["received"] == 1
@@ -0,0 +1,87 @@
+import numpy as np
+from time import sleep
+from threading import Thread
+from pytest import raises
+from droneinterface import Vehicle, LastMessage
+from droneinterface.ring_buffer import RingBuffer
+from droneinterface.messages import mavlink
+
+
+dtype = np.dtype([("timestamp", "f8"), ("v", "i4"), ("a", "i4", (2,))])
+
+
+def fill(ring, n, dt=0.01):
+    for i in range(n):
+        ring.append((i * dt, i, [i, -i]))
+
+
+def test_last_wraps_in_order():
+    ring = RingBuffer(dtype, 10)
+    fill(ring, 25)
+    assert len(ring) == 10
+    np.testing.assert_array_equal(ring.last()["v"], np.arange(15, 25))
+    np.testing.assert_array_equal(ring.last(3)["a"][:, 1], [-22, -23, -24])
+    assert np.shares_memory(ring.last(), ring.data)
+
+
+def test_copy_taken_under_lock():
+    ring = RingBuffer(dtype, 10)
+    fill(ring, 5)
+    assert not np.shares_memory(ring.last(copy=True), ring.data)
+    np.testing.assert_array_equal(ring.window(0.02, copy=True)["v"], [2, 3, 4])
+    with ring.lock:
+        writer = Thread(target=fill, args=(ring, 1))
+        writer.start()
+        writer.join(0.05)
+        assert writer.is_alive() and len(ring) == 5
+    writer.join()
+    assert len(ring) == 6
+
+
+def test_window():
+    ring = RingBuffer(dtype, 1000)
+    fill(ring, 1000)
+    np.testing.assert_array_equal(ring.window(0.1)["v"], np.arange(989, 1000))
+    np.testing.assert_array_equal(ring.window(0.05, end=5.0)["v"], np.arange(495, 501))
+
+
+def test_horizon_grows():
+    ring = RingBuffer(dtype, horizon=5.0)
+    fill(ring, 2000, 1 / 128)
+    assert ring.depth == 1024
+    np.testing.assert_array_equal(ring.window(5.0)["v"], np.arange(1359, 2000))
+
+
+def test_vehicle_window(make_conn):
+    conn = make_conn(depth={None: 10.0, mavlink.MAVLINK_MSG_ID_SCALED_IMU: 50})
+    veh = Vehicle(conn, 1, 1)
+    for i in range(100):
+        conn.master.push(mavlink.MAVLink_scaled_imu_message(i, i, 0, 0, 0, 0, 0, 0, 0, 0))
+    sleep(0.2)
+    hist = veh.history(mavlink.MAVLINK_MSG_ID_SCALED_IMU)
+    np.testing.assert_array_equal(hist["time_boot_ms"], np.arange(50, 100))
+    df = veh.window(mavlink.MAVLINK_MSG_ID_SCALED_IMU, 10.0, frame=True)
+    assert df.index.name == "timestamp"
+    assert len(df) == 50
+
+
+def test_ring_is_opt_in(veh):
+    veh.conn.master.push(mavlink.MAVLink_scaled_imu_message(0, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+    veh.wait_for_test(lambda: mavlink.MAVLINK_MSG_ID_SCALED_IMU in veh.msgs, 2)
+    assert veh.msgs[mavlink.MAVLINK_MSG_ID_SCALED_IMU].ring is None
+    with raises(ValueError):
+        veh.history(mavlink.MAVLINK_MSG_ID_SCALED_IMU)
+
+
+class BrokenRing:
+    def append(self, row):
+        raise RuntimeError("broken")
+
+
+def test_ring_error_keeps_stored_message(tmp_path):
+    lm = LastMessage._build_mavlink(mavlink.MAVLink_scaled_imu_message, tmp_path / "1_26.col", depth=5)
+    lm.ring = BrokenRing()
+    msg = mavlink.MAVLink_scaled_imu_message(3, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    msg._timestamp = 1.0
+    lm.receive_message(msg)
+    assert lm.all_messages().time_boot_ms.tolist() == [3]
@@ -0,0 +1,71 @@
+from droneinterface.scheduling import Scheduler, Repeater
+from time import sleep, time, process_time
+
+
+def test_repeater_rate():
+    calls = []
+    with Repeater(lambda : calls.append(time()), 20, Scheduler()) as rep:
+        sleep(1.0)
+    n = len(calls)
+    sleep(0.2)
+    assert 18 <= n <= 22
+    assert len(calls) == n
+    assert rep.stats["misses"] == 0
+
+
+def test_repeater_restart():
+    calls = []
+    rep = Repeater(lambda : calls.append(1), 20, Scheduler())
+    rep.start()
+    rep.stop()
+    rep.start()
+    sleep(0.2)
+    rep.stop()
+    assert len(calls) > 1
+
+
+def test_repeater_stop_waits_for_call():
+    done = []
+    rep = Repeater(lambda : (sleep(0.3), done.append(1)), 20, Scheduler())
+    rep.start()
+    sleep(0.1)
+    rep.stop()
+    assert done == [1]
+
+
+def test_misses_counted():
+    sched = Scheduler()
+    job = sched.add(lambda : sleep(0.25), 10)
+    sleep(1.0)
+    job.cancel()
+    assert job.misses >= 4
+    assert job.calls <= 5
+
+
+def test_many_jobs_low_cpu():
+    sched = Scheduler()
+    calls = [0]
+    def inc():
+        calls[0] += 1
+    jobs = [sched.add(inc, 10) for _ in range(200)]
+    start, cpu = time(), process_time()
+    sleep(1.0)
+    wall, cpu = time() - start, process_time() - cpu
+    stats = sched.stats()
+    for job in jobs:
+        job.cancel()
+    assert calls[0] > 1500
+    assert cpu < 0.5 * wall
+    assert max(s["mean_lateness"] for s in stats) < 0.05
+
+
+def test_cancelled_jobs_released():
+    sched = Scheduler()
+    keep = sched.add(lambda : None, 50)
+    for _ in range(100):
+        sched.add(lambda : None, 50).cancel()
+    sleep(0.2)
+    assert sched.jobs == [keep]
+    keep.cancel()
+    sleep(0.1)
+    assert sched.jobs == [] and sched.heap == []
@@ -0,0 +1,134 @@
+from droneinterface.last_message import LastMessage
+from droneinterface.storage import StorageWriter, CSVStore, ColumnarStore
+from droneinterface.messages import mavlink
+from pytest import fixture
+from pathlib import Path
+import shutil
+import gc
+import weakref
+import numpy as np
+
+
+@fixture
+def temp_csv():
+    tf = Path("tests/test_data/testcsv_async.csv")
+    yield tf
+    tf.unlink(missing_ok=True)
+
+
+@fixture
+def temp_col():
+    tf = Path("tests/test_data/1_147.col")
+    yield tf
+    shutil.rmtree(tf, ignore_errors=True)
+
+
+def heartbeat(t):
+    hb = mavlink.MAVLink_heartbeat_message(1,0,1,1,1,2)
+    hb._timestamp = t
+    return hb
+
+
+def battery(t):
+    bs = mavlink.MAVLink_battery_status_message(0, 0, 0, 20, list(range(t, t+10)), 100, 10, 5, 50, 0, 1)
+    bs._timestamp = t
+    return bs
+
+
+def test_async_rows_written(temp_csv):
+    writer = StorageWriter(flush_interval=10, flush_bytes=2**20)
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[0], temp_csv, writer=writer)
+    for i in range(10):
+        lm.receive_message(heartbeat(i))
+
+    assert len(lm.all_messages()) == 10
+    assert writer.stats["written"] == 10
+    assert writer.stats["dropped"] == 0
+    writer.stop()
+
+
+def test_rows_flushed_on_stop(temp_csv):
+    writer = StorageWriter(flush_interval=10, flush_bytes=2**20)
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[0], temp_csv, writer=writer)
+    lm.receive_message(heartbeat(0))
+    writer.stop()
+    assert len(temp_csv.read_text().splitlines()) == 2
+
+
+def test_full_queue_drops_rows(temp_csv):
+    writer = StorageWriter(maxsize=2)
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[0], temp_csv)
+    store = CSVStore(temp_csv, lm)   # not registered, so nothing takes rows from the queue
+    for i in range(5):
+        writer.put(store, heartbeat(i))
+    assert writer.stats["dropped"] == 3
+    assert writer.stats["queue_depth"] == 2
+
+
+def test_put_after_stop_dropped(temp_csv):
+    writer = StorageWriter()
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[0], temp_csv)
+    store = writer.register(CSVStore(temp_csv, lm))
+    writer.stop()
+    assert not writer.put(store, heartbeat(0))
+    assert writer.stats["dropped"] == 1 and writer.stats["queue_depth"] == 0
+
+    ref = weakref.ref(writer)
+    del writer, store
+    gc.collect()
+    assert ref() is None   # not held by its exit hook
+
+
+def test_columnar_round_trip(temp_col):
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[147], temp_col)
+    assert isinstance(lm.store, ColumnarStore)
+    for i in range(5):
+        lm.receive_message(battery(i))
+
+    arrs = lm.arrays()
+    assert arrs["voltages"].shape == (5, 10)
+    assert arrs["voltages"].dtype == np.uint16
+    np.testing.assert_array_equal(arrs["timestamp"], np.arange(5))
+
+    df = lm.all_messages()
+    assert len(df) == 5
+    assert df.voltages_9.iloc[-1] == 13
+
+
+def test_columnar_resume(temp_col):
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[147], temp_col)
+    for i in range(5):
+        lm.receive_message(battery(i))
+
+    lm2 = LastMessage._build_mavlink(mavlink.mavlink_map[147], temp_col)
+    assert lm2.last_message._timestamp == 4
+    assert list(lm2.last_message.voltages) == list(range(4, 14))
+
+
+def test_csv_tail_seeks_from_end(temp_csv):
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[147], temp_csv)
+    for i in range(2000):
+        lm.receive_message(battery(i))
+    with open(temp_csv, "a") as f:
+        f.write("2000,0,0,0,20")   # a partly written row
+    tail = lm.store.tail(3, block=256)
+    np.testing.assert_array_equal(tail.index, [1997, 1998, 1999])
+    np.testing.assert_array_equal(tail.voltages_9, [2006, 2007, 2008])
+
+    resumed = LastMessage._build_mavlink(mavlink.mavlink_map[147], temp_csv)
+    assert resumed.last_message._timestamp == 1999
+    assert resumed.rate == 1.0
+    resumed.receive_message(battery(2000))
+    assert resumed.all_messages().index[-1] == 2000
+
+
+def test_csv_resume_drops_unterminated_row(temp_csv):
+    lm = LastMessage._build_mavlink(mavlink.mavlink_map[0], temp_csv)
+    lm.receive_message(heartbeat(0))
+    lm.receive_message(heartbeat(1))
+    temp_csv.write_text(temp_csv.read_text().rstrip("\n")[:-1])   # cut inside the last field, every column is there
+    assert lm.store.read().index.tolist() == [0]
+    resumed = LastMessage._build_mavlink(mavlink.mavlink_map[0], temp_csv)
+    assert resumed.last_message._timestamp == 0
+    resumed.receive_message(heartbeat(2))
+    np.testing.assert_array_equal(resumed.all_messages().index, [0, 2])
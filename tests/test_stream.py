@@ -0,0 +1,69 @@
+from pytest import raises
+from time import sleep
+from droneinterface.messages import mavlink
+
+
+def imu(i):
+    return mavlink.MAVLink_scaled_imu_message(i, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+
+
+def push(veh, n):
+    for i in range(n):
+        veh.conn.master.push(imu(i))
+
+
+def test_stream_no_gaps(veh):
+    with veh.stream(mavlink.MAVLINK_MSG_ID_SCALED_IMU, 2000) as stream:
+        push(veh, 2000)
+        msgs = stream.record(1.0)
+    assert [m.time_boot_ms for m in msgs] == list(range(2000))
+    assert stream.dropped == 0
+
+
+def test_drop_oldest(veh):
+    with veh.stream(mavlink.MAVLINK_MSG_ID_SCALED_IMU, 10) as stream:
+        push(veh, 50)
+        sleep(0.2)
+        assert [m.time_boot_ms for m in stream.drain()] == list(range(40, 50))
+    assert stream.stats == dict(received=50, dropped=40, errors=0, queued=0)
+
+
+def test_drop_newest(veh):
+    with veh.stream(mavlink.MAVLINK_MSG_ID_SCALED_IMU, 10, "drop_newest") as stream:
+        push(veh, 50)
+        sleep(0.2)
+        assert [m.time_boot_ms for m in stream.drain()] == list(range(10))
+    assert stream.dropped == 40
+
+
+def test_block(veh):
+    with veh.stream(mavlink.MAVLINK_MSG_ID_SCALED_IMU, 5, "block") as stream:
+        push(veh, 50)
+        msgs = [stream.get(1).time_boot_ms for _ in range(50)]
+    assert msgs == list(range(50))
+    assert stream.dropped == 0
+
+
+def test_callback(veh):
+    received = []
+    with veh.stream(mavlink.MAVLINK_MSG_ID_SCALED_IMU, callback=received.append):
+        push(veh, 20)
+        sleep(0.2)
+    assert [m.time_boot_ms for m in received] == list(range(20))
+
+
+def test_failing_callback(veh):
+    def fail(msg):
+        if msg.time_boot_ms % 2 == 0:
+            raise ValueError("bad message")
+    with veh.stream(mavlink.MAVLINK_MSG_ID_SCALED_IMU, callback=fail) as failing:
+        with veh.stream(mavlink.MAVLINK_MSG_ID_SCALED_IMU, 100) as stream:
+            push(veh, 20)
+            msgs = [stream.get(1).time_boot_ms for _ in range(20)]
+    assert msgs == list(range(20))
+    assert failing.stats["errors"] == 10 and failing.stats["received"] == 20
+
+
+def test_bad_policy(veh):
+    with raises(ValueError):
+        veh.stream(mavlink.MAVLINK_MSG_ID_SCALED_IMU, policy="spill")
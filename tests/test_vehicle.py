@@ -1,12 +1,16 @@
 
-from pytest import fixture
+from pytest import fixture, raises
 from droneinterface.vehicle import Vehicle
 from geometry import GPS, Quaternion
+import numpy as np
 from geometry.testing import assert_almost_equal
 from time import sleep
 from droneinterface.messages import mavlink
 from droneinterface.messages import wrappers
 from pathlib import Path
+from threading import Timer
+from time import time, process_time
+from tests.fake_master import heartbeat
 
 
 @fixture(scope="session")
@@ -33,14 +37,11 @@ def test_subscribe(conn: Vehicle):
     
 
 def test_arm_disarm(conn: Vehicle):
-    conn.arm()
-    sleep(1.0)
-    assert conn.Heartbeat.armed
+    assert conn.arm().result(2).result == mavlink.MAV_RESULT_ACCEPTED
+    conn.wait_for_test(lambda: conn.last_heartbeat().armed, 2)
 
-    conn.disarm()
-
-    sleep(1.0)
-    assert not conn.Heartbeat.armed
+    assert conn.disarm().result(2).result == mavlink.MAV_RESULT_ACCEPTED
+    conn.wait_for_test(lambda: not conn.last_heartbeat().armed, 2)
 
 
 
@@ -54,4 +55,153 @@ def veh_fol() -> Vehicle:
 
 def test_last_heartbeat(veh_fol):
     hb = veh_fol.last_heartbeat()
-    assert hb.id == 0
\ No newline at end of file
+    assert hb.id == 0
+
+
+def test_get_message_waits_without_spinning(veh):
+    Timer(1.0, lambda: veh.conn.master.push(heartbeat())).start()
+    start, cpu = time(), process_time()
+    hb = veh.get_message(0, timeout=3, max_age=None)
+    wall, cpu = time() - start, process_time() - cpu
+
+    assert hb.id == 0
+    assert wall > 0.9
+    assert cpu < 0.2 * wall
+    assert len(veh.conn.master.sent) >= 1  # request_message was sent
+
+
+def test_wait_for_test_without_spinning(veh):
+    Timer(1.0, lambda: veh.conn.master.push(heartbeat())).start()
+    start, cpu = time(), process_time()
+    veh.wait_for_test(lambda: 0 in veh.msgs, 3)
+    wall, cpu = time() - start, process_time() - cpu
+    
+    assert wall > 0.9
+    assert cpu < 0.2 * wall
+
+
+def test_accessors_are_methods(veh):
+    assert "last_GlobalPositionInt" in Vehicle.__dict__
+    assert "last_globalpositionint" in Vehicle.__dict__
+    assert "arm" in Vehicle.__dict__
+    assert "last_state" in Vehicle.__dict__
+
+    veh.conn.master.push(heartbeat())
+    veh.wait_for_test(lambda: 0 in veh.msgs, 3)
+    assert veh.last_Heartbeat().id == 0
+    assert veh.last_heartbeat().id == 0
+    assert veh.LAST_HEARTBEAT().id == 0
+    assert veh._last_heartbeat() is veh.msgs[0]
+
+
+def test_command_and_send_accessors(veh):
+    veh.arm()
+    veh.set_airspeed(20)
+    sent = veh.conn.master.sent
+    assert [m.get_msgId() for m in sent] == [mavlink.MAVLINK_MSG_ID_COMMAND_LONG] * 2
+    assert sent[1].command == mavlink.MAV_CMD_DO_CHANGE_SPEED
+    assert sent[1].param2 == 20
+
+    veh.send_ParamRequestList()
+    assert sent[2].get_msgId() == mavlink.MAVLINK_MSG_ID_PARAM_REQUEST_LIST
+
+
+def test_update_keeps_accessors(veh):
+    veh2 = veh.update(compid=2)
+    assert veh2.compid == 2 and veh2.conn is veh.conn
+    assert veh2.state.vehicle is veh2
+
+
+def _push_state_messages(master, i):
+    master.push(mavlink.MAVLink_scaled_imu_message(i, 0, 0, -1000, 0, 0, 0, 0, 0, 0))
+    master.push(mavlink.MAVLink_global_position_int_message(i, 500000000 + i * 10, 10000000, 100000, 0, 100, 0, 0, 0))
+    master.push(mavlink.MAVLink_attitude_quaternion_message(i, 1, 0, 0, 0, 0, 0, 0.1, [1, 0, 0, 0]))
+
+
+def test_state_stream(veh):
+    from flightdata import Origin, State
+    veh = veh.update(origin=Origin("origin", GPS(50, 1, 100), 0.0))
+    master = veh.conn.master
+    with veh.state_stream() as stream:
+        master.push(mavlink.MAVLink_attitude_quaternion_message(0, 1, 0, 0, 0, 0, 0, 0.1, [1, 0, 0, 0]))
+        for i in range(1, 6):
+            _push_state_messages(master, i)
+        st = stream.get(1)
+        assert isinstance(st, State) and len(st) == 1
+        batch = stream.batch(4, 1)
+        assert len(batch) == 4
+        assert np.all(np.diff(batch.t) > 0)
+        assert stream.stats["received"] == 5   # the first attitude came before the others
+    
+    last = veh.last_state()
+    assert len(last) == 1
+
+
+def _synthetic_flight(seconds=2.0):
+    """yawing at 1 rad/s and moving north at a constant rate, attitude at 50Hz, position at 10Hz, imu at 25Hz"""
+    def stamp(msg, ms):
+        msg._timestamp = 1000 + ms / 1000 + 0.003
+        return msg
+    att = [stamp(mavlink.MAVLink_attitude_quaternion_message(ms, np.cos(ms / 2000), 0, 0, np.sin(ms / 2000), 0, 0, 1, [1, 0, 0, 0]), ms) for ms in range(0, int(seconds * 1000), 20)]
+    pos = [stamp(mavlink.MAVLink_global_position_int_message(ms, 500000000 + ms, 10000000, 100000, 0, 0, 0, 0, 0), ms) for ms in range(5, int(seconds * 1000), 100)]
+    imu = [stamp(mavlink.MAVLink_scaled_imu_message(ms, 0, 0, -1000, 0, 0, 0, 0, 0, 0), ms) for ms in range(0, int(seconds * 1000), 40)]
+    return {31: att, 33: pos, 26: imu}
+
+
+def test_resample_state_inputs():
+    from droneinterface.combinators import StateMaker
+    inputs = _synthetic_flight()
+    times = np.array([0.25, 0.5, 1.01])
+    wrs, valid = StateMaker.resample(inputs, times, 0.2, "time_boot_ms")
+    assert valid.all()
+    np.testing.assert_array_almost_equal(wrs["mpos"].position.lat, 50 + times * 1000 / 1e7)
+    np.testing.assert_array_almost_equal(wrs["matt"].att.data, np.stack([np.cos(times / 2), 0 * times, 0 * times, np.sin(times / 2)], axis=1))
+    np.testing.assert_array_almost_equal(wrs["matt"].timestamp, 1000.003 + times)
+
+    _, valid = StateMaker.resample(inputs, np.array([0.001, 1.0]), 0.2, "time_boot_ms")
+    assert valid.tolist() == [False, True]   # before the first position
+
+
+def test_reconstruct_states():
+    from droneinterface.combinators import StateMaker
+    from flightdata import Origin
+    origin = Origin("origin", GPS(50, 1, 100), 0.0)
+    st, valid = StateMaker.reconstruct(_synthetic_flight(), origin.rotation, origin.pos)
+    assert len(st) == valid.sum() and valid.sum() >= 90
+    assert not valid[0]
+    st, valid = StateMaker.reconstruct(_synthetic_flight(), origin.rotation, origin.pos, base=25.0)
+    assert len(st) == valid.sum() and np.allclose(np.diff(st.t), 0.04)
+
+
+def test_coherent_state_stream(veh, make_conn):
+    from flightdata import Origin
+    origin = Origin("origin", GPS(50, 1, 100), 0.0)
+    with raises(ValueError):
+        veh.update(origin=origin).state_stream(coherent=True)   # no ring buffers
+    veh = Vehicle(make_conn(depth=10.0), 1, 1).update(origin=origin)
+    inputs = _synthetic_flight(1.0)
+    msgs = sorted([m for ms in inputs.values() for m in ms], key=lambda m: m.time_boot_ms)
+    with veh.state_stream(coherent=True) as stream:
+        for msg in msgs:
+            veh.conn.master.push(msg)
+        veh.wait_for_test(lambda: stream.stats["received"] >= 45, 3)
+        st = stream.batch()
+        assert stream.rejected == 1   # the attitude at 0ms, before the first position
+        assert len(st) + stream.rejected == stream.stats["received"]
+
+
+def test_states_from_folder():
+    from droneinterface.combinators import StateMaker
+    from flightdata import Origin
+    veh = Vehicle.from_folder(Path("tests/test_data/Conn"), 4, origin=Origin("origin", GPS(16.7, 121.0, 0), 0.0))
+    att = veh.msgs[mavlink.MAVLINK_MSG_ID_ATTITUDE_QUATERNION].arrays()["timestamp"]
+    t0, t1 = att[100], att[600]
+
+    st = veh.states(t0, t1)
+    assert st.t[0] == t0 and st.t[-1] == t1
+    inputs = {id: veh.msgs[id].arrays() for id in [31, 33, 26]}
+    full, valid = StateMaker.reconstruct(inputs, veh.origin.rotation, veh.origin.pos, tolerance=0.5)
+    np.testing.assert_array_almost_equal(st.pos.data, full.pos.data[(full.t >= t0) & (full.t <= t1)])
+
+    st = veh.states(t0, t1, rate=5.0)
+    assert len(st) <= int((t1 - t0) * 5.0) + 1 and np.all((st.t >= t0 - 1) & (st.t <= t1 + 1))
@@ -1,3 +1,6 @@
+import numpy as np
+import pytest
+from pathlib import Path
 from droneinterface.messages import *
 
 
@@ -11,4 +14,146 @@ def test_set_channel():
     assert set_channel_1_release.chan9_raw == 2**16 -1 #A value of UINT16_MAX-1 means to release this channel back to the RC radio. [us] (type:uint16_t) 
     assert set_channel_1_release.chan8_raw == 0 # A value of 0 means to release this channel back to the RC radio.
     assert set_channel_1.chan9_raw == 2**16 #A value of UINT16_MAX means to ignore this field.
-    
\ No newline at end of file
+    
+
+def _heartbeat():
+    msg = mavlink.MAVLink_heartbeat_message(1, 3, mavlink.MAV_MODE_FLAG_SAFETY_ARMED, 0, 4, 3)
+    msg._timestamp = 0.0
+    return msg
+
+
+def _gpi(i):
+    msg = mavlink.MAVLink_global_position_int_message(i, 500000000 + i, 10000000 - i, 100000 + i, 5000, 100 * i, 2, -3, 9000)
+    msg._timestamp = float(i)
+    return msg
+
+
+def test_parse_many_matches_parse():
+    msgs = [_gpi(i) for i in range(5)]
+    many = GlobalPositionInt.parse_many(msgs)
+    np.testing.assert_array_equal(many.timestamp, np.arange(5.0))
+    assert len(many.position) == 5
+    for i, msg in enumerate(msgs):
+        one = GlobalPositionInt.parse(msg)
+        np.testing.assert_array_almost_equal(many.position.data[i], one.position.data[0])
+        np.testing.assert_array_almost_equal(many.velocity.data[i], one.velocity.data[0])
+        assert many.heading[i] == pytest.approx(one.heading)
+        assert many.time_boot_ms[i] == one.time_boot_ms
+
+
+def test_parse_many_array_fields():
+    msgs = []
+    for i in range(3):
+        msg = mavlink.MAVLink_attitude_quaternion_message(i, 1, 0, 0, 0, 0.1 * i, 0, 0, [1, 0, 0, 0])
+        msg._timestamp = float(i)
+        msgs.append(msg)
+    many = AttitudeQuaternion.parse_many(msgs)
+    assert len(many.att) == 3 and len(many.repr_offset) == 3
+    np.testing.assert_array_almost_equal(many.rvel.x, [0, 0.1, 0.2])
+
+    bat = mavlink.MAVLink_battery_status_message(0, 0, 0, 0, [12000] + [0] * 9, 150, 0, 0, 50)
+    bat._timestamp = 0.0
+    np.testing.assert_array_almost_equal(BatteryStatus.parse_many([bat, bat]).voltage, [12, 12])
+
+
+def test_parse_many_from_store():
+    from droneinterface.last_message import LastMessage
+    lm = LastMessage.build_csv(Path("tests/test_data/Conn/4_33.csv"), readonly=True)
+    df = lm.all_messages()
+    many = lm.batch()
+    assert len(many.position) == len(df)
+    np.testing.assert_array_almost_equal(many.position.lat, df.lat.to_numpy() / 1e7)
+    np.testing.assert_array_almost_equal(GlobalPositionInt.parse_many(df).position.data, many.position.data)
+
+
+def _decoded(wr, name):
+    try:
+        type(wr).__dict__[name].__get__(wr)
+        return True
+    except AttributeError:
+        return False
+
+
+def test_parse_is_lazy():
+    msg = _gpi(3)
+    wr = GlobalPositionInt.parse(msg)
+    assert not _decoded(wr, "position") and not _decoded(wr, "velocity")
+    assert wr.position.lat[0] == pytest.approx(50.0000003)
+    assert wr.position is wr.position   # decoded once and cached
+    assert not _decoded(wr, "velocity")
+    assert wr.time_boot_ms == 3
+    assert wr.timestamp == 3.0
+
+
+def test_wrappers_are_slotted():
+    wr = GlobalPositionInt.parse(_gpi(1))
+    assert not hasattr(wr, "__dict__")
+    assert GlobalPositionInt.__slots__ == ("timestamp", "_msg", "position", "agl", "velocity", "heading")
+    assert len(wr.data) == 5
+    with pytest.raises(AttributeError):
+        wr.not_a_field
+
+
+def test_write_leaves_raw_message():
+    msg = _gpi(3)
+    wr = GlobalPositionInt.parse(msg)
+    other = GlobalPositionInt.parse(msg)
+    wr.time_boot_ms = 10
+    assert wr.time_boot_ms == 10 and wr.position.lat[0] == pytest.approx(50.0000003)
+    assert msg.time_boot_ms == 3 and other.time_boot_ms == 3
+    assert wr.encoder().time_boot_ms == 10
+
+
+def test_constructed_wrapper_keeps_values():
+    bat = mavlink.MAVLink_battery_status_message(7, 0, 0, 0, [12000] + [0] * 9, 150, 0, 0, 50)
+    bat._timestamp = 0.0
+    wr = BatteryStatus.parse(bat)
+    assert wr.id == 7 and BatteryStatus.id == mavlink.MAVLINK_MSG_ID_BATTERY_STATUS
+    assert wr.voltage == 12
+
+    hb = Heartbeat(0.0, 2, 0, 3, custom_mode=0, autopilot=3, mavlink_version=3)
+    assert hb.type == 2 and hb.encoder().type == 2
+    with pytest.raises(AttributeError):
+        Heartbeat(0.0, 2, 0)
+
+
+def test_bitmap_arrays():
+    from droneinterface.messages.mav_bitmap import mav_bitmap
+    Sensor = mav_bitmap("MAV_SYS_STATUS_SENSOR")
+    prearm = mavlink.MAV_SYS_STATUS_PREARM_CHECK
+    values = np.array([prearm | 1, prearm | 1, 1, 1, prearm, prearm])
+    bm = Sensor(values)
+    np.testing.assert_array_equal(bm.mav_sys_status_prearm_check, [True, True, False, False, True, True])
+    assert Sensor(prearm).mav_sys_status_prearm_check
+    assert len(bm) == 6 and bm
+
+    df = bm.frame(index=np.arange(6) * 0.5)
+    assert df.shape == (6, len(Sensor.flags))
+    assert df.mav_sys_status_sensor_3d_gyro.tolist() == [True] * 4 + [False] * 2
+
+    tr = bm.transitions("mav_sys_status_prearm_check", index=np.arange(6) * 0.5)
+    assert tr.index.tolist() == [1.0, 2.0]
+    assert tr.state.tolist() == [False, True]
+    assert len(bm.transitions()) == 3
+
+
+def test_scalar_bitmap():
+    from droneinterface.messages.mav_bitmap import mav_bitmap
+    Mode = mav_bitmap("MAV_MODE_FLAG")
+    assert Mode(0) and Mode(mavlink.MAV_MODE_FLAG_SAFETY_ARMED)
+    assert Mode(mavlink.MAV_MODE_FLAG_SAFETY_ARMED).mav_mode_flag_safety_armed
+    with pytest.raises(TypeError):
+        len(Mode(0))
+    hb = Heartbeat.parse(_heartbeat())
+    assert hb.base_mode and hb.armed
+
+
+def test_bitmap_from_parse_many():
+    msgs = []
+    for i, health in enumerate([3, 3, 1]):
+        msg = mavlink.MAVLink_sys_status_message(3, 3, health, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        msg._timestamp = float(i)
+        msgs.append(msg)
+    health = SysStatus.parse_many(msgs).sensor_health
+    tr = health.transitions("mav_sys_status_sensor_3d_accel", index=np.arange(3.0))
+    assert tr.index.tolist() == [2.0] and not tr.state.iloc[0]